@@ -0,0 +1,94 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import Header, HTTPException, Request, status
+
+from app.config.datastore import datastore
+from app.metrics.registry import record_time
+from app.progress.level_state import LevelState
+from .service import AuthService
+
+
+class UserContext:
+    """
+    Usuario autenticado de una peticion: los claims del token, ya verificado, y el
+    documento users/{uid}, que se lee la primera vez que se necesita y se reutiliza
+    durante el resto de la peticion.
+    """
+
+    def __init__(self, claims: Dict[str, Any]):
+        self.claims = claims
+        self.uid: str = claims["uid"]
+        self._data: Optional[Dict[str, Any]] = None
+        self._loading: Optional[asyncio.Future] = None
+
+    @property
+    def email(self) -> str:
+        return self.claims.get("email", "")
+
+    @property
+    def role(self) -> str:
+        """Rol del usuario, leido del custom claim "role" del token (sin acceder a Firestore)."""
+        return self.claims.get("role", "user")
+
+    async def data(self) -> Dict[str, Any]:
+        """
+        Documento users/{uid}. Se lee como mucho una vez por peticion, aunque lo
+        pidan varias partes a la vez; si no existe devuelve un diccionario vacio.
+        """
+        if self._data is not None:
+            return self._data
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(datastore.get("users", self.uid))
+        try:
+            doc = await asyncio.shield(self._loading)
+        except Exception:
+            # se permite reintentar si la lectura falla
+            self._loading = None
+            raise
+        if self._data is None:
+            self._data = (doc.to_dict() if doc.exists else None) or {}
+        return self._data
+
+    async def level_state(self) -> LevelState:
+        """Estado de niveles del usuario (bitsets de su documento), nuevo en cada llamada."""
+        return LevelState(await self.data())
+
+    async def unlocked_levels(self) -> List[int]:
+        """Niveles desbloqueados del usuario (copia, se puede modificar)."""
+        return list((await self.level_state()).unlocked)
+
+
+def bearer_token(authorization: Optional[str]) -> str:
+    """
+    Extrae el token de un header Authorization "Bearer <token>".
+    Raises:
+        HTTPException 401: Si no hay header o el formato es incorrecto.
+    """
+    if not authorization or not authorization.startswith("Bearer ") or not authorization[7:].strip():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token no proporcionado o formato incorrecto",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return authorization[7:].strip()
+
+
+async def get_current_user(request: Request, authorization: Optional[str] = Header(None)) -> UserContext:
+    """
+    Dependencia de FastAPI que verifica el token Bearer una sola vez por peticion
+    y devuelve el UserContext, que queda tambien en request.state.user.
+    Raises:
+        HTTPException 401: Token no proporcionado, con formato incorrecto o invalido.
+    """
+    user = getattr(request.state, "user", None)
+    if user is None:
+        start = time.perf_counter()
+        try:
+            decoded_token = await AuthService.verify_token(bearer_token(authorization))
+        finally:
+            record_time("auth", time.perf_counter() - start)
+        user = UserContext(decoded_token)
+        request.state.user = user
+    return user
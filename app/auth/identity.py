@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException, status
+
+from app.config.backend import identity_transport
+
+logger = logging.getLogger(__name__)
+
+# base del API REST de Identity Toolkit; configurable para apuntar a un stub en pruebas de carga
+IDENTITY_TOOLKIT_URL = os.getenv("IDENTITY_TOOLKIT_URL", "https://identitytoolkit.googleapis.com/v1")
+IDENTITY_CONNECT_TIMEOUT = float(os.getenv("IDENTITY_CONNECT_TIMEOUT", "3"))
+IDENTITY_READ_TIMEOUT = float(os.getenv("IDENTITY_READ_TIMEOUT", "10"))
+IDENTITY_MAX_CONNECTIONS = int(os.getenv("IDENTITY_MAX_CONNECTIONS", "50"))
+# peticiones simultaneas al proveedor de identidad por worker
+IDENTITY_MAX_CONCURRENCY = int(os.getenv("IDENTITY_MAX_CONCURRENCY", "50"))
+
+
+class IdentityToolkitClient:
+    """
+    Cliente HTTP asincrono y compartido para el API REST de Identity Toolkit.
+    Reutiliza conexiones (keep-alive), tiene timeouts de conexion y lectura
+    explicitos y limita las peticiones simultaneas.
+    """
+
+    def __init__(
+        self,
+        base_url: str = IDENTITY_TOOLKIT_URL,
+        connect_timeout: float = IDENTITY_CONNECT_TIMEOUT,
+        read_timeout: float = IDENTITY_READ_TIMEOUT,
+        max_connections: int = IDENTITY_MAX_CONNECTIONS,
+        max_concurrency: int = IDENTITY_MAX_CONCURRENCY,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._max_concurrency = max_concurrency
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self):
+        """Crea el cliente y su pool de conexiones. Se llama al arrancar la app."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self._timeout, limits=self._limits, transport=self._transport or identity_transport())
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._loop = asyncio.get_running_loop()
+
+    async def close(self):
+        """Cierra las conexiones abiertas. Se llama al parar la app."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+            self._loop = None
+
+    async def _discard_client(self):
+        """Cierra el cliente creado en otro event loop antes de sustituirlo."""
+        old = self._client
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+        if old is None:
+            return
+        try:
+            await old.aclose()
+        except Exception as e:
+            # si su loop ya se cerro, las conexiones no se pueden cerrar desde este
+            logger.warning(f"No se pudo cerrar el cliente de Identity Toolkit de un loop anterior: {e!r}")
+
+    async def post(self, path: str, payload: dict, api_key: Optional[str]) -> httpx.Response:
+        """
+        Hace un POST al API de Identity Toolkit.
+        Args:
+            path (str): Ruta del metodo, p. ej. "accounts:signInWithPassword".
+            payload (dict): Cuerpo JSON.
+            api_key (str): API key web de Firebase.
+        Returns:
+            httpx.Response: Respuesta del servicio (cualquier codigo de estado).
+        Raises:
+            HTTPException 503: Si el servicio no responde a tiempo o falla la conexion.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            # sin lifespan (p. ej. tests con ASGITransport) se crea bajo demanda;
+            # las conexiones de un loop anterior no se pueden reutilizar
+            await self._discard_client()
+            await self.start()
+        try:
+            async with self._semaphore:
+                return await self._client.post(f"{self.base_url}/{path}", params={"key": api_key}, json=payload)
+        except httpx.HTTPError as e:
+            logger.error(f"Error llamando a Identity Toolkit ({path}): {e!r}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio de autenticación no disponible",
+            )
+
+    async def sign_in_with_password(self, email: str, password: str, api_key: Optional[str]) -> httpx.Response:
+        """Inicia sesion con email y contraseña y devuelve la respuesta con idToken y localId."""
+        return await self.post("accounts:signInWithPassword", {
+            "email": email,
+            "password": password,
+            "returnSecureToken": True,
+        }, api_key)
+
+
+identity_client = IdentityToolkitClient()
@@ -0,0 +1,74 @@
+"""
+Copia el campo role de los documentos de users a los custom claims de Firebase
+Authentication, para que la autorizacion lea el rol del token sin consultar Firestore.
+
+Se puede ejecutar varias veces: solo cambia los usuarios cuyo claim no coincide.
+Los usuarios afectados ven el nuevo claim cuando renuevan su ID token (como
+mucho una hora despues).
+
+Uso:
+    python -m app.auth.migrate_role_claims              # todos los usuarios
+    python -m app.auth.migrate_role_claims --dry-run    # solo informa
+"""
+import argparse
+import asyncio
+import logging
+from typing import Dict
+
+from firebase_admin import auth
+
+from app.auth.service import ROLES, AuthService
+from app.config.backend import auth_client
+from app.config.datastore import datastore
+
+logger = logging.getLogger(__name__)
+
+
+async def _migrate_user(uid: str, role: str, dry_run: bool) -> str:
+    if role not in ROLES:
+        logger.warning(f"Rol desconocido '{role}' para {uid}, se omite")
+        return "skipped"
+    try:
+        if dry_run:
+            claims = (await asyncio.get_running_loop().run_in_executor(None, auth_client().get_user, uid)).custom_claims or {}
+            return "unchanged" if claims.get("role") == role else "updated"
+        return "updated" if await AuthService.set_role_claim(uid, role) else "unchanged"
+    except auth.UserNotFoundError:
+        logger.warning(f"El documento users/{uid} no tiene usuario en Firebase Authentication")
+        return "skipped"
+
+
+async def migrate(chunk_size: int = 100, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Recorre la coleccion users por bloques y sincroniza el claim role de cada usuario.
+    Returns:
+        dict: Usuarios actualizados, sin cambios y omitidos.
+    """
+    totals = {"updated": 0, "unchanged": 0, "skipped": 0}
+    last_id = None
+    while True:
+        docs = await datastore.query(
+            "users",
+            order_by="__name__",
+            limit=chunk_size,
+            start_after={"__name__": last_id} if last_id else None,
+        )
+        results = await asyncio.gather(*(
+            _migrate_user(doc.id, (doc.to_dict() or {}).get("role", "user"), dry_run) for doc in docs
+        ))
+        for result in results:
+            totals[result] += 1
+        logger.info(f"Claims de rol: {totals}")
+        if len(docs) < chunk_size:
+            return totals
+        last_id = docs[-1].id
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--dry-run", action="store_true", help="no modifica nada, solo cuenta los cambios")
+    args = parser.parse_args()
+    totals = asyncio.run(migrate(args.chunk_size, args.dry_run))
+    print(f"Usuarios actualizados: {totals['updated']}, sin cambios: {totals['unchanged']}, omitidos: {totals['skipped']}")
+    datastore.shutdown()
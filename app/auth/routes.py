@@ -2,11 +2,13 @@ from fastapi import APIRouter, Depends, HTTPException, status, Header, Depends
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from firebase_admin import auth
-from app.config.firebase import db, FIREBASE_API_KEY
-import requests
+from app.config.backend import FIREBASE_API_KEY, auth_client
+from app.config.datastore import datastore
+from .identity import identity_client
 from .service import AuthService
-from .schemas import User, UserCreate, UserLogin, UserRegister, LoginResponse
+from .dependencies import UserContext, get_current_user
+from .schemas import User, UserCreate, UserLogin, UserRegister, LoginResponse, RoleUpdate
+from app.progress.level_state import LevelState
 from app.progress.service import ProgressService
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
@@ -23,13 +25,8 @@ async def login(user: UserLogin):
     Returns:        
         dict: Contiene token de autenticación, email, username, role y niveles completados.
     """    
-    #autenticar con firebase REST API
-    url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-    response = requests.post(url, json={
-        "email": user.email,
-        "password": user.password,
-        "returnSecureToken": True
-    })
+    #autenticar con firebase REST API (cliente HTTP compartido)
+    response = await identity_client.sign_in_with_password(user.email, user.password, FIREBASE_API_KEY)
                    
     if response.status_code != 200:
         raise HTTPException(
@@ -45,7 +42,7 @@ async def login(user: UserLogin):
             detail="Error al obtener el token de autenticación",
         )
     #obtener datos del user desde Firebase
-    user_doc = db.collection("users").document(uid).get()
+    user_doc = await datastore.get("users", uid)
     if not user_doc.exists:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -53,14 +50,21 @@ async def login(user: UserLogin):
         )
         
     user_data = user_doc.to_dict()
-    
-    #obtener el progress desde firebase
-    levels_completed = await ProgressService.get_levels_completed_by_user(uid) 
+    login_update = {"last_login": datetime.utcnow()}
+
+    #niveles completados desde el bitset del propio documento, sin leer el progreso
+    state = LevelState(user_data)
+    if state.tracked:
+        levels_completed = state.levels_completed() or None
+    else:
+        #usuario anterior a los bitsets: se inicializan desde su resumen, en una
+        #transaccion que no pisa lo que otro intento haya escrito entretanto
+        await ProgressService.get_summary(uid)
+        state = await ProgressService.sync_level_state(uid) or state
+        levels_completed = state.levels_completed() or None
             
     #actualizamos last login
-    db.collection("users").document(uid).update({
-        "last_login": datetime.utcnow()
-    })
+    await datastore.update("users", uid, login_update)
     #response del backend
     return {
         "auth": token,        
@@ -86,15 +90,10 @@ async def register(user: UserRegister):
             password=user.password,
             display_name=user.username
         )
-        custom_token = auth.create_custom_token(user_record.uid).decode("utf-8")
+        custom_token = auth_client().create_custom_token(user_record.uid).decode("utf-8")
 
         # Autenticar usuario para obtener token oficial Firebase
-        url = f"https://identitytoolkit.googleapis.com/v1/accounts:signInWithPassword?key={FIREBASE_API_KEY}"
-        response = requests.post(url, json={
-            "email": user.email,
-            "password": user.password,
-            "returnSecureToken": True
-        })
+        response = await identity_client.sign_in_with_password(user.email, user.password, FIREBASE_API_KEY)
         if response.status_code != 200:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -103,8 +102,9 @@ async def register(user: UserRegister):
         login_info = response.json()
         token = login_info.get("idToken")
 
-        # Obtener progreso inicial (niveles completados)
-        levels_completed = await ProgressService.get_levels_completed_by_user(user_record.uid) or []
+        # un usuario recien creado no tiene niveles completados (su estado de niveles
+        # se crea vacio con el documento), no hace falta leer su progreso
+        levels_completed = []
 
         # Devolver token oficial y datos de usuario
         return {
@@ -132,28 +132,45 @@ async def register(user: UserRegister):
     
 
 @router.post("/verify-token", summary="Verificar token JWT")
-async def verify_token(authorization: Optional[str] = Header(None)):
+async def verify_token(user: UserContext = Depends(get_current_user)):
     """
     Verifica la validez de un token JWT.
     Args:
-        authorization (str): Token JWT en header Authorization (Bearer).
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
     Raises:
         HTTPException 401: Token no proporcionado o formato incorrecto.
     Returns:
         dict: Estado de validez, uid y email asociado.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
-    
     return {
         "valid": True,
-        "uid": decoded_token["uid"],
-        "email": decoded_token.get("email", "")
-    }
\ No newline at end of file
+        "uid": user.uid,
+        "email": user.email
+    }
+
+
+@router.put("/users/{uid}/role", summary="Cambiar el rol de un usuario")
+async def update_user_role(uid: str, body: RoleUpdate, user: UserContext = Depends(get_current_user)):
+    """
+    Cambia el rol de un usuario (documento y custom claim del token).
+    Solo accesible para administradores. El usuario afectado recibe el nuevo
+    rol cuando renueva su ID token.
+    Args:
+        uid (str): UID del usuario a modificar.
+        body (RoleUpdate): Nuevo rol ("user" o "admin").
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
+    Raises:
+        HTTPException 400: Rol no válido.
+        HTTPException 401: Token no proporcionado o formato incorrecto.
+        HTTPException 403: Si el usuario no es administrador.
+        HTTPException 404: Usuario no encontrado.
+    Returns:
+        dict: uid y rol asignado.
+    """
+    if user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para cambiar roles"
+        )
+    await AuthService.set_user_role(uid, body.role)
+    return {"uid": uid, "role": body.role}
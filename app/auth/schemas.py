@@ -29,6 +29,10 @@ class LoginResponse(BaseModel):
     levels_completed: Optional[List[int]] = None
     #progress: Optional[List[Dict[str, Any]]] = None
     #uid: str
+class RoleUpdate(BaseModel):
+    """Nuevo rol de un usuario"""
+    role: str
+
 class UserBase(BaseModel):
     email: EmailStr
     username: str
@@ -1,7 +1,14 @@
+import asyncio
 from firebase_admin import auth, firestore
-from app.config.firebase import db
+from app.config.backend import auth_client
+from app.config.datastore import datastore
+from app.auth.token_cache import token_cache, token_verifier
 from fastapi import HTTPException, status
 from datetime import datetime
+from app.progress.level_state import COMPLETED_BITS, LevelState
+
+# roles validos; se guardan en el documento del usuario y como custom claim "role" del token
+ROLES = ("user", "admin")
 
 
 class AuthService:
@@ -19,9 +26,14 @@ class AuthService:
         
         if token == "dummy":
             return {"uid": "testuser", "email": "test@example.com"} 
+        # token ya verificado en una peticion anterior
+        decoded_token = token_cache.get(token)
+        if decoded_token is not None:
+            return decoded_token
         try:
-            # token de firebase
-            decoded_token = auth.verify_id_token(token)
+            # token de firebase, verificado en local con los certificados cacheados
+            decoded_token = await token_verifier.verify(token)
+            token_cache.put(token, decoded_token)
             return decoded_token
         except Exception as e:
             raise HTTPException(
@@ -40,7 +52,7 @@ class AuthService:
             UserRecord | None: Objeto usuario o None si no existe.
         """
         try:
-            user = auth.get_user_by_email(email)
+            user = auth_client().get_user_by_email(email)
             return user
         except:
             return None
@@ -58,12 +70,20 @@ class AuthService:
         Raises:
             HTTPException: Si ocurre un error al crear el usuario.
         """
-        try:
-            user = auth.create_user(
+        def create_auth_user():
+            user = auth_client().create_user(
                 email=email,
                 password=password,
                 display_name=display_name
             )
+            # el rol viaja en el token como custom claim, asi autorizar no requiere leer Firestore
+            auth_client().set_custom_user_claims(user.uid, {"role": "user"})
+            return user
+
+        try:
+            # llamadas de red del Admin SDK, fuera del event loop como en set_role_claim;
+            # en el pool por defecto, no en el de Firestore ni con su limite de users
+            user = await asyncio.get_running_loop().run_in_executor(None, create_auth_user)
             user_data = {
                 "email": email,
                 "username": display_name,
@@ -72,8 +92,10 @@ class AuthService:
                 "role": "user",
                 "last_login": datetime.utcnow(),
                 "unlocked_levels": [1], #desbloqueamos el primer nivel por defecto
+                #estado de niveles compacto (ver app.progress.level_state)
+                **LevelState({COMPLETED_BITS: b"", "unlocked_levels": [1]}).fields(),
             }
-            db.collection('users').document(user.uid).set(user_data)
+            await datastore.set('users', user.uid, user_data)
             
             return user
         except Exception as e:
@@ -89,9 +111,57 @@ class AuthService:
             uid (str): UID del usuario.
         """
         try:
-            db.collection('users').document(uid).update({
+            await datastore.update('users', uid, {
                 "last_login": datetime.utcnow()
             })
         except Exception as e:
             # Solo log, no interrumpir el flujo
-            print(f"Error updating last login: {str(e)}")
\ No newline at end of file
+            print(f"Error updating last login: {str(e)}")
+
+    @staticmethod
+    async def set_role_claim(uid: str, role: str) -> bool:
+        """
+        Guarda el rol como custom claim del usuario de Firebase Authentication,
+        conservando el resto de claims. Los tokens ya emitidos no cambian: el
+        nuevo rol aparece cuando el cliente renueva su ID token.
+        Args:
+            uid (str): UID del usuario.
+            role (str): Rol a asignar.
+        Returns:
+            bool: True si el claim ha cambiado, False si ya tenia ese valor.
+        """
+        def update_claims():
+            claims = dict(auth_client().get_user(uid).custom_claims or {})
+            if claims.get("role") == role:
+                return False
+            claims["role"] = role
+            auth_client().set_custom_user_claims(uid, claims)
+            return True
+
+        # Admin SDK de Authentication: pool por defecto, fuera del limite y las metricas de Firestore
+        return await asyncio.get_running_loop().run_in_executor(None, update_claims)
+
+    @staticmethod
+    async def set_user_role(uid: str, role: str):
+        """
+        Cambia el rol de un usuario en su documento y en sus custom claims.
+        Args:
+            uid (str): UID del usuario.
+            role (str): Nuevo rol ("user" o "admin").
+        Raises:
+            HTTPException 400: Si el rol no es valido.
+            HTTPException 404: Si el usuario no existe.
+        """
+        if role not in ROLES:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Rol no válido, debe ser uno de: {', '.join(ROLES)}"
+            )
+        try:
+            await AuthService.set_role_claim(uid, role)
+        except auth.UserNotFoundError:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Usuario no encontrado"
+            )
+        await datastore.set('users', uid, {"role": role}, merge=True)
@@ -0,0 +1,297 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import requests
+from google.auth import jwt
+
+from app.config.backend import auth_client, memory_auth, project_id, use_memory_backend
+
+logger = logging.getLogger(__name__)
+
+# certificados publicos con los que Firebase firma los ID tokens
+ID_TOKEN_CERT_URI = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+ID_TOKEN_ISSUER_PREFIX = "https://securetoken.google.com/"
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# margen minimo entre refrescos de certificados y timeout de la descarga
+AUTH_CERTS_MIN_REFRESH_SECONDS = int(os.getenv("AUTH_CERTS_MIN_REFRESH_SECONDS", "60"))
+AUTH_CERTS_FETCH_TIMEOUT = float(os.getenv("AUTH_CERTS_FETCH_TIMEOUT", "10"))
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def token_key(token: str) -> str:
+    """Clave de cache de un token: su hash, para no guardar el token en claro."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """
+    Cache LRU acotada de tokens ya verificados.
+    Cada entrada caduca en el claim 'exp' del propio token.
+    """
+
+    def __init__(self, max_size: int = AUTH_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve los claims de un token cacheado y vigente, o None.
+        Args:
+            token (str): ID token enviado por el cliente.
+        Returns:
+            dict | None: Claims decodificados si el token esta en cache y no ha expirado.
+        """
+        key = token_key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: Dict[str, Any]):
+        """Guarda los claims de un token verificado hasta su 'exp'."""
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at <= time.time():
+            return
+        key = token_key(token)
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos y fallos de la cache."""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def _log_refresh_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"No se pudieron actualizar los certificados de firma: {task.exception()}")
+
+
+class CertificateCache:
+    """
+    Certificados de firma de Firebase en memoria, refrescados en segundo plano
+    segun el Cache-Control de Google para que la verificacion no espere a la red.
+    """
+
+    def __init__(self, cert_url: str = ID_TOKEN_CERT_URI, min_refresh_interval: float = AUTH_CERTS_MIN_REFRESH_SECONDS):
+        self.cert_url = cert_url
+        self.certs: Dict[str, str] = {}
+        self.expires_at = 0.0
+        # refrescos forzados por un kid desconocido: como mucho uno por intervalo
+        self.min_refresh_interval = min_refresh_interval
+        self._last_forced = float("-inf")
+        self._task: Optional[asyncio.Task] = None
+        self._refreshing: Optional[asyncio.Task] = None
+
+    @property
+    def is_stale(self) -> bool:
+        return time.time() >= self.expires_at
+
+    def _fetch(self):
+        if use_memory_backend():
+            return memory_auth().certificates(), 3600
+        response = requests.get(self.cert_url, timeout=AUTH_CERTS_FETCH_TIMEOUT)
+        response.raise_for_status()
+        match = _MAX_AGE_RE.search(response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else 3600
+        return response.json(), max_age
+
+    async def _download(self):
+        loop = asyncio.get_running_loop()
+        certs, max_age = await loop.run_in_executor(None, self._fetch)
+        self.certs = certs
+        self.expires_at = time.time() + max_age
+        logger.info(f"Certificados de firma actualizados ({len(certs)} claves, max-age {max_age}s)")
+
+    def _in_flight(self) -> Optional[asyncio.Task]:
+        task = self._refreshing
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            return None
+        return task
+
+    def _start_refresh(self) -> asyncio.Task:
+        task = self._in_flight()
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._download())
+            # el error lo recibe quien espera la descarga; si nadie la espera, se registra aqui
+            task.add_done_callback(_log_refresh_error)
+            self._refreshing = task
+        return task
+
+    async def refresh(self):
+        """
+        Descarga los certificados fuera del event loop y actualiza la cache.
+        Si ya hay una descarga en curso se espera a esa en lugar de lanzar otra.
+        """
+        await asyncio.shield(self._start_refresh())
+
+    def refresh_in_background(self):
+        """Lanza un refresco si no hay otro en curso, sin esperar a que termine."""
+        self._start_refresh()
+
+    async def refresh_for_unknown_key(self) -> bool:
+        """
+        Refresca los certificados porque ha llegado un token firmado con una clave
+        desconocida. Como el kid lo elige quien envia el token, estos refrescos se
+        limitan a uno cada min_refresh_interval segundos (compartiendo el que este
+        en curso).
+        Returns:
+            bool: False si se ha descartado por el limite.
+        """
+        task = self._in_flight()
+        if task is None:
+            now = time.monotonic()
+            if now - self._last_forced < self.min_refresh_interval:
+                return False
+            self._last_forced = now
+            task = self._start_refresh()
+        await asyncio.shield(task)
+        return True
+
+    async def _safe_refresh(self):
+        try:
+            await self.refresh()
+        except Exception:
+            # el error ya lo registra _log_refresh_error al terminar la descarga
+            pass
+
+    async def warm(self) -> bool:
+        """
+        Descarga los certificados antes de atender peticiones (arranque).
+        Returns:
+            bool: True si hay certificados disponibles.
+        """
+        if self.is_stale:
+            await self._safe_refresh()
+        return bool(self.certs)
+
+    async def _refresh_loop(self):
+        # tras warm() los certificados ya estan frescos: no se vuelven a pedir al arrancar
+        fresh = not self.is_stale
+        while True:
+            if not fresh:
+                await self._safe_refresh()
+            fresh = False
+            # refrescar antes de que caduquen, como minimo cada AUTH_CERTS_MIN_REFRESH_SECONDS
+            remaining = self.expires_at - time.time()
+            await asyncio.sleep(max(AUTH_CERTS_MIN_REFRESH_SECONDS, remaining * 0.8))
+
+    def start(self):
+        """Arranca el refresco periodico en segundo plano."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _project_id() -> Optional[str]:
+    return project_id()
+
+
+class LocalTokenVerifier:
+    """
+    Verifica la firma y los claims de un ID token de Firebase en local, con los
+    mismos controles que auth.verify_id_token pero usando los certificados cacheados.
+    """
+
+    def __init__(self, certificates: CertificateCache):
+        self.certificates = certificates
+        self._project_id: Optional[str] = None
+
+    @property
+    def project_id(self) -> Optional[str]:
+        if self._project_id is None:
+            self._project_id = _project_id()
+        return self._project_id
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """
+        Verifica un token con los certificados actuales.
+        Raises:
+            ValueError: Si la firma, la audiencia, el emisor o la expiracion no son validos.
+        """
+        header = jwt.decode_header(token)
+        if header.get("alg") != "RS256":
+            raise ValueError(f'algoritmo incorrecto, se esperaba "RS256" y se recibio "{header.get("alg")}"')
+        if not header.get("kid"):
+            raise ValueError('el token no tiene claim "kid"')
+        project_id = self.project_id
+        claims = jwt.decode(token, certs=self.certificates.certs, audience=project_id)
+        if claims.get("iss") != ID_TOKEN_ISSUER_PREFIX + str(project_id):
+            raise ValueError(f'claim "iss" incorrecto: {claims.get("iss")}')
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError('claim "sub" ausente o invalido')
+        claims["uid"] = subject
+        return claims
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """
+        Verifica un token sin bloquear en la red salvo si aun no hay certificados.
+        Si el token esta firmado con una clave que no conocemos, se refrescan los
+        certificados antes de rechazarlo, salvo que ya se haya hecho hace menos de
+        AUTH_CERTS_MIN_REFRESH_SECONDS: entonces se rechaza sin esperar.
+        """
+        if os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+            # los tokens del emulador no van firmados
+            return await self._verify_with_sdk(token)
+        # un token mal formado se rechaza sin tocar la red
+        kid = jwt.decode_header(token).get("kid")
+        try:
+            if not self.certificates.certs:
+                await self.certificates.refresh()
+            elif self.certificates.is_stale:
+                self.certificates.refresh_in_background()
+
+            if kid and kid not in self.certificates.certs:
+                if not await self.certificates.refresh_for_unknown_key():
+                    raise ValueError(f'clave de firma desconocida: "{kid}"')
+        except requests.RequestException as e:
+            logger.warning(f"Certificados no disponibles, se verifica con el SDK: {e}")
+            return await self._verify_with_sdk(token)
+        return self.decode(token)
+
+    async def _verify_with_sdk(self, token: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, auth_client().verify_id_token, token)
+
+
+token_cache = TokenCache()
+certificate_cache = CertificateCache()
+token_verifier = LocalTokenVerifier(certificate_cache)
@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FIREBASE_API_KEY = os.getenv("FIREBASE_API_KEY")
+
+_lock = threading.Lock()
+_memory_firestore = None
+_memory_auth = None
+
+
+def backend_name() -> str:
+    """
+    Backend de datos y autenticacion configurado en FIREBASE_BACKEND:
+    "firebase" (por defecto, proyecto real) o "memory" (en memoria, para tests
+    y pruebas de carga sin credenciales).
+    """
+    return os.getenv("FIREBASE_BACKEND", "firebase").strip().lower()
+
+
+def use_memory_backend() -> bool:
+    return backend_name() == "memory"
+
+
+def memory_firestore():
+    """Cliente de Firestore en memoria, compartido por todo el proceso."""
+    global _memory_firestore
+    with _lock:
+        if _memory_firestore is None:
+            from .memory_backend import MemoryFirestore
+            _memory_firestore = MemoryFirestore()
+        return _memory_firestore
+
+
+def memory_auth():
+    """Firebase Authentication en memoria, compartido por todo el proceso."""
+    global _memory_auth
+    with _lock:
+        if _memory_auth is None:
+            from .memory_backend import MemoryAuth
+            _memory_auth = MemoryAuth()
+        return _memory_auth
+
+
+def firestore_client() -> Any:
+    """Cliente de Firestore del backend configurado."""
+    if use_memory_backend():
+        return memory_firestore()
+    # importacion diferida: el SDK solo se inicializa cuando se usa el cliente
+    from app.config.firebase import get_db
+    return get_db()
+
+
+def auth_client() -> Any:
+    """Modulo (o equivalente en memoria) de Firebase Authentication del backend configurado."""
+    if use_memory_backend():
+        return memory_auth()
+    from app.config.firebase import get_auth
+    return get_auth()
+
+
+def project_id() -> Optional[str]:
+    """Id del proyecto al que deben ir dirigidos los ID tokens (claim aud)."""
+    if use_memory_backend():
+        return memory_auth().project_id
+    import firebase_admin
+    from app.config import firebase
+    firebase.initialize()
+    return firebase_admin.get_app().project_id
+
+
+def initialize() -> float:
+    """
+    Inicializa el backend configurado (credenciales, SDK y cliente) sin esperar
+    a la primera peticion. Se llama al arrancar la app; si falla, el arranque
+    se detiene.
+    Returns:
+        float: Segundos que ha tardado la inicializacion.
+    """
+    start = time.perf_counter()
+    if use_memory_backend():
+        memory_firestore()
+        memory_auth()
+    else:
+        from app.config import firebase
+        firebase.initialize()
+    return time.perf_counter() - start
+
+
+def identity_transport():
+    """
+    Transporte httpx para Identity Toolkit: el del backend en memoria, o None
+    para usar la red.
+    """
+    if use_memory_backend():
+        return memory_auth().transport()
+    return None
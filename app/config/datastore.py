@@ -0,0 +1,443 @@
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.metrics.registry import collection_label, record_firestore_call, record_firestore_operation
+
+logger = logging.getLogger(__name__)
+
+# numero maximo de hilos que atienden llamadas a Firestore
+FIRESTORE_MAX_WORKERS = int(os.getenv("FIRESTORE_MAX_WORKERS", "32"))
+# limite de llamadas concurrentes por coleccion si no se indica otro
+FIRESTORE_COLLECTION_CONCURRENCY = int(os.getenv("FIRESTORE_COLLECTION_CONCURRENCY", "16"))
+# limites especificos por coleccion, formato "progress=8,levels=4"
+FIRESTORE_COLLECTION_LIMITS = os.getenv("FIRESTORE_COLLECTION_LIMITS", "")
+# documentos que se piden al iterador de stream() en cada salto al pool de hilos
+FIRESTORE_STREAM_BATCH_SIZE = int(os.getenv("FIRESTORE_STREAM_BATCH_SIZE", "100"))
+
+
+def parse_collection_limits(raw: str) -> Dict[str, int]:
+    """
+    Convierte la cadena de configuracion de limites por coleccion en un diccionario.
+    Args:
+        raw (str): Cadena con el formato "coleccion=limite,coleccion=limite".
+    Returns:
+        Dict[str, int]: Limite de concurrencia para cada coleccion indicada.
+    """
+    limits = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        name, value = item.split("=", 1)
+        try:
+            limits[name.strip()] = max(1, int(value))
+        except ValueError:
+            logger.warning(f"Limite de concurrencia invalido para '{name.strip()}': {value}")
+    return limits
+
+
+def _default_client():
+    # importacion diferida: el SDK (o el backend en memoria) solo se inicializa cuando se usa el cliente
+    from app.config.backend import firestore_client
+    return firestore_client()
+
+
+Filter = Tuple[str, str, Any]
+
+
+class WriteBatch:
+    """
+    Escrituras agrupadas en un unico commit atomico de Firestore (maximo 500
+    operaciones). Las operaciones se acumulan en memoria y se envian todas
+    juntas con commit(); si falla, no se aplica ninguna.
+    """
+
+    MAX_OPERATIONS = 500
+
+    def __init__(self, store: "DataStore"):
+        self._store = store
+        self._operations: List[Tuple[str, str, Any, Any, bool]] = []
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def _append(self, operation: Tuple[str, str, Any, Any, bool]):
+        if len(self._operations) >= self.MAX_OPERATIONS:
+            raise ValueError(f"Un batch admite como maximo {self.MAX_OPERATIONS} escrituras")
+        self._operations.append(operation)
+
+    def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        """Crea o sobrescribe un documento (o lo fusiona si merge=True)."""
+        self._append(("set", collection, self._store.collection(collection).document(doc_id), data, merge))
+
+    def update(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        """Actualiza campos de un documento existente."""
+        self._append(("update", collection, self._store.collection(collection).document(doc_id), data, False))
+
+    def add(self, collection: str, data: Dict[str, Any]) -> str:
+        """Crea un documento con id autogenerado (en el cliente) y devuelve ese id."""
+        ref = self._store.collection(collection).document()
+        self._append(("set", collection, ref, data, False))
+        return ref.id
+
+    def delete(self, collection: str, doc_id: str):
+        """Borra un documento (no falla si no existe)."""
+        self._append(("delete", collection, self._store.collection(collection).document(doc_id), None, False))
+
+    @staticmethod
+    def _write(target, operations: List[Tuple[str, str, Any, Any, bool]]):
+        for kind, _, ref, data, merge in operations:
+            if kind == "set":
+                target.set(ref, data, merge=merge)
+            elif kind == "delete":
+                target.delete(ref)
+            else:
+                target.update(ref, data)
+
+    def apply(self, transaction: "Transaction"):
+        """
+        Añade las escrituras a la transaccion que recibe la funcion de
+        DataStore.transaction, para que se confirmen con sus lecturas (y se
+        cuenten por coleccion en las metricas como las del resto de la transaccion).
+        """
+        self._write(transaction, self._operations)
+
+    async def commit(self, collection: str):
+        """
+        Envia todas las escrituras en un solo commit.
+        Args:
+            collection (str): Coleccion a la que se imputa la llamada (limite de concurrencia).
+        """
+        if not self._operations:
+            return None
+        operations = list(self._operations)
+
+        def commit():
+            batch = self._store.client.batch()
+            self._write(batch, operations)
+            return batch.commit()
+
+        result = await self._store.run(collection, commit)
+        for operation in operations:
+            record_firestore_operation(operation[1], "write")
+        self._operations.clear()
+        return result
+
+
+def _collection_path(ref) -> str:
+    """Ruta de la coleccion de un DocumentReference, p. ej. "users/u1/progress"."""
+    return ref.path.rsplit("/", 1)[0]
+
+
+class Transaction:
+    """
+    Transaccion que recibe la funcion de DataStore.transaction. Envuelve la del
+    SDK: lee con get/get_all y escribe con set/update/delete, y cuenta lecturas y
+    escrituras por coleccion. La funcion corre en el pool de hilos, fuera del
+    contexto de la peticion, asi que DataStore.transaction anota las cuentas en
+    las metricas al terminar.
+    """
+
+    def __init__(self, store: "DataStore", transaction, reads: Counter):
+        self._store = store
+        self._transaction = transaction
+        # las lecturas se cobran en cada intento; las escrituras solo las del que se confirma
+        self._reads = reads
+        self.writes: Counter = Counter()
+
+    def get(self, ref):
+        """Lee un documento dentro de la transaccion. Devuelve su DocumentSnapshot."""
+        snapshot = ref.get(transaction=self._transaction)
+        self._reads[_collection_path(ref)] += 1
+        return snapshot
+
+    def get_all(self, refs) -> List[Any]:
+        """Lee varios documentos (de cualquier coleccion) en una sola llamada."""
+        refs = list(refs)
+        snapshots = list(self._store.client.get_all(refs, transaction=self._transaction))
+        for ref in refs:
+            self._reads[_collection_path(ref)] += 1
+        return snapshots
+
+    def set(self, ref, data: Dict[str, Any], merge: bool = False):
+        self._transaction.set(ref, data, merge=merge)
+        self.writes[_collection_path(ref)] += 1
+
+    def update(self, ref, data: Dict[str, Any]):
+        self._transaction.update(ref, data)
+        self.writes[_collection_path(ref)] += 1
+
+    def delete(self, ref):
+        self._transaction.delete(ref)
+        self.writes[_collection_path(ref)] += 1
+
+
+class DataStore:
+    """
+    Capa de acceso a datos sobre el cliente sincrono de Firestore.
+
+    Cada llamada al SDK se ejecuta en un pool de hilos acotado para no bloquear
+    el event loop de uvicorn, y un semaforo por coleccion limita cuantas llamadas
+    simultaneas puede tener cada una, de forma que una coleccion muy usada no
+    acapare todos los hilos del pool.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any] = _default_client,
+        max_workers: int = FIRESTORE_MAX_WORKERS,
+        default_limit: int = FIRESTORE_COLLECTION_CONCURRENCY,
+        limits: Optional[Dict[str, int]] = None,
+    ):
+        self._client_factory = client_factory
+        self._client = None
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._default_limit = default_limit
+        self._limits = dict(limits or {})
+        # los semaforos de asyncio quedan ligados a un loop, por eso se guardan por loop
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self):
+        """Cliente de Firestore, creado la primera vez que se necesita."""
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def collection(self, name: str):
+        """Devuelve la referencia a una coleccion del cliente subyacente."""
+        return self.client.collection(name)
+
+    def limit_for(self, collection: str) -> int:
+        """
+        Limite de llamadas concurrentes configurado para una coleccion. Las
+        subcolecciones comparten el de su ruta generica (p. ej. "users/{id}/progress").
+        """
+        return self._limits.get(collection, self._limits.get(collection_label(collection), self._default_limit))
+
+    def _semaphore(self, collection: str) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        per_loop = self._semaphores.setdefault(loop, {})
+        # un semaforo por ruta generica, no uno por documento padre
+        collection = collection_label(collection)
+        semaphore = per_loop.get(collection)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.limit_for(collection))
+            per_loop[collection] = semaphore
+        return semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix="firestore",
+            )
+        return self._executor
+
+    async def run(self, collection: str, func: Callable[..., Any], *args, **kwargs):
+        """
+        Ejecuta una llamada bloqueante al SDK fuera del event loop.
+        Args:
+            collection (str): Coleccion a la que se imputa la llamada (limite de concurrencia).
+            func (Callable): Funcion sincrona a ejecutar.
+            *args, **kwargs: Argumentos de la funcion.
+        Returns:
+            Any: Resultado de la funcion.
+        """
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            async with self._semaphore(collection):
+                return await loop.run_in_executor(
+                    self._get_executor(), functools.partial(func, *args, **kwargs)
+                )
+        finally:
+            # cada llamada es una ida y vuelta a Firestore (metricas por coleccion y peticion)
+            record_firestore_call(collection, time.perf_counter() - start)
+
+    def _build_query(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_after: Optional[Dict[str, Any]] = None,
+        group: bool = False,
+    ):
+        query = self.client.collection_group(collection) if group else self.collection(collection)
+        for field, op, value in filters:
+            query = query.where(field, op, value)
+        if order_by:
+            query = query.order_by(order_by)
+        if start_after:
+            query = query.start_after(start_after)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    async def get(self, collection: str, doc_id: str):
+        """Lee un documento por su id. Devuelve el DocumentSnapshot (puede no existir)."""
+        doc = await self.run(collection, lambda: self.collection(collection).document(doc_id).get())
+        record_firestore_operation(collection, "read")
+        return doc
+
+    async def get_many(self, collection: str, doc_ids: Iterable[str]) -> Dict[str, Any]:
+        """
+        Lee varios documentos de una coleccion por id en una sola llamada (get_all).
+        Returns:
+            Dict[str, DocumentSnapshot]: Snapshot de cada id (pueden no existir).
+        """
+        doc_ids = list(doc_ids)
+        if not doc_ids:
+            return {}
+
+        def get_all():
+            refs = [self.collection(collection).document(doc_id) for doc_id in doc_ids]
+            return {snapshot.id: snapshot for snapshot in self.client.get_all(refs)}
+
+        snapshots = await self.run(collection, get_all)
+        record_firestore_operation(collection, "read", len(doc_ids))
+        return snapshots
+
+    async def set(self, collection: str, doc_id: str, data: Dict[str, Any], merge: bool = False):
+        """Crea o sobrescribe un documento."""
+        result = await self.run(collection, lambda: self.collection(collection).document(doc_id).set(data, merge=merge))
+        record_firestore_operation(collection, "write")
+        return result
+
+    async def update(self, collection: str, doc_id: str, data: Dict[str, Any]):
+        """Actualiza campos de un documento existente."""
+        result = await self.run(collection, lambda: self.collection(collection).document(doc_id).update(data))
+        record_firestore_operation(collection, "write")
+        return result
+
+    async def add(self, collection: str, data: Dict[str, Any]):
+        """Crea un documento con id autogenerado. Devuelve la tupla (update_time, DocumentReference)."""
+        result = await self.run(collection, lambda: self.collection(collection).add(data))
+        record_firestore_operation(collection, "write")
+        return result
+
+    async def query(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_after: Optional[Dict[str, Any]] = None,
+        group: bool = False,
+    ) -> List[Any]:
+        """
+        Ejecuta una consulta y devuelve todos los documentos resultantes.
+        Args:
+            collection (str): Nombre de la coleccion.
+            filters (Iterable[Tuple[str, str, Any]]): Filtros (campo, operador, valor).
+            order_by (str, optional): Campo por el que ordenar.
+            limit (int, optional): Numero maximo de documentos.
+            start_after (dict, optional): Cursor {campo de orden: valor}; con order_by
+                "__name__" basta con el id del documento (con group, su DocumentReference).
+            group (bool): Si es True, consulta de collection group: todas las
+                colecciones con ese id, a cualquier profundidad.
+        Returns:
+            List[DocumentSnapshot]: Documentos que cumplen la consulta.
+        """
+        filters = list(filters)
+        docs = await self.run(collection, lambda: self._build_query(collection, filters, order_by, limit, start_after, group).get())
+        record_firestore_operation(collection, "query")
+        # Firestore cobra una lectura aunque la consulta no devuelva nada
+        record_firestore_operation(collection, "read", max(1, len(docs)))
+        return docs
+
+    async def stream(
+        self,
+        collection: str,
+        filters: Iterable[Filter] = (),
+        order_by: Optional[str] = None,
+        limit: Optional[int] = None,
+        start_after: Optional[Dict[str, Any]] = None,
+        batch_size: int = FIRESTORE_STREAM_BATCH_SIZE,
+        group: bool = False,
+    ) -> AsyncIterator[Any]:
+        """
+        Recorre una consulta con el iterador stream() de Firestore sin cargar todo
+        el resultado: los documentos se piden al iterador por bloques de batch_size.
+        Mismos argumentos que query().
+        Yields:
+            DocumentSnapshot: Documentos en el orden de la consulta.
+        """
+        filters = list(filters)
+        iterator = await self.run(
+            collection,
+            lambda: iter(self._build_query(collection, filters, order_by, limit, start_after, group).stream()),
+        )
+        record_firestore_operation(collection, "query")
+        read = 0
+        try:
+            while True:
+                batch = await self.run(collection, lambda: list(itertools.islice(iterator, batch_size)))
+                read += len(batch)
+                record_firestore_operation(collection, "read", len(batch))
+                for doc in batch:
+                    yield doc
+                if len(batch) < batch_size:
+                    return
+        finally:
+            if not read:
+                record_firestore_operation(collection, "read")
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    def batch(self) -> WriteBatch:
+        """Crea un WriteBatch para agrupar varias escrituras en un unico commit."""
+        return WriteBatch(self)
+
+    async def transaction(self, collection: str, func: Callable[[Any], Any], max_attempts: int = 5):
+        """
+        Ejecuta func(transaction) en una transaccion de Firestore, reintentando
+        si hay contencion. Las lecturas deben hacerse con transaction.get/get_all
+        y las escrituras con transaction.set/update/delete (ver Transaction), que
+        se anotan en las metricas de la peticion por coleccion.
+        Args:
+            collection (str): Coleccion a la que se imputa la llamada.
+            func (Callable): Funcion sincrona que recibe la Transaction.
+            max_attempts (int): Intentos maximos antes de fallar.
+        Returns:
+            Any: Resultado de func en el intento que se confirma.
+        """
+        from firebase_admin import firestore
+
+        reads: Counter = Counter()
+        attempts: List[Transaction] = []
+
+        def attempt(transaction):
+            attempts.append(Transaction(self, transaction, reads))
+            return func(attempts[-1])
+
+        def run_transaction():
+            return firestore.transactional(attempt)(self.client.transaction(max_attempts=max_attempts))
+
+        try:
+            result = await self.run(collection, run_transaction)
+        finally:
+            for path, amount in reads.items():
+                record_firestore_operation(path, "read", amount)
+        for path, amount in attempts[-1].writes.items():
+            record_firestore_operation(path, "write", amount)
+        return result
+
+    def shutdown(self):
+        """Libera los hilos del pool. Se vuelve a crear si se usa de nuevo."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+datastore = DataStore(limits=parse_collection_limits(FIRESTORE_COLLECTION_LIMITS))
@@ -0,0 +1,85 @@
+import gzip
+import json
+import os
+from datetime import date, datetime, time
+from typing import Any, Dict, Optional, Type
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+# dependencia opcional: si no esta instalada se usa json de la libreria estandar
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+# si es true, los endpoints que lo usan devuelven la respuesta sin pasar por response_model
+FAST_RESPONSES_ENABLED = os.getenv("FAST_RESPONSES_ENABLED", "false").lower() in ("1", "true", "yes")
+# solo se comprimen las respuestas de al menos este tamaño (bytes)
+FAST_RESPONSE_COMPRESSION_THRESHOLD = int(os.getenv("FAST_RESPONSE_COMPRESSION_THRESHOLD", "4096"))
+FAST_RESPONSE_COMPRESSION_LEVEL = int(os.getenv("FAST_RESPONSE_COMPRESSION_LEVEL", "5"))
+
+
+def _default(value: Any) -> Any:
+    # orjson solo serializa datetime exactos; los de Firestore (DatetimeWithNanoseconds) son subclases
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, BaseModel):
+        return value.dict()
+    # el resto de tipos (Decimal, UUID, sets...) como los codifica FastAPI
+    return jsonable_encoder(value)
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializa a JSON compacto con el mismo resultado que jsonable_encoder + JSONResponse
+    (fechas en ISO 8601), con orjson si esta disponible.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return any(
+        coding.split(";")[0].strip() == "gzip"
+        for coding in request.headers.get("accept-encoding", "").split(",")
+    )
+
+
+def fast_json_response(request: Request, content: Dict[str, Any], model: Optional[Type[BaseModel]] = None, status_code: int = 200) -> Response:
+    """
+    Respuesta JSON para datos que ya construye el propio servicio (de confianza):
+    no se validan otra vez con el response_model, se serializan con dumps y, si
+    ocupan al menos FAST_RESPONSE_COMPRESSION_THRESHOLD y el cliente lo acepta,
+    se comprimen con gzip.
+    Args:
+        request (Request): Petición, para leer Accept-Encoding.
+        content (dict): Datos de la respuesta.
+        model (BaseModel, optional): Si se indica, solo se envían sus campos (como
+            hace response_model), sin validar los valores.
+        status_code (int): Código de estado.
+    Returns:
+        Response: Respuesta ya serializada.
+    """
+    if model is not None:
+        content = {name: content.get(name, field.default) for name, field in model.__fields__.items()}
+    body = dumps(content)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= FAST_RESPONSE_COMPRESSION_THRESHOLD and _accepts_gzip(request):
+        body = gzip.compress(body, compresslevel=FAST_RESPONSE_COMPRESSION_LEVEL, mtime=0)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+def trusted_response(request: Request, content: Dict[str, Any], model: Type[BaseModel]):
+    """
+    Punto de entrada de los endpoints: con FAST_RESPONSES_ENABLED devuelve
+    fast_json_response; si no, devuelve el contenido tal cual para que FastAPI
+    lo valide con el response_model y lo serialice como siempre.
+    """
+    if not FAST_RESPONSES_ENABLED:
+        return content
+    return fast_json_response(request, content, model)
@@ -3,6 +3,8 @@ from firebase_admin import credentials, auth, firestore
 from dotenv import load_dotenv
 import os
 import logging #libreria logs
+import threading
+import time
 
 
 load_dotenv()  # Cargar variables de entorno desde el archivo .env
@@ -12,34 +14,68 @@ FIREBASE_API_KEY = os.getenv("FIREBASE_API_KEY")
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-try:
-    #ruta al archivo de credenciales de Firebase
-    BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    certificate_path = os.path.join(BASE_DIR, "serviceAccountKey.json")
-    print("🔥 RUTA CORRECTA:", certificate_path)
-    
-    #certificate_path = "serviceAccountKey.json"
-    #verificar que el archivo existe
-    if not os.path.exists(certificate_path):
-        raise FileNotFoundError(f"No se encontró el archivo de certificado: {certificate_path}")
-    #carga credenciales
-    cred = credentials.Certificate(certificate_path)
-    #inicializar la app de Firebase si no esta incializada
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-    #obtener cliente de Firestore
-    db = firestore.client()
-    logger.info("Firebase Admin SDK inicializado correctamente.")
-except Exception as e:
-    logger.error(f"Error al inicializar Firebase Admin SDK: {e}")
-    raise
+#ruta al archivo de credenciales de Firebase (configurable con FIREBASE_CREDENTIALS)
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CERTIFICATE_PATH = os.getenv("FIREBASE_CREDENTIALS", os.path.join(BASE_DIR, "serviceAccountKey.json"))
+
+_lock = threading.Lock()
+_db = None
+
+
+def initialize():
+    """
+    Inicializa el Firebase Admin SDK y crea el cliente de Firestore. Se llama al
+    arrancar la app (startup) y, si no, la primera vez que se pide el cliente;
+    importar este modulo no carga credenciales. Llamadas posteriores no hacen nada.
+    Returns:
+        Cliente de Firestore.
+    Raises:
+        FileNotFoundError: Si no existe el archivo de credenciales.
+    """
+    global _db
+    if _db is not None:
+        return _db
+    with _lock:
+        if _db is not None:
+            return _db
+        start = time.perf_counter()
+        try:
+            #verificar que el archivo existe
+            if not os.path.exists(CERTIFICATE_PATH):
+                raise FileNotFoundError(f"No se encontró el archivo de certificado: {CERTIFICATE_PATH}")
+            #carga credenciales
+            cred = credentials.Certificate(CERTIFICATE_PATH)
+            #inicializar la app de Firebase si no esta incializada
+            if not firebase_admin._apps:
+                firebase_admin.initialize_app(cred)
+            #obtener cliente de Firestore
+            _db = firestore.client()
+        except Exception as e:
+            logger.error(f"Error al inicializar Firebase Admin SDK: {e}")
+            raise
+        logger.info(f"Firebase Admin SDK inicializado correctamente en {(time.perf_counter() - start) * 1000:.0f} ms.")
+        return _db
+
+
+def get_db():
+    """Cliente de Firestore; inicializa el SDK si aun no se ha hecho."""
+    return _db if _db is not None else initialize()
+
+
+def __getattr__(name):
+    # compatibilidad con "from app.config.firebase import db": el cliente se crea al pedirlo
+    if name == "db":
+        return get_db()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_auth():
     """
     Obtiene la instancia de autenticación de Firebase.
-    
+
     Returns:
         El cliente de autenticación de Firebase para operaciones como
         verificación de tokens, creación de usuarios, etc.
     """
-    return auth
\ No newline at end of file
+    initialize()
+    return auth
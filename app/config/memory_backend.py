@@ -0,0 +1,909 @@
+"""
+Backend en memoria de Firestore y Firebase Authentication.
+
+Implementa la parte del API de los SDK que usan los servicios (colecciones y
+subcolecciones, consultas, batches, transacciones, listeners, transforms y la
+gestion de usuarios y tokens) para poder ejecutar los tests y las pruebas de
+carga sin credenciales ni red. Se activa con FIREBASE_BACKEND=memory.
+
+Los ID tokens se firman de verdad (RS256) con una clave generada al arrancar,
+de modo que la verificacion local de token_cache se ejecuta igual que en
+produccion. Cada operacion queda contada por coleccion en MemoryFirestore.ops.
+"""
+import copy
+import datetime
+import json
+import secrets
+import string
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from firebase_admin import auth
+from google.api_core.exceptions import Aborted, NotFound
+from google.cloud.firestore_v1 import transforms
+
+MEMORY_PROJECT_ID = "devquest-memory"
+MEMORY_KEY_ID = "devquest-memory-key"
+# duracion de los ID tokens emitidos por el backend en memoria
+MEMORY_TOKEN_LIFETIME_SECONDS = 3600
+
+_AUTO_ID_ALPHABET = string.ascii_letters + string.digits
+_NAME_FIELD = "__name__"
+
+
+def _auto_id() -> str:
+    # mismo formato que los ids autogenerados por el SDK (20 caracteres alfanumericos)
+    return "".join(secrets.choice(_AUTO_ID_ALPHABET) for _ in range(20))
+
+
+def _now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# valores y rutas de campos
+# ---------------------------------------------------------------------------
+
+def _type_rank(value: Any) -> int:
+    # orden entre tipos de Firestore: null < bool < numero < fecha < texto < bytes < array < mapa
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime.datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, (bytes, bytearray)):
+        return 5
+    if isinstance(value, (list, tuple)):
+        return 8
+    return 9
+
+
+def _sort_key(value: Any) -> Tuple:
+    rank = _type_rank(value)
+    if rank == 3 and value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    if rank == 8:
+        return (rank, tuple(_sort_key(item) for item in value))
+    if rank == 9:
+        return (rank, tuple(sorted((key, _sort_key(item)) for key, item in value.items())))
+    return (rank, value)
+
+
+def _equals(left: Any, right: Any) -> bool:
+    # en Firestore 1 == 1.0 pero True != 1
+    return _sort_key(left) == _sort_key(right)
+
+
+_MISSING = object()
+
+
+def _get_field(data: Dict[str, Any], field_path: str) -> Any:
+    value: Any = data
+    for part in field_path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data: Dict[str, Any], field_path: str, value: Any):
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+
+def _delete_field(data: Dict[str, Any], field_path: str):
+    parts = field_path.split(".")
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _transform(current: Any, value: Any) -> Any:
+    """Valor resultante de escribir value sobre current (aplica los transforms)."""
+    if value is transforms.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, transforms.Increment):
+        return current + value.value if _is_number(current) else value.value
+    if isinstance(value, transforms.Maximum):
+        return max(current, value.value) if _is_number(current) else value.value
+    if isinstance(value, transforms.Minimum):
+        return min(current, value.value) if _is_number(current) else value.value
+    if isinstance(value, transforms.ArrayUnion):
+        result = list(current) if isinstance(current, list) else []
+        for item in value.values:
+            if not any(_equals(item, existing) for existing in result):
+                result.append(copy.deepcopy(item))
+        return result
+    if isinstance(value, transforms.ArrayRemove):
+        if not isinstance(current, list):
+            return []
+        return [item for item in current if not any(_equals(item, removed) for removed in value.values)]
+    if isinstance(value, dict):
+        return {key: _transform(_MISSING, item) for key, item in value.items() if item is not transforms.DELETE_FIELD}
+    return copy.deepcopy(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]):
+    # set(merge=True): los mapas se fusionan campo a campo
+    for key, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            target.pop(key, None)
+        elif isinstance(value, dict) and value:
+            child = target.get(key)
+            if not isinstance(child, dict):
+                child = target[key] = {}
+            _merge(child, value)
+        else:
+            target[key] = _transform(target.get(key, _MISSING), value)
+
+
+def _apply_set(existing: Optional[Dict[str, Any]], data: Dict[str, Any], merge: bool) -> Dict[str, Any]:
+    result = copy.deepcopy(existing) if merge and existing is not None else {}
+    _merge(result, data)
+    return result
+
+
+def _apply_update(existing: Optional[Dict[str, Any]], data: Dict[str, Any], path: str) -> Dict[str, Any]:
+    if existing is None:
+        raise NotFound(f"No document to update: {path}")
+    result = copy.deepcopy(existing)
+    # en update() las claves son rutas de campo ("a.b") y los mapas se sustituyen
+    for field_path, value in data.items():
+        if value is transforms.DELETE_FIELD:
+            _delete_field(result, field_path)
+        else:
+            current = _get_field(result, field_path)
+            _set_field(result, field_path, _transform(current, value))
+    return result
+
+
+# ---------------------------------------------------------------------------
+# documentos
+# ---------------------------------------------------------------------------
+
+class _StoredDocument:
+    __slots__ = ("data", "version", "create_time", "update_time")
+
+    def __init__(self, data: Dict[str, Any], version: int, create_time: datetime.datetime, update_time: datetime.datetime):
+        self.data = data
+        self.version = version
+        self.create_time = create_time
+        self.update_time = update_time
+
+
+class MemoryDocumentSnapshot:
+    """Equivalente a DocumentSnapshot: copia de un documento en el momento de la lectura."""
+
+    def __init__(self, reference: "MemoryDocumentReference", stored: Optional[_StoredDocument]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = stored is not None
+        self._data = stored.data if stored is not None else None
+        self.create_time = stored.create_time if stored is not None else None
+        self.update_time = stored.update_time if stored is not None else None
+        self.read_time = _now()
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self.exists else None
+
+    def get(self, field_path: str) -> Any:
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class MemoryDocumentReference:
+    """Equivalente a DocumentReference."""
+
+    def __init__(self, client: "MemoryFirestore", collection_path: str, doc_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = doc_id
+        self.path = f"{collection_path}/{doc_id}"
+
+    @property
+    def parent(self) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, self._collection_path)
+
+    def collection(self, name: str) -> "MemoryCollectionReference":
+        return MemoryCollectionReference(self._client, f"{self.path}/{name}")
+
+    def get(self, field_paths: Optional[Iterable[str]] = None, transaction: Optional["MemoryTransaction"] = None) -> MemoryDocumentSnapshot:
+        return self._client._get_document(self, transaction)
+
+    def set(self, document_data: Dict[str, Any], merge: bool = False):
+        return self._client._commit([("set", self, document_data, merge)])[0]
+
+    def update(self, field_updates: Dict[str, Any]):
+        return self._client._commit([("update", self, field_updates, False)])[0]
+
+    def create(self, document_data: Dict[str, Any]):
+        return self._client._commit([("create", self, document_data, False)])[0]
+
+    def delete(self):
+        return self._client._commit([("delete", self, None, False)])[0]
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, MemoryDocumentReference) and other.path == self.path
+
+    def __hash__(self) -> int:
+        return hash(self.path)
+
+
+class MemoryWriteResult:
+    def __init__(self, update_time: datetime.datetime):
+        self.update_time = update_time
+
+
+# ---------------------------------------------------------------------------
+# consultas
+# ---------------------------------------------------------------------------
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "==": _equals,
+    "!=": lambda value, other: not _equals(value, other),
+    "<": lambda value, other: _type_rank(value) == _type_rank(other) and _sort_key(value) < _sort_key(other),
+    "<=": lambda value, other: _type_rank(value) == _type_rank(other) and _sort_key(value) <= _sort_key(other),
+    ">": lambda value, other: _type_rank(value) == _type_rank(other) and _sort_key(value) > _sort_key(other),
+    ">=": lambda value, other: _type_rank(value) == _type_rank(other) and _sort_key(value) >= _sort_key(other),
+    "in": lambda value, options: any(_equals(value, option) for option in options),
+    "not-in": lambda value, options: not any(_equals(value, option) for option in options),
+    "array_contains": lambda value, item: isinstance(value, list) and any(_equals(element, item) for element in value),
+    "array_contains_any": lambda value, items: isinstance(value, list) and any(
+        _equals(element, item) for element in value for item in items
+    ),
+}
+
+
+class MemoryQuery:
+    """
+    Equivalente a Query: where, order_by, limit, start_after/start_at, get y
+    stream. Inmutable, como en el SDK: cada metodo devuelve una consulta nueva.
+    """
+
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(
+        self,
+        client: "MemoryFirestore",
+        path: str,
+        all_descendants: bool = False,
+        filters: Tuple = (),
+        orders: Tuple = (),
+        limit: Optional[int] = None,
+        cursor: Optional[Tuple[Any, bool]] = None,
+    ):
+        self._client = client
+        self._path = path
+        self._all_descendants = all_descendants
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> "MemoryQuery":
+        values = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit": self._limit,
+            "cursor": self._cursor,
+        }
+        values.update(changes)
+        return MemoryQuery(self._client, self._path, self._all_descendants, **values)
+
+    def where(self, field_path: str = None, op_string: str = None, value: Any = None, *, filter: Any = None) -> "MemoryQuery":
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        if op_string not in _OPERATORS:
+            raise ValueError(f"Operador no soportado: {op_string}")
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path: str, direction: str = ASCENDING) -> "MemoryQuery":
+        return self._copy(orders=self._orders + ((field_path, direction == self.DESCENDING),))
+
+    def limit(self, count: int) -> "MemoryQuery":
+        return self._copy(limit=count)
+
+    def start_after(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        return self._copy(cursor=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot: Any) -> "MemoryQuery":
+        return self._copy(cursor=(document_fields_or_snapshot, True))
+
+    def _matches(self, data: Dict[str, Any]) -> bool:
+        for field_path, op, value in self._filters:
+            current = _get_field(data, field_path)
+            # como en Firestore, los documentos sin el campo no cumplen ningun filtro
+            if current is _MISSING or not _OPERATORS[op](current, value):
+                return False
+        return True
+
+    def _order_value(self, ref: MemoryDocumentReference, data: Dict[str, Any], field_path: str) -> Any:
+        if field_path == _NAME_FIELD:
+            return ref.path if self._all_descendants else ref.id
+        return _get_field(data, field_path)
+
+    def _cursor_values(self) -> Optional[List[Any]]:
+        value, _ = self._cursor
+        if isinstance(value, MemoryDocumentSnapshot):
+            data = value._data or {}
+            values = [self._order_value(value.reference, data, field) for field, _ in self._orders]
+            if not any(field == _NAME_FIELD for field, _ in self._orders):
+                values.append(self._order_value(value.reference, data, _NAME_FIELD))
+            return values
+        if isinstance(value, dict):
+            # como en el SDK, el cursor de __name__ puede ser una referencia al documento
+            return [
+                self._order_value(value[field], {}, field) if isinstance(value[field], MemoryDocumentReference) else value[field]
+                for field, _ in self._orders if field in value
+            ]
+        return list(value)
+
+    def _run(self, transaction: Optional["MemoryTransaction"] = None) -> List[MemoryDocumentSnapshot]:
+        with self._client._lock:
+            candidates = self._client._documents_in(self._path, self._all_descendants)
+            rows = []
+            orders = list(self._orders)
+            if not any(field == _NAME_FIELD for field, _ in orders):
+                orders.append((_NAME_FIELD, orders[-1][1] if orders else False))
+            for ref, stored in candidates:
+                if not self._matches(stored.data):
+                    continue
+                values = [self._order_value(ref, stored.data, field) for field, _ in orders]
+                # los documentos sin el campo de orden quedan fuera del resultado
+                if any(value is _MISSING for value in values):
+                    continue
+                rows.append((values, ref, stored))
+
+            def key(row):
+                return [_Descending(_sort_key(value)) if desc else _sort_key(value) for value, (_, desc) in zip(row[0], orders)]
+
+            rows.sort(key=key)
+            if self._cursor is not None:
+                cursor_values = self._cursor_values()
+                inclusive = self._cursor[1]
+                cursor_key = [
+                    _Descending(_sort_key(value)) if desc else _sort_key(value)
+                    for value, (_, desc) in zip(cursor_values, orders)
+                ]
+                size = len(cursor_key)
+                rows = [row for row in rows if (key(row)[:size] >= cursor_key if inclusive else key(row)[:size] > cursor_key)]
+            if self._limit is not None:
+                rows = rows[:self._limit]
+            snapshots = [MemoryDocumentSnapshot(ref, stored) for _, ref, stored in rows]
+            if transaction is not None:
+                for _, ref, stored in rows:
+                    transaction._record_read(ref.path, stored.version)
+        collection = self._path.rsplit("/", 1)[-1]
+        self._client.ops.record(collection, "queries", 1)
+        # una consulta sin resultados se cobra como una lectura
+        self._client.ops.record(collection, "reads", max(1, len(snapshots)))
+        return snapshots
+
+    def get(self, transaction: Optional["MemoryTransaction"] = None) -> List[MemoryDocumentSnapshot]:
+        return self._run(transaction)
+
+    def stream(self, transaction: Optional["MemoryTransaction"] = None):
+        yield from self._run(transaction)
+
+
+class _Descending:
+    """Invierte la comparacion de una clave de orden (order_by DESCENDING)."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: Any):
+        self.key = key
+
+    def __lt__(self, other: "_Descending") -> bool:
+        return other.key < self.key
+
+    def __gt__(self, other: "_Descending") -> bool:
+        return other.key > self.key
+
+    def __le__(self, other: "_Descending") -> bool:
+        return other.key <= self.key
+
+    def __ge__(self, other: "_Descending") -> bool:
+        return other.key >= self.key
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, _Descending) and other.key == self.key
+
+
+class MemoryCollectionReference(MemoryQuery):
+    """Equivalente a CollectionReference."""
+
+    def __init__(self, client: "MemoryFirestore", path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id: Optional[str] = None) -> MemoryDocumentReference:
+        return MemoryDocumentReference(self._client, self._path, document_id or _auto_id())
+
+    def add(self, document_data: Dict[str, Any], document_id: Optional[str] = None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+    def list_documents(self) -> List[MemoryDocumentReference]:
+        with self._client._lock:
+            return [ref for ref, _ in self._client._documents_in(self._path, False)]
+
+    def on_snapshot(self, callback: Callable) -> "MemoryWatch":
+        """Llama a callback(documentos, cambios, read_time) ahora y tras cada escritura en la coleccion."""
+        return self._client._watch(self._path, callback)
+
+
+class MemoryWatch:
+    def __init__(self, client: "MemoryFirestore", path: str, callback: Callable):
+        self._client = client
+        self.path = path
+        self.callback = callback
+
+    @property
+    def is_active(self) -> bool:
+        return self in self._client._watches
+
+    def unsubscribe(self):
+        self._client._unwatch(self)
+
+
+# ---------------------------------------------------------------------------
+# batches y transacciones
+# ---------------------------------------------------------------------------
+
+Operation = Tuple[str, MemoryDocumentReference, Any, bool]
+
+
+class MemoryWriteBatch:
+    """Equivalente a WriteBatch: las escrituras se aplican todas o ninguna en commit()."""
+
+    def __init__(self, client: "MemoryFirestore"):
+        self._client = client
+        self._operations: List[Operation] = []
+
+    def set(self, reference: MemoryDocumentReference, document_data: Dict[str, Any], merge: bool = False):
+        self._operations.append(("set", reference, document_data, merge))
+
+    def update(self, reference: MemoryDocumentReference, field_updates: Dict[str, Any]):
+        self._operations.append(("update", reference, field_updates, False))
+
+    def create(self, reference: MemoryDocumentReference, document_data: Dict[str, Any]):
+        self._operations.append(("create", reference, document_data, False))
+
+    def delete(self, reference: MemoryDocumentReference):
+        self._operations.append(("delete", reference, None, False))
+
+    def __len__(self) -> int:
+        return len(self._operations)
+
+    def commit(self) -> List[MemoryWriteResult]:
+        operations, self._operations = self._operations, []
+        return self._client._commit(operations)
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """
+    Transaccion optimista compatible con firestore.transactional: guarda la
+    version de cada documento leido y el commit falla con Aborted (y el
+    decorador reintenta) si alguno ha cambiado entretanto.
+    """
+
+    def __init__(self, client: "MemoryFirestore", max_attempts: int = 5, read_only: bool = False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id: Optional[bytes] = None
+        self._reads: Dict[str, int] = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    @property
+    def id(self) -> Optional[bytes]:
+        return self._id
+
+    def _record_read(self, path: str, version: int):
+        self._reads.setdefault(path, version)
+
+    def _clean_up(self):
+        self._operations = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id: Optional[bytes] = None):
+        if self.in_progress:
+            raise ValueError("La transaccion ya esta en curso")
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self) -> List[MemoryWriteResult]:
+        if not self.in_progress:
+            raise ValueError("La transaccion no esta en curso")
+        operations, reads = self._operations, self._reads
+        try:
+            return self._client._commit(operations, expected_versions=reads)
+        finally:
+            self._clean_up()
+
+    def commit(self):
+        return self._commit()
+
+
+# ---------------------------------------------------------------------------
+# cliente
+# ---------------------------------------------------------------------------
+
+class OperationCounter:
+    """Operaciones de Firestore por coleccion: reads, writes, queries y commits."""
+
+    KINDS = ("reads", "writes", "queries", "commits")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def record(self, collection: str, kind: str, amount: int = 1):
+        with self._lock:
+            self._counts[(collection, kind)] += amount
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Contadores actuales, {coleccion: {tipo: total}}."""
+        with self._lock:
+            result: Dict[str, Dict[str, int]] = {}
+            for (collection, kind), count in self._counts.items():
+                result.setdefault(collection, dict.fromkeys(self.KINDS, 0))[kind] = count
+            return result
+
+    def totals(self) -> Dict[str, int]:
+        """Total de cada tipo de operacion sumando todas las colecciones."""
+        with self._lock:
+            totals = dict.fromkeys(self.KINDS, 0)
+            for (_, kind), count in self._counts.items():
+                totals[kind] += count
+            return totals
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+class MemoryFirestore:
+    """
+    Cliente de Firestore en memoria, seguro entre hilos (el DataStore lo usa
+    desde su pool). Los documentos se guardan por ruta de coleccion.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._collections: Dict[str, Dict[str, _StoredDocument]] = {}
+        self._watches: List[MemoryWatch] = []
+        self._version = 0
+        self.ops = OperationCounter()
+
+    def collection(self, path: str) -> MemoryCollectionReference:
+        return MemoryCollectionReference(self, path.strip("/"))
+
+    def document(self, path: str) -> MemoryDocumentReference:
+        collection_path, _, doc_id = path.strip("/").rpartition("/")
+        return MemoryDocumentReference(self, collection_path, doc_id)
+
+    def collection_group(self, collection_id: str) -> MemoryQuery:
+        return MemoryQuery(self, collection_id, all_descendants=True)
+
+    def get_all(self, references: Iterable[MemoryDocumentReference], field_paths=None, transaction: Optional[MemoryTransaction] = None):
+        """Equivalente a Client.get_all: un snapshot por referencia (existan o no)."""
+        for ref in references:
+            yield self._get_document(ref, transaction)
+
+    def batch(self) -> MemoryWriteBatch:
+        return MemoryWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False) -> MemoryTransaction:
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def load(self, documents: Dict[str, Dict[str, Any]]):
+        """
+        Carga documentos iniciales sin contar operaciones.
+        Args:
+            documents (dict): {"coleccion/doc" o "col/doc/subcol/doc": datos}.
+        """
+        with self._lock:
+            now = _now()
+            for path, data in documents.items():
+                collection_path, _, doc_id = path.strip("/").rpartition("/")
+                self._version += 1
+                self._collections.setdefault(collection_path, {})[doc_id] = _StoredDocument(
+                    copy.deepcopy(data), self._version, now, now
+                )
+
+    def dump(self) -> Dict[str, Dict[str, Any]]:
+        """Copia de todos los documentos, {ruta: datos}."""
+        with self._lock:
+            return {
+                f"{collection_path}/{doc_id}": copy.deepcopy(stored.data)
+                for collection_path, docs in self._collections.items()
+                for doc_id, stored in docs.items()
+            }
+
+    def reset(self):
+        """Borra todos los documentos y los contadores de operaciones."""
+        with self._lock:
+            self._collections.clear()
+            self.ops.reset()
+
+    def _documents_in(self, path: str, all_descendants: bool) -> List[Tuple[MemoryDocumentReference, _StoredDocument]]:
+        if not all_descendants:
+            docs = self._collections.get(path, {})
+            return [(MemoryDocumentReference(self, path, doc_id), stored) for doc_id, stored in docs.items()]
+        # collection_group: todas las colecciones con ese id, a cualquier profundidad
+        return [
+            (MemoryDocumentReference(self, collection_path, doc_id), stored)
+            for collection_path, docs in self._collections.items()
+            if collection_path.rsplit("/", 1)[-1] == path
+            for doc_id, stored in docs.items()
+        ]
+
+    def _get_document(self, ref: MemoryDocumentReference, transaction: Optional[MemoryTransaction]) -> MemoryDocumentSnapshot:
+        with self._lock:
+            stored = self._collections.get(ref._collection_path, {}).get(ref.id)
+            if transaction is not None:
+                transaction._record_read(ref.path, stored.version if stored is not None else 0)
+            snapshot = MemoryDocumentSnapshot(ref, stored)
+        self.ops.record(ref._collection_path.rsplit("/", 1)[-1], "reads")
+        return snapshot
+
+    def _commit(self, operations: List[Operation], expected_versions: Optional[Dict[str, int]] = None) -> List[MemoryWriteResult]:
+        with self._lock:
+            if expected_versions:
+                for path, version in expected_versions.items():
+                    collection_path, _, doc_id = path.rpartition("/")
+                    stored = self._collections.get(collection_path, {}).get(doc_id)
+                    if (stored.version if stored is not None else 0) != version:
+                        raise Aborted(f"Contention on document {path}")
+            # se calculan todos los documentos resultantes antes de aplicar ninguno
+            staged: Dict[str, Tuple[MemoryDocumentReference, Optional[Dict[str, Any]]]] = {}
+            for kind, ref, data, merge in operations:
+                if ref.path in staged:
+                    current = staged[ref.path][1]
+                else:
+                    stored = self._collections.get(ref._collection_path, {}).get(ref.id)
+                    current = stored.data if stored is not None else None
+                if kind == "set":
+                    result = _apply_set(current, data, merge)
+                elif kind == "create":
+                    if current is not None:
+                        raise ValueError(f"Document already exists: {ref.path}")
+                    result = _apply_set(None, data, False)
+                elif kind == "update":
+                    result = _apply_update(current, data, ref.path)
+                else:
+                    result = None
+                staged[ref.path] = (ref, result)
+
+            now = _now()
+            touched = set()
+            for ref, data in staged.values():
+                docs = self._collections.setdefault(ref._collection_path, {})
+                touched.add(ref._collection_path)
+                if data is None:
+                    docs.pop(ref.id, None)
+                    continue
+                previous = docs.get(ref.id)
+                self._version += 1
+                docs[ref.id] = _StoredDocument(data, self._version, previous.create_time if previous else now, now)
+            watches = [watch for watch in self._watches if watch.path in touched]
+
+        for kind, ref, _, _ in operations:
+            self.ops.record(ref._collection_path.rsplit("/", 1)[-1], "writes")
+        if operations:
+            self.ops.record(operations[0][1]._collection_path.rsplit("/", 1)[-1], "commits")
+        # los listeners se llaman fuera del lock, como los del SDK (en otro hilo)
+        for watch in watches:
+            self._notify(watch, [ref for ref, _ in staged.values() if ref._collection_path == watch.path])
+        return [MemoryWriteResult(now) for _ in operations]
+
+    def _watch(self, path: str, callback: Callable) -> MemoryWatch:
+        watch = MemoryWatch(self, path, callback)
+        with self._lock:
+            self._watches.append(watch)
+            refs = [ref for ref, _ in self._documents_in(path, False)]
+        self._notify(watch, refs)
+        return watch
+
+    def _unwatch(self, watch: MemoryWatch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
+
+    def _notify(self, watch: MemoryWatch, changed: List[MemoryDocumentReference]):
+        with self._lock:
+            docs = [MemoryDocumentSnapshot(ref, stored) for ref, stored in self._documents_in(watch.path, False)]
+        watch.callback(docs, changed, _now())
+
+
+# ---------------------------------------------------------------------------
+# autenticacion
+# ---------------------------------------------------------------------------
+
+class MemoryUserRecord:
+    """Equivalente a auth.UserRecord con los campos que usa la app."""
+
+    def __init__(self, uid: str, email: Optional[str], display_name: Optional[str]):
+        self.uid = uid
+        self.email = email
+        self.display_name = display_name
+        self.custom_claims: Optional[Dict[str, Any]] = None
+        self.disabled = False
+
+
+class MemoryAuth:
+    """
+    Firebase Authentication en memoria: usuarios con contraseña, custom claims,
+    ID tokens RS256 firmados con una clave propia y el endpoint
+    accounts:signInWithPassword de Identity Toolkit (via transport()).
+    """
+
+    def __init__(self, project_id: str = MEMORY_PROJECT_ID):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        from google.auth import crypt
+
+        self.project_id = project_id
+        self._lock = threading.Lock()
+        self._users: Dict[str, MemoryUserRecord] = {}
+        self._by_email: Dict[str, str] = {}
+        self._passwords: Dict[str, str] = {}
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        private_pem = key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        public_pem = key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        self._signer = crypt.RSASigner.from_string(private_pem, key_id=MEMORY_KEY_ID)
+        self._certificates = {MEMORY_KEY_ID: public_pem.decode("ascii")}
+
+    def certificates(self) -> Dict[str, str]:
+        """Claves publicas de firma por kid, como las que publica securetoken de Google."""
+        return dict(self._certificates)
+
+    def reset(self):
+        """Borra todos los usuarios."""
+        with self._lock:
+            self._users.clear()
+            self._by_email.clear()
+            self._passwords.clear()
+
+    def create_user(self, email: str = None, password: str = None, display_name: str = None, uid: str = None, **kwargs) -> MemoryUserRecord:
+        if password is not None and len(password) < 6:
+            raise ValueError("Invalid password string. Password must be a string at least 6 characters long.")
+        with self._lock:
+            if email is not None and email.lower() in self._by_email:
+                raise auth.EmailAlreadyExistsError("The user with the provided email already exists (EMAIL_EXISTS).", None, None)
+            uid = uid or _auto_id()
+            user = MemoryUserRecord(uid, email, display_name)
+            self._users[uid] = user
+            if email is not None:
+                self._by_email[email.lower()] = uid
+            if password is not None:
+                self._passwords[uid] = password
+            return user
+
+    def get_user(self, uid: str) -> MemoryUserRecord:
+        user = self._users.get(uid)
+        if user is None:
+            raise auth.UserNotFoundError(f"No user record found for the provided user ID: {uid}.")
+        return user
+
+    def get_user_by_email(self, email: str) -> MemoryUserRecord:
+        uid = self._by_email.get((email or "").lower())
+        if uid is None:
+            raise auth.UserNotFoundError(f"No user record found for the provided email: {email}.")
+        return self._users[uid]
+
+    def set_custom_user_claims(self, uid: str, custom_claims: Optional[Dict[str, Any]]):
+        self.get_user(uid).custom_claims = dict(custom_claims) if custom_claims else None
+
+    def create_custom_token(self, uid: str, developer_claims: Optional[Dict[str, Any]] = None) -> bytes:
+        from google.auth import jwt
+
+        now = int(time.time())
+        payload = {
+            "iss": f"memory@{self.project_id}",
+            "sub": f"memory@{self.project_id}",
+            "aud": "https://identitytoolkit.googleapis.com/google.identity.identitytoolkit.v1.IdentityToolkit",
+            "uid": uid,
+            "iat": now,
+            "exp": now + MEMORY_TOKEN_LIFETIME_SECONDS,
+        }
+        if developer_claims:
+            payload["claims"] = developer_claims
+        return jwt.encode(self._signer, payload)
+
+    def mint_id_token(self, uid: str) -> str:
+        """Emite un ID token firmado para el usuario, como hace Identity Toolkit al iniciar sesion."""
+        from google.auth import jwt
+
+        user = self.get_user(uid)
+        now = int(time.time())
+        payload = {
+            **(user.custom_claims or {}),
+            "iss": f"https://securetoken.google.com/{self.project_id}",
+            "aud": self.project_id,
+            "auth_time": now,
+            "user_id": uid,
+            "sub": uid,
+            "iat": now,
+            "exp": now + MEMORY_TOKEN_LIFETIME_SECONDS,
+            "email": user.email,
+            "email_verified": False,
+            "firebase": {"identities": {"email": [user.email]}, "sign_in_provider": "password"},
+        }
+        return jwt.encode(self._signer, payload).decode("ascii")
+
+    def verify_id_token(self, id_token: str, check_revoked: bool = False) -> Dict[str, Any]:
+        from google.auth import jwt
+
+        claims = jwt.decode(id_token, certs=self._certificates, audience=self.project_id)
+        claims["uid"] = claims["sub"]
+        return claims
+
+    def sign_in_with_password(self, email: str, password: str) -> Optional[Dict[str, Any]]:
+        """Respuesta de accounts:signInWithPassword, o None si las credenciales no son validas."""
+        uid = self._by_email.get((email or "").lower())
+        if uid is None or self._passwords.get(uid) != password:
+            return None
+        return {
+            "kind": "identitytoolkit#VerifyPasswordResponse",
+            "localId": uid,
+            "email": self._users[uid].email,
+            "idToken": self.mint_id_token(uid),
+            "registered": True,
+            "refreshToken": secrets.token_urlsafe(32),
+            "expiresIn": str(MEMORY_TOKEN_LIFETIME_SECONDS),
+        }
+
+    def handle_identity_request(self, request: httpx.Request) -> httpx.Response:
+        """Atiende las peticiones al API REST de Identity Toolkit."""
+        if not request.url.path.endswith("accounts:signInWithPassword"):
+            return httpx.Response(404, json={"error": {"code": 404, "message": "NOT_FOUND"}})
+        payload = json.loads(request.content or b"{}")
+        result = self.sign_in_with_password(payload.get("email"), payload.get("password"))
+        if result is None:
+            return httpx.Response(400, json={"error": {"code": 400, "message": "INVALID_LOGIN_CREDENTIALS"}})
+        return httpx.Response(200, json=result)
+
+    def transport(self) -> httpx.MockTransport:
+        """Transporte httpx que responde como Identity Toolkit sin salir a la red."""
+        return httpx.MockTransport(self.handle_identity_request)
@@ -0,0 +1,32 @@
+import json
+import logging
+from typing import Any, AsyncIterator, Dict
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def _ndjson_lines(rows: AsyncIterator[Dict[str, Any]]):
+    try:
+        async for row in rows:
+            yield json.dumps(jsonable_encoder(row)) + "\n"
+    except Exception as e:
+        # las cabeceras ya se han enviado: solo se puede cortar el stream
+        logger.error(f"Error durante la respuesta NDJSON: {e}")
+        raise
+
+
+def ndjson_response(rows: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """
+    Respuesta NDJSON (un objeto JSON por linea) que serializa cada fila segun llega,
+    sin construir la lista completa en memoria.
+    Args:
+        rows (AsyncIterator[dict]): Filas a enviar.
+    Returns:
+        StreamingResponse: Respuesta con media type application/x-ndjson.
+    """
+    return StreamingResponse(_ndjson_lines(rows), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.config.datastore import WriteBatch, datastore
+from .json_patch import JsonPatchError, apply_patch
+from .state_codec import StateCodecError, StateTooLargeError, state_codec
+
+logger = logging.getLogger(__name__)
+
+# estados guardados: level_states/{uid}_{level_id}
+STATES_COLLECTION = "level_states"
+# cada cuanto se escriben en Firestore los estados pendientes
+STATE_FLUSH_INTERVAL_SECONDS = float(os.getenv("STATE_FLUSH_INTERVAL_SECONDS", "30"))
+# los estados ya guardados sin actividad durante este tiempo salen del buffer
+STATE_BUFFER_IDLE_SECONDS = float(os.getenv("STATE_BUFFER_IDLE_SECONDS", "600"))
+
+StateKey = Tuple[str, int]
+
+
+def state_doc_id(uid: str, level_id: int) -> str:
+    return f"{uid}_{level_id}"
+
+
+@dataclass
+class BufferedState:
+    state: Dict[str, Any]
+    version: int
+    timestamp: datetime
+    dirty: bool
+    touched_at: float
+    # campos codificados (state_blob, state_encoding) listos para escribir
+    encoded: Optional[Dict[str, Any]] = None
+
+    def to_response(self, level_id: int) -> Dict[str, Any]:
+        return {"level_id": level_id, "state": self.state, "version": self.version, "timestamp": self.timestamp}
+
+
+class StateBuffer:
+    """
+    Buffer de escritura diferida para los estados de nivel (autoguardado).
+
+    Solo se conserva el ultimo estado de cada (uid, level_id) y se escribe en
+    Firestore cada STATE_FLUSH_INTERVAL_SECONDS, al completar el nivel y al parar
+    la app, de forma que varios autoguardados seguidos cuestan una sola escritura.
+    Cada estado lleva un numero de version que permite a los clientes enviar
+    solo un JSON Patch sobre la version que conocen.
+
+    El buffer es local a cada proceso: con varios workers, un mismo usuario debe
+    ir siempre al mismo (afinidad de sesion) para leer sus ultimos cambios.
+    """
+
+    def __init__(self, flush_interval: float = STATE_FLUSH_INTERVAL_SECONDS, idle_seconds: float = STATE_BUFFER_IDLE_SECONDS):
+        self.flush_interval = flush_interval
+        self.idle_seconds = idle_seconds
+        self._entries: Dict[StateKey, BufferedState] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """Numero de estados pendientes de escribir."""
+        return sum(1 for entry in self._entries.values() if entry.dirty)
+
+    async def _entry(self, uid: str, level_id: int) -> Optional[BufferedState]:
+        key = (uid, level_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+        doc = await datastore.get(STATES_COLLECTION, state_doc_id(uid, level_id))
+        # otra peticion ha podido guardar mientras se leia
+        entry = self._entries.get(key)
+        if entry is not None or not doc.exists:
+            return entry
+        data = doc.to_dict()
+        try:
+            state = state_codec.decode(data)
+        except StateCodecError as e:
+            logger.error(f"Estado de nivel ilegible para {uid} en nivel {level_id}: {e}")
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="El estado guardado no se puede leer")
+        entry = BufferedState(
+            state=state or {},
+            version=data.get("version", 0),
+            timestamp=data.get("timestamp") or datetime.utcnow(),
+            dirty=False,
+            touched_at=time.time(),
+        )
+        self._entries[key] = entry
+        return entry
+
+    async def _store(self, uid: str, level_id: int, state: Dict[str, Any], base: Optional[BufferedState], strict: bool = False) -> BufferedState:
+        """
+        Guarda en el buffer la version siguiente a base.
+        Args:
+            strict (bool): Si otro guardado del nivel termina mientras se codifica,
+                responder 409 en lugar de guardar encima (patches).
+        """
+        # se codifica al guardar para rechazar en el momento los estados demasiado
+        # grandes; la compresion de los estados grandes se hace fuera del event loop
+        try:
+            encoded = await state_codec.encode_async(state)
+        except StateTooLargeError as e:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Estado demasiado grande: {e}")
+        key = (uid, level_id)
+        latest = self._entries.get(key)
+        if latest is not None and latest is not base:
+            # otro guardado del mismo nivel ha terminado mientras se codificaba
+            if strict:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail=f"Versión desactualizada: la actual es {latest.version}",
+                )
+            base = latest
+        version = (base.version if base else 0) + 1
+        entry = BufferedState(state=state, version=version, timestamp=datetime.utcnow(), dirty=True, touched_at=time.time(), encoded=encoded)
+        self._entries[key] = entry
+        return entry
+
+    async def save(self, uid: str, level_id: int, state: Dict[str, Any]) -> int:
+        """
+        Guarda el estado completo de un nivel en el buffer.
+        Returns:
+            int: Nueva version del estado.
+        Raises:
+            HTTPException 413: Si el estado codificado supera STATE_MAX_BYTES.
+        """
+        current = await self._entry(uid, level_id)
+        return (await self._store(uid, level_id, state, current)).version
+
+    async def patch(self, uid: str, level_id: int, operations: List[Dict[str, Any]], base_version: int) -> int:
+        """
+        Aplica un JSON Patch sobre la version base_version del estado.
+        Returns:
+            int: Nueva version del estado.
+        Raises:
+            HTTPException 404: Si no hay estado previo sobre el que aplicar el patch.
+            HTTPException 409: Si base_version no es la version actual (el cliente debe recargar).
+            HTTPException 422: Si el patch no es valido para el estado actual.
+            HTTPException 413: Si el estado resultante supera STATE_MAX_BYTES.
+        """
+        current = await self._entry(uid, level_id)
+        if current is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No hay estado guardado para este nivel")
+        if current.version != base_version:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Versión desactualizada: la actual es {current.version}",
+            )
+        try:
+            state = apply_patch(current.state, operations)
+        except JsonPatchError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Patch inválido: {e}")
+        if not isinstance(state, dict):
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Patch inválido: el estado debe ser un objeto")
+        return (await self._store(uid, level_id, state, current, strict=True)).version
+
+    async def load(self, uid: str, level_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve el ultimo estado del nivel, primero desde el buffer y si no desde Firestore.
+        Returns:
+            dict | None: level_id, state, version y timestamp, o None si no hay estado guardado.
+        """
+        entry = await self._entry(uid, level_id)
+        if entry is None:
+            return None
+        entry.touched_at = time.time()
+        return entry.to_response(level_id)
+
+    def _add_to_batch(self, batch: WriteBatch, key: StateKey, entry: BufferedState):
+        uid, level_id = key
+        batch.set(STATES_COLLECTION, state_doc_id(uid, level_id), {
+            "uid": uid,
+            "level_id": level_id,
+            **entry.encoded,
+            "version": entry.version,
+            "timestamp": entry.timestamp,
+        })
+
+    async def flush(self, keys: Optional[Iterable[StateKey]] = None) -> int:
+        """
+        Escribe en Firestore los estados pendientes (todos o solo los de keys), en
+        batches de hasta 500 escrituras.
+        Returns:
+            int: Numero de estados escritos.
+        """
+        selected = self._entries.keys() if keys is None else [key for key in keys if key in self._entries]
+        pending = [(key, self._entries[key]) for key in list(selected) if self._entries[key].dirty]
+        written = 0
+        for start in range(0, len(pending), WriteBatch.MAX_OPERATIONS):
+            chunk = pending[start:start + WriteBatch.MAX_OPERATIONS]
+            batch = datastore.batch()
+            for key, entry in chunk:
+                self._add_to_batch(batch, key, entry)
+            try:
+                await batch.commit(STATES_COLLECTION)
+            except Exception as e:
+                # siguen pendientes y se reintentan en el siguiente flush
+                logger.error(f"Error escribiendo {len(chunk)} estados de nivel: {e}")
+                continue
+            for key, entry in chunk:
+                # si llego un estado nuevo durante el commit, sigue pendiente
+                if self._entries.get(key) is entry:
+                    entry.dirty = False
+            written += len(chunk)
+        return written
+
+    async def flush_level(self, uid: str, level_id: int) -> int:
+        """Escribe el estado pendiente de un nivel, p. ej. al completarlo."""
+        return await self.flush([(uid, level_id)])
+
+    def _evict_idle(self):
+        limit = time.time() - self.idle_seconds
+        for key in [key for key, entry in self._entries.items() if not entry.dirty and entry.touched_at < limit]:
+            del self._entries[key]
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            written = await self.flush()
+            if written:
+                logger.info(f"Autoguardado: {written} estados de nivel escritos")
+            self._evict_idle()
+
+    def start(self):
+        """Arranca el guardado periodico en segundo plano."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def stop(self):
+        """Detiene el guardado periodico y escribe lo que quede pendiente."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+state_buffer = StateBuffer()
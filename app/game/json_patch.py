@@ -0,0 +1,114 @@
+import copy
+from typing import Any, Dict, List
+
+
+class JsonPatchError(ValueError):
+    """Operacion de JSON Patch invalida o que no se puede aplicar al documento."""
+
+
+def _parse_pointer(path: str) -> List[str]:
+    # RFC 6901: "" es la raiz, "~1" es "/" y "~0" es "~"
+    if path == "":
+        return []
+    if not path.startswith("/"):
+        raise JsonPatchError(f"Ruta invalida: '{path}'")
+    return [part.replace("~1", "/").replace("~0", "~") for part in path[1:].split("/")]
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise JsonPatchError(f"Indice de lista invalido: '{token}'")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Indice fuera de rango: {index}")
+    return index
+
+
+def _resolve(document: Any, tokens: List[str]) -> Any:
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise JsonPatchError(f"No existe la clave '{token}'")
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_list_index(document, token, allow_end=False)]
+        else:
+            raise JsonPatchError(f"No se puede acceder a '{token}' en un valor escalar")
+    return document
+
+
+def _add(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, key, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"No se puede añadir '{key}' a un valor escalar")
+    return document
+
+
+def _remove(document: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise JsonPatchError("No se puede eliminar la raiz del documento")
+    parent = _resolve(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"No existe la clave '{key}'")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, key, allow_end=False))
+    raise JsonPatchError(f"No se puede eliminar '{key}' de un valor escalar")
+
+
+def apply_patch(document: Any, operations: List[Dict[str, Any]]) -> Any:
+    """
+    Aplica una lista de operaciones JSON Patch (RFC 6902: add, remove, replace,
+    move, copy y test) sobre una copia del documento.
+    Args:
+        document (Any): Documento original; no se modifica.
+        operations (List[dict]): Operaciones con "op", "path" y, segun el caso, "value" o "from".
+    Returns:
+        Any: Documento resultante.
+    Raises:
+        JsonPatchError: Si alguna operacion no es valida; en ese caso no se aplica ninguna.
+    """
+    result = copy.deepcopy(document)
+    for operation in operations:
+        op = operation.get("op")
+        if "path" not in operation:
+            raise JsonPatchError("Falta 'path' en la operacion")
+        tokens = _parse_pointer(operation["path"])
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"Falta 'value' en la operacion '{op}'")
+        if op == "add":
+            result = _add(result, tokens, copy.deepcopy(operation["value"]))
+        elif op == "remove":
+            _remove(result, tokens)
+        elif op == "replace":
+            if tokens:
+                _remove(result, tokens)
+            result = _add(result, tokens, copy.deepcopy(operation["value"]))
+        elif op in ("move", "copy"):
+            if "from" not in operation:
+                raise JsonPatchError(f"Falta 'from' en la operacion '{op}'")
+            source = _parse_pointer(operation["from"])
+            if op == "move":
+                if tokens[:len(source)] == source and tokens != source:
+                    raise JsonPatchError("No se puede mover un valor dentro de si mismo")
+                value = _remove(result, source)
+            else:
+                value = copy.deepcopy(_resolve(result, source))
+            result = _add(result, tokens, value)
+        elif op == "test":
+            if _resolve(result, tokens) != operation["value"]:
+                raise JsonPatchError(f"La comprobacion de '{operation['path']}' ha fallado")
+        else:
+            raise JsonPatchError(f"Operacion no soportada: '{op}'")
+    return result
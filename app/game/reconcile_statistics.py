@@ -0,0 +1,82 @@
+"""
+Reconstruye los agregados de estadisticas por nivel (level_stats/{level_id}/shards)
+a partir de los documentos de progreso (coleccion global progress o, con
+PROGRESS_STORAGE=user, las subcolecciones users/{uid}/progress) y de los intentos
+fallidos (contadores compactados y registro de intentos, ver app.progress.attempts).
+
+Los agregados se mantienen de forma incremental en cada escritura; este proceso
+sirve para crearlos la primera vez y para corregir desviaciones. Los incrementos
+que lleguen mientras se reconstruye un nivel pueden perderse, por lo que conviene
+ejecutarlo en horas de poco uso.
+
+Uso:
+    python -m app.game.reconcile_statistics              # todos los niveles
+    python -m app.game.reconcile_statistics --level 3    # un nivel concreto
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict
+
+from app.config.datastore import datastore
+from app.game.statistics import STATS_COLLECTION, aggregate_records, shards_path
+from app.levels.catalog import level_catalog
+from app.progress.attempts import level_failures
+from app.progress.records import PROGRESS_COLLECTION, query_level_progress, reads_user_progress
+
+logger = logging.getLogger(__name__)
+
+
+async def reconcile_level(level_id: int) -> Dict[str, Any]:
+    """
+    Recalcula los agregados de un nivel y los deja en un unico shard.
+    Args:
+        level_id (int): Nivel a reconstruir.
+    Returns:
+        dict: Agregados calculados.
+    """
+    docs, _ = await query_level_progress(level_id)
+    if not reads_user_progress():
+        # los niveles de pociones guardaban el level_id como "level{n}"; al migrar a
+        # las subcolecciones se normaliza, asi que solo quedan en la coleccion global
+        docs += await datastore.query(PROGRESS_COLLECTION, [("level_id", "==", f"level{level_id}")])
+    totals = aggregate_records(doc.to_dict() for doc in docs)
+    # los fallos no tienen registro de progress, pero cuentan como intentos
+    totals["attempts"] += await level_failures(level_id)
+
+    def write():
+        shards = datastore.collection(shards_path(level_id))
+        batch = datastore.client.batch()
+        for shard in shards.get():
+            if shard.id != "0":
+                batch.delete(shard.reference)
+        batch.set(shards.document("0"), totals)
+        batch.commit()
+
+    await datastore.run(STATS_COLLECTION, write)
+    logger.info(f"Estadisticas del nivel {level_id} reconstruidas: {totals}")
+    return totals
+
+
+async def reconcile(level_id: int = None) -> int:
+    """
+    Reconstruye los agregados de un nivel o de todos los del catalogo.
+    Returns:
+        int: Numero de niveles reconstruidos.
+    """
+    if level_id is not None:
+        await reconcile_level(level_id)
+        return 1
+    levels = await level_catalog.all_compiled()
+    for level in levels:
+        await reconcile_level(level.level_id)
+    return len(levels)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--level", type=int, help="reconstruir solo este nivel")
+    args = parser.parse_args()
+    count = asyncio.run(reconcile(args.level))
+    print(f"Niveles reconciliados: {count}")
+    datastore.shutdown()
@@ -1,16 +1,19 @@
 from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Header, Query
 from pydantic import BaseModel
-from app.config.firebase import db
-from ..auth.service import AuthService
-from .service import GameService
-from .schemas import CodeValidationRequest, CodeValidationResponse, LevelStateRequest, CommandLevelRequest, CommandLevelResponse, LevelStatisticsResponse
+from app.config.fast_response import trusted_response
+from app.config.streaming import ndjson_response
+from ..auth.dependencies import UserContext, get_current_user
+from .service import GameService, MAX_BATCH_SUBMISSIONS
+from .schemas import CodeValidationRequest, CodeValidationResponse, LevelStateRequest, CommandLevelRequest, CommandLevelResponse, LevelStatisticsResponse, BatchSubmissionRequest, BatchSubmissionResponse, LevelStateSaveResponse, LevelStateResponse
 
 router = APIRouter(prefix="/game", tags=["Game"])
 
+MAX_PAGE_SIZE = 500
+
    
 @router.post("/validate-code", response_model=CodeValidationResponse, summary="Validar código de nivel")
-async def validate_code_endpoint(request: CodeValidationRequest, authorization: Optional[str] = Header(None)):
+async def validate_code_endpoint(request: CodeValidationRequest, user: UserContext = Depends(get_current_user)):
     """
     Valida el código proporcionado por el usuario para resolver un nivel.
 
@@ -19,7 +22,7 @@ async def validate_code_endpoint(request: CodeValidationRequest, authorization:
             - level_id: ID del nivel a validar.
             - code: Código enviado por el usuario.
             - script: Script asociado para la validación.
-        authorization (str, opcional): Token de autenticación en formato Bearer.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
 
     Returns:
         CodeValidationResponse: Resultado de la validación, que contiene:
@@ -39,57 +42,70 @@ async def validate_code_endpoint(request: CodeValidationRequest, authorization:
     """
   
     # validacion del token
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto"
-        )
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
 
     # Llamada al servicio para validar el código
-    return await GameService.validate_code(decoded_token["uid"], request.level_id, request.code, request.script) 
+    return await GameService.validate_code(user.uid, request.level_id, request.code, request.script) 
 
-@router.post("/save-level-state", summary="Guardar estado del nivel")
-async def save_level_state(request: LevelStateRequest, authorization: Optional[str] = Header(None)):
+@router.post("/save-level-state", response_model=LevelStateSaveResponse, summary="Guardar estado del nivel")
+async def save_level_state(request: LevelStateRequest, user: UserContext = Depends(get_current_user)):
     """
     Guarda el estado actual del nivel para el usuario.
     Útil para permitir continuar una partida más tarde.
     
     - Requiere autenticación mediante token Bearer
-    - Guarda el estado del nivel en la base de datos
+    - Acepta el estado completo o un JSON Patch sobre la versión base_version
+    - El estado se escribe en la base de datos de forma diferida (autoguardado)
     Args:
-        request (LevelStateRequest): Contiene level_id y estado serializado.
-        authorization (str, optional): Token JWT Bearer para autenticación.
+        request (LevelStateRequest): Contiene level_id y el estado serializado o un patch.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
 
     Returns:
-        dict: Mensaje de confirmación.
+        LevelStateSaveResponse: Mensaje de confirmación y versión del estado.
 
     Raises:
         HTTPException 401: Token no proporcionado o formato incorrecto.
+        HTTPException 404: Patch sin estado previo guardado.
+        HTTPException 409: base_version no es la versión actual.
+        HTTPException 422: Patch inválido.
+        HTTPException 413: El estado codificado supera el tamaño máximo (STATE_MAX_BYTES).
         HTTPException 500: Error interno al guardar estado.
     """
     
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto"
-        )
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
 
-    await GameService.save_level_state(decoded_token["uid"], request.level_id, request.state)
-    return {"detail": "Estado guardado correctamente"}
+    version = await GameService.save_level_state(
+        user.uid, request.level_id, request.state, request.patch, request.base_version
+    )
+    return {"detail": "Estado guardado correctamente", "version": version}
+
+@router.get("/level-state/{level_id}", response_model=LevelStateResponse, summary="Obtener estado guardado del nivel")
+async def load_level_state(level_id: int, user: UserContext = Depends(get_current_user)):
+    """
+    Devuelve el último estado guardado del nivel para el usuario, con su versión
+    (necesaria para enviar cambios como JSON Patch).
+
+    Args:
+        level_id (int): ID del nivel.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
+
+    Returns:
+        LevelStateResponse: Estado, versión y fecha del último guardado.
+
+    Raises:
+        HTTPException 401: Token no proporcionado o formato incorrecto.
+        HTTPException 404: No hay estado guardado para el nivel.
+    """
+
+    return await GameService.load_level_state(user.uid, level_id)
 
 @router.post("/exit", summary="Registrar salida del juego")
-async def exit_game(authorization: Optional[str] = Header(None)):
+async def exit_game(user: UserContext = Depends(get_current_user)):
     """
     Registra que el usuario ha salido del juego.
     
     - Requiere autenticación mediante token Bearer
     - Útil para análisis de comportamiento y estadísticas
     Args:
-        authorization (str, optional): Token JWT Bearer para autenticación.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
 
     Returns:
         dict: Mensaje de confirmación.
@@ -98,21 +114,15 @@ async def exit_game(authorization: Optional[str] = Header(None)):
         HTTPException 401: Token no proporcionado o formato incorrecto.
         HTTPException 500: Error al registrar la salida.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto"
-        )
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
 
-    await GameService.exit_game(decoded_token["uid"])
+    await GameService.exit_game(user.uid)
     return {"detail": "Juego finalizado correctamente"}
 
 @router.post("/validate-commands", response_model=CommandLevelResponse, summary="Validar comandos del nivel")
 async def validate_commands(
     request: CommandLevelRequest,
-    authorization: Optional[str] = Header(None)
+    http_request: Request,
+    user: UserContext = Depends(get_current_user)
 ):
     """
     Valida si el usuario ha completado correctamente un nivel de pociones.
@@ -123,7 +133,8 @@ async def validate_commands(
     - Asigna 0-3 estrellas según el rendimiento
     Args:
         request (CommandLevelRequest): level_id y lista de comandos.
-        authorization (str, optional): Token JWT Bearer para autenticación.
+        http_request (Request): Petición HTTP (Accept-Encoding para la respuesta rápida).
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
 
     Returns:
         CommandLevelResponse: Resultado con estrellas, mensaje, progreso y niveles completados.
@@ -131,26 +142,54 @@ async def validate_commands(
     Raises:
         HTTPException 401: Token no proporcionado o formato incorrecto.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto"
-        )
-    
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
-    uid = decoded_token["uid"]
-    
-    return await GameService.validate_commands (
-        uid=uid,
+    result = await GameService.validate_commands (
+        user=user,
         level_id=request.level_id,
         commands=request.list_commands
     )
+    # con FAST_RESPONSES_ENABLED se envia sin revalidar el progreso (ver app.config.fast_response)
+    return trusted_response(http_request, result, CommandLevelResponse)
+
+@router.post("/submit-batch", response_model=BatchSubmissionResponse, summary="Validar varios envíos en una sola petición")
+async def submit_batch(
+    request: BatchSubmissionRequest,
+    user: UserContext = Depends(get_current_user)
+):
+    """
+    Valida en orden varios envíos del usuario (niveles de comandos y de pociones),
+    por ejemplo los intentos que el cliente guardó sin conexión.
+
+    - Requiere autenticación mediante token Bearer (se verifica una sola vez)
+    - Todo el progreso y los desbloqueos se guardan en un único commit
+    Args:
+        request (BatchSubmissionRequest): Lista de envíos de comandos o de pociones.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
+
+    Returns:
+        BatchSubmissionResponse: Resultado de cada envío, progreso y niveles completados.
+
+    Raises:
+        HTTPException 400: Lote vacío o con demasiados envíos.
+        HTTPException 401: Token no proporcionado o formato incorrecto.
+        HTTPException 500: Error al guardar el progreso.
+    """
+    if not request.items or len(request.items) > MAX_BATCH_SUBMISSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote debe tener entre 1 y {MAX_BATCH_SUBMISSIONS} envíos"
+        )
+
+    return await GameService.submit_batch(user, [item.dict() for item in request.items])
+
 # Endpoint para obtener estadísticas del nivel (nueva función)
 @router.get("/level-statistics/{level_id}", response_model=LevelStatisticsResponse, summary="Obtener estadísticas del nivel")            
 async def get_level_statistics(
     level_id: int,
-    authorization: Optional[str] = Header(None)
+    http_request: Request,
+    include_progress: bool = Query(True, description="Incluir el progreso del nivel; False para pedir solo los agregados"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    start_after: Optional[str] = None,
+    user: UserContext = Depends(get_current_user)
 ):
     """
     Obtiene estadísticas de un nivel específico.
@@ -161,7 +200,12 @@ async def get_level_statistics(
     - Útil para análisis y mejoras del juego
     Args:
         level_id (int): ID del nivel a consultar.
-        authorization (str, optional): Token JWT Bearer para autenticación.
+        http_request (Request): Petición HTTP (Accept-Encoding para la respuesta rápida).
+        include_progress (bool): Incluir el progreso del nivel (por defecto, como siempre;
+            costoso sin limit).
+        limit (int, optional): Tamaño de página del progreso incluido.
+        start_after (str, optional): Cursor next_cursor de la página anterior.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
 
     Returns:
         LevelStatisticsResponse: Estadísticas del nivel.
@@ -170,29 +214,46 @@ async def get_level_statistics(
         HTTPException 401: Token no proporcionado o formato incorrecto.
         HTTPException 403: Acceso restringido (comentado para futuras mejoras).
     """
-    # Validacion del token de autenticación
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto"
-        )
-    
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
-   #uid = decoded_token["uid"] para limitar el acceso a admins
+   #uid = user.uid para limitar el acceso a admins
 
     #  limitar esto a admins:
     # if not await AuthService.is_admin(uid):
     #     raise HTTPException(status_code=403, detail="Solo administradores pueden ver estadísticas")
 
-    return await GameService.get_level_statistics(level_id)
+    statistics = await GameService.get_level_statistics(level_id, include_progress, limit, start_after)
+    return trusted_response(http_request, statistics, LevelStatisticsResponse)
     
     # Verificar si es administrador
-    # is_admin = await AuthService.is_admin(decoded_token["uid"])
+    # is_admin = await AuthService.is_admin(user.uid)
     # if not is_admin:
     #     raise HTTPException(
     #         status_code=status.HTTP_403_FORBIDDEN,
     #         detail="Solo administradores pueden ver estadísticas"
     #     )
-    
-   
+
+
+@router.get("/level-statistics/{level_id}/progress", summary="Progreso del nivel en streaming (NDJSON)")
+async def stream_level_progress(
+    level_id: int,
+    limit: Optional[int] = Query(None, ge=1),
+    start_after: Optional[str] = None,
+    user: UserContext = Depends(get_current_user)
+):
+    """
+    Devuelve el progreso registrado en un nivel como NDJSON (un registro por línea),
+    leyendo de Firestore a medida que se envía la respuesta.
+
+    Args:
+        level_id (int): ID del nivel a consultar.
+        limit (int, optional): Número máximo de registros.
+        start_after (str, optional): progress_id a partir del cual continuar.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
+
+    Returns:
+        StreamingResponse: Registros de progreso en formato application/x-ndjson.
+
+    Raises:
+        HTTPException 401: Token no proporcionado o formato incorrecto.
+    """
+
+    return ndjson_response(GameService.stream_level_progress(level_id, limit, start_after))
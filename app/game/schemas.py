@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, root_validator
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Union
 
 class CodeValidationRequest(BaseModel):
     """Modelo para solicitud de validación de código"""
@@ -15,9 +16,31 @@ class CodeValidationResponse(BaseModel):
     script: Optional[dict] = Field(None, description="Información adicional del script")
 
 class LevelStateRequest(BaseModel):
-    """Modelo para guardar el estado de un nivel"""
+    """Modelo para guardar el estado de un nivel (completo o como JSON Patch)"""
+    level_id: int = Field(..., example=1, description="ID del nivel")
+    state: Optional[dict] = Field(None, description="Estado serializado del nivel")
+    patch: Optional[List[Dict[str, Any]]] = Field(None, example=[{"op": "replace", "path": "/posicion", "value": 4}], description="Operaciones JSON Patch (RFC 6902) sobre la versión base_version")
+    base_version: Optional[int] = Field(None, example=3, description="Versión del estado sobre la que se aplica el patch")
+
+    @root_validator
+    def check_state_or_patch(cls, values):
+        if (values.get("state") is None) == (values.get("patch") is None):
+            raise ValueError("Se debe enviar 'state' o 'patch', pero no ambos")
+        if values.get("patch") is not None and values.get("base_version") is None:
+            raise ValueError("'patch' requiere 'base_version'")
+        return values
+
+class LevelStateSaveResponse(BaseModel):
+    """Modelo para respuesta del guardado de estado"""
+    detail: str = Field(..., example="Estado guardado correctamente")
+    version: int = Field(..., example=4, description="Versión del estado guardado")
+
+class LevelStateResponse(BaseModel):
+    """Modelo para respuesta con el estado guardado de un nivel"""
     level_id: int = Field(..., example=1, description="ID del nivel")
     state: dict = Field(..., description="Estado serializado del nivel")
+    version: int = Field(..., example=4, description="Versión del estado")
+    timestamp: datetime = Field(..., description="Fecha del último guardado")
 
 class CommandLevelRequest(BaseModel):
     """Modelo para validación de nivel mediante bloques y comandos"""
@@ -32,6 +55,36 @@ class CommandLevelResponse(BaseModel):
     progress: List[Dict[str, Any]] = Field(..., description="Lista con el progreso del usuario")
     levels_completed: List[int] = Field(..., description="Lista de IDs de niveles completados")
 
+
+class PotionLevelRequest(BaseModel):
+    """Modelo para validación de un nivel de pociones"""
+    level_id: int = Field(..., example=2, description="ID del nivel de pociones")
+    potions: Dict[str, int] = Field(..., example={"pocion_vida": 3, "pocion_mana": 2}, description="Cantidad colocada de cada tipo de poción")
+    bloques_utilizados: List[str] = Field(..., example=["MOVER", "COLOCAR"], description="Bloques utilizados en la solución")
+
+class BatchSubmissionRequest(BaseModel):
+    """Modelo para enviar varios intentos de un usuario en una sola petición"""
+    items: List[Union[CommandLevelRequest, PotionLevelRequest]] = Field(..., description="Envíos de niveles de comandos o de pociones, en orden")
+
+class BatchItemResult(BaseModel):
+    """Resultado de un envío dentro de un lote"""
+    level_id: int = Field(..., example=1, description="ID del nivel")
+    type: str = Field(..., example="commands", description="Tipo de envío: commands o potions")
+    status: int = Field(..., example=200, description="200 si se evaluó, 403 si el nivel no está desbloqueado, 404 si no existe")
+    correct: bool = Field(..., description="Indica si el nivel fue completado correctamente")
+    stars: int = Field(..., example=3, description="Número de estrellas obtenidas")
+    message: str = Field(..., description="Mensaje de retroalimentación")
+    pociones_correctas: Optional[int] = Field(None, description="Tipos de poción correctos (solo pociones)")
+    total_pociones: Optional[int] = Field(None, description="Tipos de poción del nivel (solo pociones)")
+    bloques_utilizados: Optional[int] = Field(None, description="Bloques utilizados (solo pociones)")
+    bloques_optimales: Optional[int] = Field(None, description="Bloques óptimos del nivel (solo pociones)")
+
+class BatchSubmissionResponse(BaseModel):
+    """Modelo para respuesta de un lote de envíos"""
+    results: List[BatchItemResult] = Field(..., description="Resultado de cada envío, en el mismo orden")
+    progress: List[Dict[str, Any]] = Field(..., description="Lista con el progreso del usuario")
+    levels_completed: List[int] = Field(..., description="Lista de IDs de niveles completados")
+
     
     
 class LevelStatisticsResponse(BaseModel):
@@ -41,4 +94,5 @@ class LevelStatisticsResponse(BaseModel):
     average_stars: float = Field(..., example=2.5, description="Estrellas promedio obtenidas")
     three_stars_count: int = Field(..., example=3, description="Cantidad de usuarios con 3 estrellas")
     progress: List[Dict[str, Any]] = Field(..., description="Lista con el progreso registrado")
-    levels_completed: List[int] = Field(..., description="Lista de niveles completados")
\ No newline at end of file
+    levels_completed: List[int] = Field(..., description="Lista de niveles completados")
+    next_cursor: Optional[str] = Field(None, description="Cursor para pedir la siguiente página de progreso")
\ No newline at end of file
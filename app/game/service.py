@@ -1,23 +1,39 @@
 from fastapi import HTTPException, status
-from app.config.firebase import db
+from firebase_admin import firestore
+from app.auth.dependencies import UserContext
+from app.config.datastore import datastore
+from app.levels.catalog import level_catalog
+from app.progress.attempts import attempt_writes, failed_attempt_writes, record_failed_attempt
+from app.progress.level_state import LevelState
+from app.progress.records import SideWrite, best_progress, progress_doc_id, progress_read_path, progress_write_paths, query_level_progress, stream_level_progress, upsert_progress
+from app.progress.service import ProgressService
+from app.progress.summary import SUMMARY_COLLECTION, apply_progress, completed_levels, summary_progress, summary_update
+from . import statistics
+from .autosave import state_buffer
 from datetime import datetime
-from typing import Dict, List
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+# envios maximos por lote: cada uno genera hasta 6 escrituras (registro en las dos
+# colecciones en modo dual, resumen, estadisticas, desbloqueo y registro de intentos),
+# mas el estado de niveles del usuario, y un batch admite 500
+MAX_BATCH_SUBMISSIONS = 80
+
 class GameService:
     """
     Servicio que gestiona la logica del juego, incluyendo validacion de niveles, 
     guardado de progreso y gestion de sesiones
     """
     @staticmethod
-    async def validate_commands(uid: str, level_id: int, commands: List[str]):
+    async def validate_commands(user: UserContext, level_id: int, commands: List[str]):
         """
         Valida si el usuario ha completado correctamente un nivel de comandos.
         
         Args:
-            uid (str): ID del usuario
+            user (UserContext): Usuario autenticado de la petición
             level_id (int): ID del nivel
             commands (List[str]): Lista de comandos enviados por el usuario
             
@@ -26,93 +42,263 @@ class GameService:
                 - correct (bool): Indica si el nivel fue completado correctamente.
                 - stars (int): Número de estrellas obtenidas (0-3).
                 - message (str): Mensaje con feedback al usuario.
-                - progress (List[Dict]): Lista con progreso actualizado.
+                - progress (List[Dict]): Progreso actualizado por nivel (mejores estrellas e intentos).
                 - levels_completed (List[int]): Lista de niveles completados.
 
         Raises:
             HTTPException(403): Si el nivel no está desbloqueado para el usuario.
             HTTPException(404): Si el nivel no existe en la base de datos.
         """
-        # Verfiicar si el nivel está desbloqueado
-        user_doc = db.collection("users").document(uid).get()
-        user_data = user_doc.to_dict()
-        unlocked = user_data.get("unlocked_levels", [])
+        # Verfiicar si el nivel está desbloqueado (bitset del documento del usuario);
+        # el resumen de progreso (un solo documento) se lee a la vez para construir la
+        # respuesta sin mas lecturas. Si falta, se reconstruye despues de las
+        # comprobaciones para que un 403 o un 404 no recorra el progreso.
+        uid = user.uid
+        state, summary = await asyncio.gather(
+            user.level_state(),
+            ProgressService.read_summary(uid),
+        )
         
-        if level_id not in unlocked:
+        if level_id not in state.unlocked:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Nivel no desbloqueado"
             )
         
-         #obtener el nivel del usuario desde Firestore
-        level_doc = db.collection("levels").document(f"Level{level_id}").get()
-        if not level_doc.exists:
+         #obtener el nivel desde el catalogo en memoria
+        level = await level_catalog.compiled_by_doc_id(f"Level{level_id}")
+        if level is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Nivel no encontrado"
             )
-        level_data = level_doc.to_dict()
-        list_commands = level_data.get("listCommands", {})
+        if summary is None:
+            summary = await ProgressService.rebuild_summary(uid)
     
-        #comandos esperados
-        
-        expected_commands = set()
-        if "ESTANTE" in list_commands:
-            expected_commands.update(list_commands["ESTANTE"].values())
-        for key, value in list_commands.items():
-            if key != "ESTANTE":
-                expected_commands.add(value)
-        received_commands = set(commands) 
-                
-        #starts
-        if received_commands == expected_commands:
-            stars = 3
-            message = "¡Perfecto! Has utilizado exactamente los comandos requeridos."
-        elif expected_commands.issubset(received_commands):
-            stars = 2
-            message = "¡Bien! Has usado todos los comandos correctos, pero también algunos de más."
-        elif received_commands & expected_commands:
-            stars = 1
-            message = "Has acertado algunos comandos, pero te faltan otros."
-        else:
-            stars = 0
-            message = "Comandos incorrectos. Inténtalo de nuevo."
-
+        #comandos esperados, precalculados al cargar el nivel
+        stars = GameService._command_stars(level.expected_commands, commands)
         correct = stars > 0
  
-        # guardar el progreso del usuario si es correcto
+        # guardar el progreso del usuario si es correcto: registro (por clave, con la
+        # mejor marca), resumen, estadisticas, estado de niveles del usuario y
+        # desbloqueo del siguiente nivel van en una unica transaccion
         if correct:
             now = datetime.utcnow()
-            db.collection("progress").add({
-                "user_id": uid,
-                "level_id": level_id,
-                "stars": stars,
-                "start_date": now,
-                "completion_date": now,
-            })
-            # Desbloqueamos el siguiente nivel
-            next_level_id = level_id + 1
-            if next_level_id not in unlocked:
-                unlocked.append(next_level_id)
-                db.collection("users").document(uid).update({
-                    "unlocked_levels": unlocked
-                })
-                
+            await upsert_progress(
+                uid,
+                level_id,
+                lambda previous: best_progress(previous, uid, level_id, "stars", stars, now),
+                lambda previous, record, state: GameService._command_writes(uid, level_id, stars, now, state, previous, record),
+            )
+            apply_progress(summary, level_id, stars, now=now)
+            await state_buffer.flush_level(uid, level_id)
+        else:
+            # el fallo solo va al registro de intentos y a las estadisticas del nivel
+            await record_failed_attempt(uid, level_id, "commands", stars)
     
-        #obtener el progreso del usuario actualizado    
-        progress_docs = db.collection("progress").where("user_id", "==", uid).stream()
-        progress = [doc.to_dict() for doc in progress_docs]
-        levels_completed = [p["level_id"] for p in progress if "level_id" in p]
+        #progreso actualizado a partir del resumen, sin releer la coleccion progress
+        progress = summary_progress(summary)
+        levels_completed = completed_levels(summary)
     
         #devolver la respuesta
         return {
             "correct": correct,
             "stars": stars,
-            "message": "¡Perfecto!" if stars == 3 else  "¡Bien!" if stars == 2 else "¡Sigue intentándolo!",
+            "message": GameService._command_message(stars),
             "progress": progress,
             "levels_completed": levels_completed,
         }
         
+    @staticmethod
+    def _command_stars(expected_commands, commands: List[str]) -> int:
+        """Estrellas (0-3) de un envio de comandos frente a los comandos esperados del nivel."""
+        received_commands = set(commands)
+        if received_commands == expected_commands:
+            return 3  # exactamente los comandos requeridos
+        if expected_commands.issubset(received_commands):
+            return 2  # todos los correctos, pero tambien algunos de mas
+        if received_commands & expected_commands:
+            return 1  # algunos comandos correctos
+        return 0
+
+    @staticmethod
+    def _command_message(stars: int) -> str:
+        return "¡Perfecto!" if stars == 3 else "¡Bien!" if stars == 2 else "¡Sigue intentándolo!"
+
+    @staticmethod
+    def _progress_writes(uid: str, level_id: int, stars: int, now: datetime, state: LevelState, previous: Optional[Dict[str, Any]], record: Dict[str, Any]) -> List[SideWrite]:
+        """
+        Escrituras que acompañan a un registro de progress: el resumen del usuario y
+        el shard de estadisticas del nivel. El intento cuenta aunque no mejore la marca.
+        Tambien marca el nivel en el estado del usuario, que se escribe aparte.
+        """
+        state.record(level_id, stars)
+        return [
+            (SUMMARY_COLLECTION, uid, summary_update(uid, level_id, stars=stars, now=now)),
+            statistics.shard_write(level_id, previous, record),
+        ]
+
+    @staticmethod
+    def _command_writes(uid: str, level_id: int, stars: int, now: datetime, state: LevelState, previous: Optional[Dict[str, Any]], record: Dict[str, Any]) -> List[SideWrite]:
+        """
+        Escrituras de un nivel de comandos superado: las de _progress_writes y el
+        desbloqueo del siguiente nivel (en el bitset y, para versiones anteriores,
+        en unlocked_levels con ArrayUnion).
+        """
+        writes = GameService._progress_writes(uid, level_id, stars, now, state, previous, record)
+        writes += attempt_writes(uid, level_id, "commands", True, stars, now)
+        next_level_id = level_id + 1
+        if next_level_id not in state.unlocked:
+            state.unlock(next_level_id)
+            writes.append(("users", uid, {"unlocked_levels": firestore.ArrayUnion([next_level_id])}))
+        return writes
+
+    @staticmethod
+    def _add_writes(batch, writes: List[SideWrite]):
+        for collection, doc_id, data in writes:
+            batch.set(collection, doc_id, data, merge=True)
+
+    @staticmethod
+    def _add_progress(batch, uid: str, level_id: int, record: Dict[str, Any], writes: List[SideWrite]):
+        """Añade a un batch el registro de progress de (usuario, nivel) y sus escrituras asociadas."""
+        for collection in progress_write_paths(uid):
+            batch.set(collection, progress_doc_id(uid, level_id), record)
+        GameService._add_writes(batch, writes)
+
+    @staticmethod
+    async def submit_batch(user: UserContext, items: List[Dict[str, Any]]):
+        """
+        Valida en orden varios envios de un usuario (niveles de comandos y de pociones)
+        y guarda todo su progreso en una unica transaccion.
+
+        Cada nivel distinto se obtiene una sola vez del catalogo. Dentro de la
+        transaccion se leen en una sola llamada el documento del usuario (bitsets) y
+        el progreso previo de todos los niveles, de forma que un intento o un lote
+        simultaneo no se pierde: si cambian, se reintenta. Un nivel desbloqueado por
+        un envio del lote ya cuenta para los siguientes.
+
+        Args:
+            user (UserContext): Usuario autenticado de la petición
+            items (List[dict]): Envios; los de comandos tienen level_id y list_commands,
+                los de pociones level_id, potions y bloques_utilizados.
+
+        Returns:
+            Dict[str, Any]: Diccionario con:
+                - results (List[Dict]): Resultado de cada envio, en el mismo orden.
+                - progress (List[Dict]): Progreso actualizado por nivel.
+                - levels_completed (List[int]): Lista de niveles completados.
+
+        Raises:
+            HTTPException(500): Si falla el commit; en ese caso no se guarda nada.
+        """
+        uid = user.uid
+        level_ids = sorted({item["level_id"] for item in items})
+        summary = await ProgressService.get_summary(uid)
+
+        # cada nivel distinto se obtiene una sola vez
+        levels = {}
+        for level_id in level_ids:
+            levels[level_id] = await level_catalog.compiled_by_doc_id(f"Level{level_id}")
+
+        now = datetime.utcnow()
+        user_ref = datastore.collection("users").document(uid)
+        progress_refs = {
+            level_id: datastore.collection(progress_read_path(uid)).document(progress_doc_id(uid, level_id))
+            for level_id in level_ids
+        }
+
+        def score(transaction):
+            snapshots = {
+                snapshot.reference.path: snapshot
+                for snapshot in transaction.get_all([user_ref, *progress_refs.values()])
+            }
+            user_snapshot = snapshots[user_ref.path]
+            state = LevelState(user_snapshot.to_dict() if user_snapshot.exists else None)
+            records = {
+                level_id: snapshots[ref.path].to_dict()
+                for level_id, ref in progress_refs.items()
+                if snapshots[ref.path].exists
+            }
+            batch = datastore.batch()
+            results, applied = GameService._score_items(batch, uid, items, levels, state, records, now)
+            # el estado de niveles acumulado de todo el lote, en una sola escritura
+            level_update = state.update()
+            if level_update:
+                batch.set("users", uid, level_update, merge=True)
+            batch.apply(transaction)
+            return results, applied
+
+        try:
+            results, applied = await datastore.transaction("progress", score)
+        except Exception as e:
+            logger.error(f"Error guardando el lote de envios de {uid}: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error al guardar el progreso"
+            )
+
+        for level_id, stars in applied:
+            apply_progress(summary, level_id, stars, now=now)
+        await state_buffer.flush((uid, result["level_id"]) for result in results if result["correct"])
+
+        return {
+            "results": results,
+            "progress": summary_progress(summary),
+            "levels_completed": completed_levels(summary),
+        }
+
+    @staticmethod
+    def _score_items(batch, uid: str, items: List[Dict[str, Any]], levels: Dict[int, Any], state: LevelState, records: Dict[int, Dict[str, Any]], now: datetime):
+        """
+        Puntua en orden los envios de un lote y añade sus escrituras al batch.
+        Modifica state y records; se vuelve a llamar si la transaccion se reintenta.
+        Returns:
+            Tuple[List[dict], List[Tuple[int, int]]]: Resultado de cada envio y
+                (nivel, estrellas) de los intentos guardados.
+        """
+        results, applied = [], []
+        for item in items:
+            level_id = item["level_id"]
+            level = levels[level_id]
+            if "list_commands" in item:
+                if level_id not in state.unlocked:
+                    result = {"status": status.HTTP_403_FORBIDDEN, "correct": False, "stars": 0, "message": "Nivel no desbloqueado"}
+                elif level is None:
+                    result = {"status": status.HTTP_404_NOT_FOUND, "correct": False, "stars": 0, "message": "Nivel no encontrado"}
+                else:
+                    stars = GameService._command_stars(level.expected_commands, item["list_commands"])
+                    if stars > 0:
+                        previous = records.get(level_id)
+                        records[level_id] = best_progress(previous, uid, level_id, "stars", stars, now)
+                        GameService._add_progress(
+                            batch, uid, level_id, records[level_id],
+                            GameService._command_writes(uid, level_id, stars, now, state, previous, records[level_id]),
+                        )
+                        applied.append((level_id, stars))
+                    else:
+                        GameService._add_writes(batch, failed_attempt_writes(uid, level_id, "commands", stars, now))
+                    result = {"status": status.HTTP_200_OK, "correct": stars > 0, "stars": stars, "message": GameService._command_message(stars)}
+                results.append({"level_id": level_id, "type": "commands", **result})
+            else:
+                bloques = item.get("bloques_utilizados", [])
+                if level is None:
+                    result = {"status": status.HTTP_404_NOT_FOUND, **GameService._potion_failure("Nivel no encontrado", bloques)}
+                else:
+                    result = {"status": status.HTTP_200_OK, **GameService._score_potions(level, item.get("potions", {}), bloques)}
+                    if result["stars"] > 0:
+                        previous = records.get(level_id)
+                        records[level_id] = GameService._potion_record(previous, uid, level_id, result["stars"], item.get("potions", {}), bloques, now)
+                        GameService._add_progress(
+                            batch, uid, level_id, records[level_id],
+                            GameService._progress_writes(uid, level_id, result["stars"], now, state, previous, records[level_id])
+                            + attempt_writes(uid, level_id, "potions", True, result["stars"], now),
+                        )
+                        applied.append((level_id, result["stars"]))
+                    else:
+                        GameService._add_writes(batch, failed_attempt_writes(uid, level_id, "potions", result["stars"], now))
+                results.append({"level_id": level_id, "type": "potions", **result})
+        return results, applied
+
     @staticmethod    
     async def validate_code(uid: str, level_id: int, code: str, script: dict):
         """
@@ -143,31 +329,33 @@ class GameService:
             }
 
     @staticmethod
-    async def save_level_state(uid: str, level_id: int, state: dict):
+    async def save_level_state(uid: str, level_id: int, state: Optional[dict] = None, patch: Optional[List[dict]] = None, base_version: Optional[int] = None) -> int:
         """
         Guarda el estado actual del nivel para permitir continuar mas tarde. 
+        El estado queda en el buffer de autoguardado y se escribe en Firestore de
+        forma diferida (ver app.game.autosave).
         
         Args:
             uid (str): ID del usuario
             level_id (int): ID del nivel
-            state (dict): Estado del nivel a guardar
+            state (dict, optional): Estado completo del nivel a guardar
+            patch (List[dict], optional): JSON Patch sobre la version base_version, en lugar del estado completo
+            base_version (int, optional): Version sobre la que se aplica el patch
             
+        Returns:
+            int: Version del estado guardado.
+
         Raises:
+            HTTPException(409/422): Si el patch no se puede aplicar.
             HTTPException(500): Si ocurre un error al guardar el estado.
         """
-        logger.info(f"Guardando estado del nivel {level_id} para usuario {uid}")
-        # Guarda el estado del nivel en Firestore
+        logger.debug(f"Guardando estado del nivel {level_id} para usuario {uid}")
         try:
-            doc_id = f"{uid}_{level_id}"
-            doc_ref = db.collection('level_states').document(doc_id)
-            #guardar estado con timestamp
-            doc_ref.set({
-                "uid": uid,
-                "level_id": level_id,
-                "state": state,
-                "timestamp": datetime.utcnow()
-            })
-            logger.info(f"Estado guardado correctamente para usuario {uid} en nivel {level_id}")
+            if patch is not None:
+                return await state_buffer.patch(uid, level_id, patch, base_version)
+            return await state_buffer.save(uid, level_id, state)
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error guardando estado: {str(e)}")
             raise HTTPException(
@@ -175,6 +363,29 @@ class GameService:
                 detail=f"Error al guardar el estado: {str(e)}"
             )
 
+    @staticmethod
+    async def load_level_state(uid: str, level_id: int):
+        """
+        Obtiene el ultimo estado guardado de un nivel (primero del buffer de autoguardado).
+        
+        Args:
+            uid (str): ID del usuario
+            level_id (int): ID del nivel
+            
+        Returns:
+            dict: level_id, state, version y timestamp.
+
+        Raises:
+            HTTPException(404): Si no hay estado guardado para el nivel.
+        """
+        saved = await state_buffer.load(uid, level_id)
+        if saved is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No hay estado guardado para este nivel"
+            )
+        return saved
+
     @staticmethod
     async def exit_game(uid: str):
         """
@@ -188,8 +399,7 @@ class GameService:
         logger.info(f"Usuario {uid} saliendo del juego")
         # registrar salida en la coleccion de sesiones
         try:
-            sessions_ref = db.collection('game_sessions')
-            sessions_ref.document(uid).set({
+            await datastore.set('game_sessions', uid, {
                 "exit": True,
                 "timestamp": datetime.utcnow()
             })
@@ -218,92 +428,103 @@ class GameService:
         """
         logger.info(f"Validando nivel de pociones {level_id} para usuario {uid}")
         try:
-            # Obtener configuracion del nivel desde Firestore
-            level_ref = db.collection('levels').document(f"Level{level_id}")
-            level_doc = level_ref.get()
+            # Obtener configuracion del nivel desde el catalogo en memoria
+            level = await level_catalog.compiled_by_doc_id(f"Level{level_id}")
             
-            if not level_doc.exists:
+            if level is None:
                 logger.warning(f"Nivel {level_id} no encontrado")
-                return {
-                    "correct": False,
-                    "stars": 0,
-                    "message": "Nivel no encontrado",
-                    "pociones_correctas": 0,
-                    "total_pociones": 0,
-                    "bloques_utilizados": len(bloques_utilizados),
-                    "bloques_optimales": 0
-                }
-            #extraer configuracion del nivel
-            
-            level_data = level_doc.to_dict()
-            expected_potions = level_data.get('potions_config', {})
-            perfect_score = level_data.get('perfect_score', 3)  # bloques ideales
-            
-            # validar pociones
-            pociones_correctas = 0
-            total_pociones = len(expected_potions)
-            
-            for tipo_pocion, esperado in expected_potions.items():
-                actual = potions.get(tipo_pocion, 0)
-                if actual == esperado:
-                    pociones_correctas += 1
-            
-            # calcular porcentaje de pociones correctas
-            porcentaje_pociones = (pociones_correctas / total_pociones) * 100 if total_pociones > 0 else 0
-            
-            # verificar cantidad de bloques utilizados
-            num_bloques = len(bloques_utilizados)
-            
-            # determinar estrellas
-            stars = 0
-            if porcentaje_pociones == 100:
-                if num_bloques <= perfect_score:
-                    stars = 3  # todas las pociones correctas y usando el numero optimo de bloques
-                    message = f"¡Perfecto! Has colocado todas las pociones correctamente usando solo {num_bloques} bloques."
-                else:
-                    stars = 2  # todas las pociones correctas pero usando más bloques de lo ideal
-                    message = f"¡Buen trabajo! Has colocado todas las pociones correctamente, pero podrías hacerlo con menos bloques."
-            elif porcentaje_pociones >= 50:
-                stars = 1  # al menos la mitad de las pociones correctas
-                message = f"Has colocado correctamente {pociones_correctas} de {total_pociones} tipos de pociones."
-            else:
-                stars = 0
-                message = "Intenta de nuevo. Revisa la cantidad de cada tipo de poción."
+                return GameService._potion_failure("Nivel no encontrado", bloques_utilizados)
+
+            result = GameService._score_potions(level, potions, bloques_utilizados)
+            stars = result["stars"]
             
             # guardar progreso
             if stars > 0:
                 await GameService.save_potion_progress(uid, level_id, stars, potions, bloques_utilizados)
+                await state_buffer.flush_level(uid, level_id)
                 logger.info(f"Usuario {uid} completó nivel {level_id} con {stars} estrellas")
             else:
                 logger.info(f"Usuario {uid} no completó nivel {level_id}")
+                await record_failed_attempt(uid, level_id, "potions", stars)
                 #respuesta con detalles del resultado
-            return {
-                "correct": stars > 0,
-                "stars": stars,
-                "message": message,
-                "pociones_correctas": pociones_correctas,
-                "total_pociones": total_pociones,
-                "bloques_utilizados": num_bloques,
-                "bloques_optimales": perfect_score
-            }
+            return result
         
         except Exception as e:
             logger.error(f"Error en validate_potion_level: {str(e)}")
-            return {
-                "correct": False,
-                "stars": 0,
-                "message": f"Error en la validación: {str(e)}",
-                "pociones_correctas": 0,
-                "total_pociones": 0,
-                "bloques_utilizados": len(bloques_utilizados),
-                "bloques_optimales": 0
-            }
+            return GameService._potion_failure(f"Error en la validación: {str(e)}", bloques_utilizados)
+
+    @staticmethod
+    def _potion_failure(message: str, bloques_utilizados: List[str]) -> Dict[str, Any]:
+        return {
+            "correct": False,
+            "stars": 0,
+            "message": message,
+            "pociones_correctas": 0,
+            "total_pociones": 0,
+            "bloques_utilizados": len(bloques_utilizados),
+            "bloques_optimales": 0
+        }
+
+    @staticmethod
+    def _score_potions(level, potions: Dict[str, int], bloques_utilizados: List[str]) -> Dict[str, Any]:
+        """
+        Puntua en memoria un envio de pociones frente a la configuracion compilada del nivel.
+        Returns:
+            dict: Resultado con correct, stars, message, pociones_correctas, total_pociones,
+                bloques_utilizados y bloques_optimales.
+        """
+        #extraer configuracion del nivel
+        expected_potions = level.potions_config
+        perfect_score = level.perfect_score  # bloques ideales
+        
+        # validar pociones
+        pociones_correctas = 0
+        total_pociones = len(expected_potions)
+        
+        for tipo_pocion, esperado in expected_potions.items():
+            actual = potions.get(tipo_pocion, 0)
+            if actual == esperado:
+                pociones_correctas += 1
+        
+        # calcular porcentaje de pociones correctas
+        porcentaje_pociones = (pociones_correctas / total_pociones) * 100 if total_pociones > 0 else 0
+        
+        # verificar cantidad de bloques utilizados
+        num_bloques = len(bloques_utilizados)
+        
+        # determinar estrellas
+        stars = 0
+        if porcentaje_pociones == 100:
+            if num_bloques <= perfect_score:
+                stars = 3  # todas las pociones correctas y usando el numero optimo de bloques
+                message = f"¡Perfecto! Has colocado todas las pociones correctamente usando solo {num_bloques} bloques."
+            else:
+                stars = 2  # todas las pociones correctas pero usando más bloques de lo ideal
+                message = f"¡Buen trabajo! Has colocado todas las pociones correctamente, pero podrías hacerlo con menos bloques."
+        elif porcentaje_pociones >= 50:
+            stars = 1  # al menos la mitad de las pociones correctas
+            message = f"Has colocado correctamente {pociones_correctas} de {total_pociones} tipos de pociones."
+        else:
+            stars = 0
+            message = "Intenta de nuevo. Revisa la cantidad de cada tipo de poción."
+
+        return {
+            "correct": stars > 0,
+            "stars": stars,
+            "message": message,
+            "pociones_correctas": pociones_correctas,
+            "total_pociones": total_pociones,
+            "bloques_utilizados": num_bloques,
+            "bloques_optimales": perfect_score
+        }
     
     @staticmethod
     async def save_potion_progress(uid: str, level_id: int, stars: int, potions: Dict[str, int], bloques: List[str]):
         """
         Guarda el progreso del usuario en un nivel de pociones.
-        Solo actualiza si la nueva puntuación es mejor que la anterior.        
+        Solo sustituye la marca si la nueva puntuación es mejor que la anterior; el
+        registro se lee por clave y se escribe en una transacción con el resumen y
+        las estadísticas, sin consultas.
         Args:
             uid (str): ID del usuario
             level_id (int): ID del nivel
@@ -314,122 +535,84 @@ class GameService:
         logger.info(f"Guardando progreso del nivel {level_id} para usuario {uid} con {stars} estrellas")
         
         try:
-            #referenciaala coleccion de progress
-            progress_ref = db.collection('progress')
-            #buscar si existe progreso previo para este usuario y nivel 
-            existing = progress_ref.where("user_id", "==", uid).where("level_id", "==", f"level{level_id}").get()
-            
             now = datetime.utcnow()
-            #preparar datos para guardar
-            data = {
-                "user_id": uid,
-                "level_id": f"level{level_id}",
-                "stars": stars,
-                "potions": potions,
-                "bloques": bloques,
-                "completion_date": now
-            }
-            #actualizar o crear segun corresponda
-            if existing:
-                # solo actualizar si la puntuacion es mejor
-                doc = existing[0]
-                current_stars = doc.to_dict().get('stars', 0)
-                if stars > current_stars:
-                    logger.info(f"Actualizando progreso existente para usuario {uid} en nivel {level_id}")
-                    progress_ref.document(doc.id).update(data)
-                else:
-                    logger.info(f"Manteniendo progreso existente para usuario {uid} en nivel {level_id}")
-            else:
-                # Crear nuevo registro
-                logger.info(f"Creando nuevo progreso para usuario {uid} en nivel {level_id}")
-                data["start_date"] = now
-                progress_ref.add(data)
+            await upsert_progress(
+                uid,
+                level_id,
+                lambda previous: GameService._potion_record(previous, uid, level_id, stars, potions, bloques, now),
+                lambda previous, record, state: GameService._progress_writes(uid, level_id, stars, now, state, previous, record)
+                + attempt_writes(uid, level_id, "potions", True, stars, now),
+            )
                 
         except Exception as e:
             logger.error(f"Error guardando progreso: {str(e)}")
+
     @staticmethod
-    async def get_level_statistics(level_id: int):
+    def _potion_record(previous: Optional[Dict[str, Any]], uid: str, level_id: int, stars: int, potions: Dict[str, int], bloques: List[str], now: datetime) -> Dict[str, Any]:
+        """
+        Registro de progress de un nivel de pociones tras un intento: las pociones y
+        bloques solo se guardan si el intento mejora las estrellas.
+        """
+        if previous is None or stars > (previous.get("stars") or 0):
+            logger.info(f"Guardando nueva marca para usuario {uid} en nivel {level_id}")
+        else:
+            logger.info(f"Manteniendo progreso existente para usuario {uid} en nivel {level_id}")
+        return best_progress(previous, uid, level_id, "stars", stars, now, {"potions": potions, "bloques": bloques})
+
+    @staticmethod
+    async def get_level_statistics(level_id: int, include_progress: bool = True, limit: Optional[int] = None, start_after: Optional[str] = None):
         """
         Obtiene estadísticas sobre cuántos usuarios han completado el nivel 
         y su puntuación promedio.
+        Se leen los agregados del nivel (shards de level_stats), con coste fijo
+        independiente del numero de intentos registrados.
         
         Args:
             level_id (int): ID del nivel para obtener estadísticas
+            include_progress (bool): Incluye el progreso del nivel (paginado con limit/start_after).
+                Con False se omite la consulta y progress y levels_completed van vacios.
+            limit (int, optional): Tamaño de página del progreso incluido.
+            start_after (str, optional): progress_id del último registro de la página anterior.
             
         Returns:
             dict: Estadísticas del nivel incluyendo intentos, completados y estrellas
         """
         logger.info(f"Obteniendo estadísticas del nivel {level_id}")
-        
-        
-            # inicializar contadores
-        stats = {
-        "total_attempts": 0,
-        "completed_count": 0,
-        "average_stars": 0.0,
-        "three_stars_count": 0,
-        "average_duration_seconds": 0.0,
-        }
 
         try:
-            progress_docs = db.collection("progress").where("level_id", "==", level_id).stream()
+            aggregates = await statistics.read_aggregates(level_id)
+            stats = statistics.statistics_from_aggregates(aggregates)
 
-            total_stars = 0
-            total_duration = 0
-            duration_entries = 0
             progress_list = []
-            levels_completed = []
-            found = False  # Indicador de si hubo progreso
-
-            for doc in progress_docs:
-                found = True
-                data = doc.to_dict()
-                progress_list.append(data)
-
-                stats["total_attempts"] += data.get("attempts", 1)
-                stars = data.get("stars", 0)
-
-                if stars > 0:
-                    stats["completed_count"] += 1
-                    total_stars += stars
-
-                if stars == 3:
-                    stats["three_stars_count"] += 1
-
-                start = data.get("start_date")
-                end = data.get("completion_date")
-                if start and end:
-                    duration = (end.replace(tzinfo=None) - start.replace(tzinfo=None)).total_seconds()
-                    total_duration += duration
-                    duration_entries += 1
-
-                if "level_id" in data:
-                    levels_completed.append(data["level_id"])
-
-            if not found:
-                logger.info(f"No hay datos de progreso para el nivel {level_id}")
-                return {
-                    **stats,
-                    "progress": [],
-                    "levels_completed": []
-                }
-
-            if stats["completed_count"] > 0:
-                stats["average_stars"] = round(total_stars / stats["completed_count"], 2)
-
-            if duration_entries > 0:
-                stats["average_duration_seconds"] = round(total_duration / duration_entries, 2)
+            next_cursor = None
+            if include_progress:
+                progress_docs, next_cursor = await query_level_progress(level_id, limit, start_after)
+                progress_list = [{"progress_id": doc.id, **doc.to_dict()} for doc in progress_docs]
 
             logger.info(f"Estadísticas calculadas para nivel {level_id}: {stats}")
-            
-            levels_completed = list(set(levels_completed))
 
             return {
                 **stats,
                 "progress": progress_list,
-                "levels_completed": levels_completed
+                "levels_completed": list({record["level_id"] for record in progress_list if "level_id" in record}),
+                "next_cursor": next_cursor,
             }
 
         except Exception as e:
             logger.error(f"Error obteniendo estadísticas: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"Error al obtener estadísticas: {str(e)}")
+
+    @staticmethod
+    async def stream_level_progress(level_id: int, limit: Optional[int] = None, start_after: Optional[str] = None):
+        """
+        Recorre el progreso registrado en un nivel documento a documento, sin
+        construir la lista completa.
+        Args:
+            level_id (int): ID del nivel.
+            limit (int, optional): Número máximo de registros.
+            start_after (str, optional): progress_id a partir del cual continuar.
+        Yields:
+            dict: Registro de progreso con su progress_id.
+        """
+        async for doc in stream_level_progress(level_id, limit, start_after):
+            yield {"progress_id": doc.id, **doc.to_dict()}
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import os
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# dependencias opcionales: si no estan instaladas se usan json y zlib de la libreria estandar
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - depende del entorno
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depende del entorno
+    zstandard = None
+
+# serializacion del estado: "msgpack" o "json"
+STATE_CODEC_SERIALIZER = os.getenv("STATE_CODEC_SERIALIZER", "msgpack" if msgpack is not None else "json")
+# compresion: "zlib", "zstd" o "none"
+STATE_CODEC_COMPRESSION = os.getenv("STATE_CODEC_COMPRESSION", "zlib")
+# solo se comprimen los estados serializados de al menos este tamaño (bytes)
+STATE_COMPRESSION_THRESHOLD = int(os.getenv("STATE_COMPRESSION_THRESHOLD", "1024"))
+# tamaño maximo de un estado ya codificado; un documento de Firestore admite 1 MiB en total
+STATE_MAX_BYTES = int(os.getenv("STATE_MAX_BYTES", str(512 * 1024)))
+
+# campos del documento de level_states con el estado codificado
+BLOB_FIELD = "state_blob"
+ENCODING_FIELD = "state_encoding"
+# campo de los documentos antiguos, con el estado como mapa de Firestore
+LEGACY_FIELD = "state"
+
+
+class StateCodecError(ValueError):
+    """El estado guardado no se puede decodificar (codificacion desconocida o datos corruptos)."""
+
+
+class StateTooLargeError(ValueError):
+    """El estado codificado supera el tamaño maximo permitido."""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"El estado ocupa {size} bytes y el máximo es {limit}")
+        self.size = size
+        self.limit = limit
+
+
+def _json_dumps(state: Any) -> bytes:
+    return json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return json.loads(data.decode("utf-8"))
+
+
+def _serializers() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    serializers = {"json": (_json_dumps, _json_loads)}
+    if msgpack is not None:
+        serializers["msgpack"] = (
+            lambda state: msgpack.packb(state, use_bin_type=True),
+            lambda data: msgpack.unpackb(data, raw=False),
+        )
+    return serializers
+
+
+def _compressors() -> Dict[str, Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]]:
+    compressors = {"zlib": (lambda data: zlib.compress(data, 6), zlib.decompress)}
+    if zstandard is not None:
+        compressors["zstd"] = (
+            lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data),
+        )
+    return compressors
+
+
+class StateCodec:
+    """
+    Codifica los estados de nivel para guardarlos en Firestore como un campo de
+    bytes: serializacion binaria compacta y, a partir de un tamaño, compresion.
+
+    La codificacion usada se guarda junto a los datos ("msgpack+zlib", "json"...),
+    de modo que cambiar la configuracion no invalida los estados ya guardados, y
+    los documentos antiguos con el estado como mapa se siguen leyendo.
+    """
+
+    def __init__(
+        self,
+        serializer: str = STATE_CODEC_SERIALIZER,
+        compression: str = STATE_CODEC_COMPRESSION,
+        threshold: int = STATE_COMPRESSION_THRESHOLD,
+        max_bytes: int = STATE_MAX_BYTES,
+    ):
+        self._serializers = _serializers()
+        self._compressors = _compressors()
+        if serializer not in self._serializers:
+            logger.warning(f"Serializacion de estados '{serializer}' no disponible, se usa json")
+            serializer = "json"
+        if compression != "none" and compression not in self._compressors:
+            logger.warning(f"Compresion de estados '{compression}' no disponible, se usa zlib")
+            compression = "zlib"
+        self.serializer = serializer
+        self.compression = compression
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+
+    def encode(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Codifica un estado.
+        Returns:
+            dict: Campos state_blob y state_encoding para el documento de level_states.
+        Raises:
+            StateTooLargeError: Si el estado codificado supera max_bytes.
+        """
+        data, encoding = self._serialize(state)
+        if self._compresses(data):
+            data, encoding = self._compress(data, encoding)
+        return self._fields(data, encoding)
+
+    async def encode_async(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Como encode, pero la compresion de los estados que llegan al umbral se hace
+        en el pool de hilos para no bloquear el event loop con los estados grandes.
+        """
+        data, encoding = self._serialize(state)
+        if self._compresses(data):
+            data, encoding = await asyncio.get_running_loop().run_in_executor(None, self._compress, data, encoding)
+        return self._fields(data, encoding)
+
+    def _serialize(self, state: Dict[str, Any]) -> Tuple[bytes, str]:
+        dumps, _ = self._serializers[self.serializer]
+        return dumps(state), self.serializer
+
+    def _compresses(self, data: bytes) -> bool:
+        return self.compression != "none" and len(data) >= self.threshold
+
+    def _compress(self, data: bytes, encoding: str) -> Tuple[bytes, str]:
+        compress, _ = self._compressors[self.compression]
+        return compress(data), f"{encoding}+{self.compression}"
+
+    def _fields(self, data: bytes, encoding: str) -> Dict[str, Any]:
+        if len(data) > self.max_bytes:
+            raise StateTooLargeError(len(data), self.max_bytes)
+        return {BLOB_FIELD: data, ENCODING_FIELD: encoding}
+
+    def decode(self, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Decodifica el estado de un documento de level_states, codificado o en el
+        formato antiguo (mapa en el campo state).
+        Returns:
+            dict | None: Estado guardado, o None si el documento no tiene estado.
+        Raises:
+            StateCodecError: Si la codificacion es desconocida o los datos estan corruptos.
+        """
+        if BLOB_FIELD not in document:
+            return document.get(LEGACY_FIELD)
+        encoding = document.get(ENCODING_FIELD) or "json"
+        serializer, _, compression = encoding.partition("+")
+        if serializer not in self._serializers or (compression and compression not in self._compressors):
+            raise StateCodecError(f"Codificación de estado no soportada: '{encoding}'")
+        data = bytes(document[BLOB_FIELD])
+        try:
+            if compression:
+                data = self._compressors[compression][1](data)
+            return self._serializers[serializer][1](data)
+        except Exception as e:
+            raise StateCodecError(f"Estado corrupto ({encoding}): {e}")
+
+
+state_codec = StateCodec()
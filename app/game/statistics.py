@@ -0,0 +1,176 @@
+import os
+import random
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from firebase_admin import firestore
+
+from app.config.datastore import datastore
+
+# agregados por nivel: level_stats/{level_id}/shards/{n}
+STATS_COLLECTION = "level_stats"
+# numero de shards por nivel; mas shards = menos contencion en niveles muy jugados
+LEVEL_STATS_SHARDS = int(os.getenv("LEVEL_STATS_SHARDS", "10"))
+
+STAR_VALUES = (0, 1, 2, 3)
+
+
+def shards_path(level_id: int) -> str:
+    return f"{STATS_COLLECTION}/{level_id}/shards"
+
+
+def empty_aggregates() -> Dict[str, Any]:
+    return {
+        "attempts": 0,
+        "completions": 0,
+        "stars_sum": 0,
+        "stars_histogram": {str(stars): 0 for stars in STAR_VALUES},
+        "duration_sum": 0.0,
+        "duration_count": 0,
+    }
+
+
+def _duration_seconds(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if not start or not end:
+        return None
+    return (end.replace(tzinfo=None) - start.replace(tzinfo=None)).total_seconds()
+
+
+def contribution(record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Lo que aporta un documento de progress a los agregados de su nivel (sin contar
+    intentos): completado, estrellas, histograma y duracion.
+    """
+    totals = empty_aggregates()
+    if not record:
+        return totals
+    stars = record.get("stars", 0) or 0
+    totals["stars_histogram"][str(stars)] = 1
+    if stars > 0:
+        totals["completions"] = 1
+        totals["stars_sum"] = stars
+    duration = _duration_seconds(record.get("start_date"), record.get("completion_date"))
+    if duration is not None:
+        totals["duration_sum"] = duration
+        totals["duration_count"] = 1
+    return totals
+
+
+def progress_delta(before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Diferencia en los agregados al pasar un documento de progress de 'before'
+    (None si no existia) a 'after'. Cada escritura cuenta como un intento.
+    """
+    old, new = contribution(before), contribution(after)
+    delta: Dict[str, Any] = {"attempts": 1, "stars_histogram": {}}
+    for field in ("completions", "stars_sum", "duration_sum", "duration_count"):
+        if new[field] != old[field]:
+            delta[field] = new[field] - old[field]
+    for stars in STAR_VALUES:
+        key = str(stars)
+        change = new["stars_histogram"][key] - old["stars_histogram"][key]
+        if change:
+            delta["stars_histogram"][key] = change
+    return delta
+
+
+def delta_update(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte una diferencia en datos para set(merge=True) con Increment, sin leer el shard."""
+    update: Dict[str, Any] = {
+        field: firestore.Increment(value)
+        for field, value in delta.items()
+        if field != "stars_histogram"
+    }
+    if delta.get("stars_histogram"):
+        update["stars_histogram"] = {
+            stars: firestore.Increment(change) for stars, change in delta["stars_histogram"].items()
+        }
+    return update
+
+
+def apply_delta(aggregates: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Aplica una diferencia a unos agregados en memoria."""
+    for field, value in delta.items():
+        if field == "stars_histogram":
+            for stars, change in value.items():
+                aggregates["stars_histogram"][stars] = aggregates["stars_histogram"].get(stars, 0) + change
+        else:
+            aggregates[field] += value
+    return aggregates
+
+
+def aggregate_records(records: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Agregados exactos de un conjunto de documentos de progress. Es lo que usa la
+    reconciliacion (que suma aparte los intentos fallidos, ver
+    app.progress.attempts.level_failures); coincide con la suma de las diferencias
+    de cada escritura.
+    """
+    totals = empty_aggregates()
+    for record in records:
+        totals["attempts"] += record.get("attempts", 1) or 1
+        part = contribution(record)
+        part["attempts"] = 0
+        apply_delta(totals, part)
+    return totals
+
+
+def merge_shards(shards: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Suma los contadores de todos los shards de un nivel."""
+    totals = empty_aggregates()
+    for shard in shards:
+        for field in ("attempts", "completions", "stars_sum", "duration_sum", "duration_count"):
+            totals[field] += shard.get(field, 0) or 0
+        for stars, count in (shard.get("stars_histogram") or {}).items():
+            totals["stars_histogram"][stars] = totals["stars_histogram"].get(stars, 0) + (count or 0)
+    return totals
+
+
+def statistics_from_aggregates(aggregates: Dict[str, Any]) -> Dict[str, Any]:
+    """Convierte los agregados en los campos de LevelStatisticsResponse."""
+    completions = aggregates["completions"]
+    duration_count = aggregates["duration_count"]
+    return {
+        "total_attempts": aggregates["attempts"],
+        "completed_count": completions,
+        "average_stars": round(aggregates["stars_sum"] / completions, 2) if completions else 0.0,
+        "three_stars_count": aggregates["stars_histogram"].get("3", 0),
+        "average_duration_seconds": round(aggregates["duration_sum"] / duration_count, 2) if duration_count else 0.0,
+    }
+
+
+def shard_write(level_id: int, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> Tuple[str, str, Dict[str, Any]]:
+    """
+    Escritura que suma una escritura de progress a los agregados del nivel, en un
+    shard aleatorio y con Increment (atomico en el servidor, sin lectura previa).
+    Args:
+        level_id (int): Nivel del registro.
+        before (dict | None): Documento de progress antes de la escritura (None si es nuevo).
+        after (dict): Documento de progress despues de la escritura.
+    Returns:
+        Tuple[str, str, dict]: Coleccion, id del shard y datos para set(merge=True),
+            listos para un WriteBatch.
+    """
+    shard = str(random.randrange(LEVEL_STATS_SHARDS))
+    return shards_path(level_id), shard, delta_update(progress_delta(before, after))
+
+
+def attempt_write(level_id: int) -> Tuple[str, str, Dict[str, Any]]:
+    """Escritura que suma un intento fallido (sin registro de progress) a los agregados del nivel."""
+    shard = str(random.randrange(LEVEL_STATS_SHARDS))
+    return shards_path(level_id), shard, {"attempts": firestore.Increment(1)}
+
+
+async def record_progress_write(level_id: int, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]):
+    """Aplica shard_write() de inmediato, fuera de cualquier batch."""
+    path, shard, update = shard_write(level_id, before, after)
+    await datastore.run(
+        STATS_COLLECTION,
+        lambda: datastore.collection(path).document(shard).set(update, merge=True),
+    )
+
+
+async def read_aggregates(level_id: int) -> Dict[str, Any]:
+    """Lee y suma los shards de un nivel: coste fijo, independiente del numero de intentos."""
+    docs = await datastore.run(STATS_COLLECTION, lambda: datastore.collection(shards_path(level_id)).get())
+    return merge_shards(doc.to_dict() for doc in docs)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from app.auth.token_cache import certificate_cache
+from app.config.backend import backend_name
+from app.config.datastore import datastore
+from app.levels.catalog import level_catalog
+
+logger = logging.getLogger(__name__)
+
+# tiempo maximo de la lectura de prueba a Firestore
+HEALTH_PROBE_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PROBE_TIMEOUT_SECONDS", "2"))
+# las comprobaciones se reutilizan durante este tiempo (los balanceadores preguntan cada pocos segundos)
+HEALTH_PROBE_CACHE_SECONDS = float(os.getenv("HEALTH_PROBE_CACHE_SECONDS", "5"))
+# documento que se lee para medir la latencia; no hace falta que exista
+HEALTH_PROBE_COLLECTION = "health"
+HEALTH_PROBE_DOC_ID = "probe"
+# las peticiones de estas rutas no cuentan como primera peticion atendida
+HEALTH_PATH_PREFIX = "/api/health"
+
+
+class Readiness:
+    """
+    Estado de arranque del worker: tiempos de cada fase del arranque en frio
+    (importacion, inicializacion del backend, precarga de caches, primera
+    peticion) y comprobaciones para /api/health/ready.
+
+    Los tiempos se miden desde booted_at, que app.main fija al empezar a
+    importarse; el tiempo de arranque del interprete y de uvicorn no se incluye.
+    """
+
+    def __init__(self, booted_at: Optional[float] = None):
+        self.booted_at = booted_at if booted_at is not None else time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.ready = False
+        self._cached: Optional[Tuple[float, bool, Dict[str, Any]]] = None
+
+    def mark(self, phase: str, seconds: float):
+        """Guarda la duracion de una fase del arranque."""
+        self.timings[phase] = round(seconds, 4)
+
+    def mark_elapsed(self, phase: str):
+        """Guarda el tiempo transcurrido desde booted_at hasta ahora."""
+        self.mark(phase, time.perf_counter() - self.booted_at)
+
+    def mark_ready(self):
+        """El arranque ha terminado: el worker puede recibir trafico."""
+        self.mark_elapsed("startup_seconds")
+        self.ready = True
+        logger.info(f"Worker listo en {self.timings['startup_seconds'] * 1000:.0f} ms: {self.timings}")
+
+    def mark_stopping(self):
+        """La app se esta parando: deja de estar lista."""
+        self.ready = False
+        self._cached = None
+
+    def mark_first_request(self):
+        if "first_request_seconds" not in self.timings:
+            self.mark_elapsed("first_request_seconds")
+            logger.info(f"Primera peticion atendida a los {self.timings['first_request_seconds'] * 1000:.0f} ms del arranque")
+
+    @property
+    def first_request_pending(self) -> bool:
+        return "first_request_seconds" not in self.timings
+
+    async def probe_backend(self) -> Dict[str, Any]:
+        """Lee un documento de Firestore y devuelve si ha respondido y cuanto ha tardado."""
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(datastore.get(HEALTH_PROBE_COLLECTION, HEALTH_PROBE_DOC_ID), HEALTH_PROBE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            return {"ok": False, "latency_ms": round((time.perf_counter() - start) * 1000, 2), "error": "timeout"}
+        except Exception:
+            # el detalle solo va al log: la ruta es publica
+            logger.exception("La lectura de prueba a Firestore ha fallado")
+            return {"ok": False, "latency_ms": round((time.perf_counter() - start) * 1000, 2), "error": "unavailable"}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    async def _check_catalog(self) -> Dict[str, Any]:
+        if level_catalog.loaded_at is None:
+            # si no se pudo precargar al arrancar se reintenta aqui
+            try:
+                await level_catalog.load()
+            except Exception:
+                logger.exception("No se pudo cargar el catalogo de niveles")
+                return {"ok": False, "error": "load_failed"}
+        # listening es False tambien si el listener se ha caido (el catalogo sigue por TTL)
+        return {"ok": True, "levels": level_catalog.size, "listening": level_catalog.listening}
+
+    def _check_certificates(self) -> Dict[str, Any]:
+        if os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+            # los tokens del emulador no van firmados
+            return {"ok": True, "emulator": True}
+        if certificate_cache.is_stale:
+            certificate_cache.refresh_in_background()
+        return {"ok": bool(certificate_cache.certs), "keys": len(certificate_cache.certs), "stale": certificate_cache.is_stale}
+
+    async def check(self) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Comprueba si el worker puede atender peticiones: arranque terminado,
+        Firestore respondiendo a tiempo, catalogo de niveles y certificados
+        de firma cargados.
+        Returns:
+            Tuple[bool, dict]: Si esta listo y el detalle de cada comprobacion.
+        """
+        now = time.monotonic()
+        if self._cached is not None and now - self._cached[0] < HEALTH_PROBE_CACHE_SECONDS:
+            return self._cached[1], self._cached[2]
+        checks = {
+            "firestore": await self.probe_backend(),
+            "level_catalog": await self._check_catalog(),
+            "auth_certificates": self._check_certificates(),
+        }
+        ready = self.ready and all(check["ok"] for check in checks.values())
+        body = {
+            "status": "ready" if ready else ("starting" if not self.ready else "unavailable"),
+            "backend": backend_name(),
+            "checks": checks,
+            "cold_start": dict(self.timings),
+        }
+        if self.ready:
+            # durante el arranque no se cachea para detectar cuanto antes que ha terminado
+            self._cached = (now, ready, body)
+        return ready, body
+
+
+class FirstRequestMiddleware:
+    """
+    Middleware ASGI que anota cuando se termina de atender la primera peticion
+    (sin contar las de /api/health). Despues solo pasa la llamada a la app.
+    """
+
+    def __init__(self, app, readiness: Readiness):
+        self.app = app
+        self.readiness = readiness
+
+    async def __call__(self, scope, receive, send):
+        if not self.readiness.first_request_pending or scope["type"] != "http" or scope["path"].startswith(HEALTH_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.readiness.mark_first_request()
+
+
+readiness = Readiness()
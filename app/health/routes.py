@@ -0,0 +1,21 @@
+from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
+
+from .readiness import readiness
+
+router = APIRouter(prefix="/health", tags=["Health"])
+
+
+@router.get("/ready", summary="Comprobar si el worker puede recibir tráfico")
+async def ready():
+    """
+    Readiness probe para el balanceador u orquestador.
+    Raises:
+        503: Si el arranque no ha terminado, Firestore no responde a tiempo o
+            faltan el catálogo de niveles o los certificados de firma.
+    Returns:
+        dict: Estado, backend, resultado y latencia de cada comprobación y
+            tiempos del arranque en frío.
+    """
+    ok, body = await readiness.check()
+    return JSONResponse(body, status_code=status.HTTP_200_OK if ok else status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config.datastore import datastore
+from app.levels.compiled import CompiledLevel, compile_level
+
+logger = logging.getLogger(__name__)
+
+# tiempo maximo que se sirve el catalogo sin recargar si no hay listener activo
+# (tambien si el listener se ha caido)
+LEVEL_CATALOG_TTL_SECONDS = float(os.getenv("LEVEL_CATALOG_TTL_SECONDS", "300"))
+
+
+class LevelCatalog:
+    """
+    Catalogo en memoria de la coleccion 'levels', compartido por todo el proceso.
+
+    Se indexa por el campo 'level_id' y por el id del documento (p. ej. 'Level1'),
+    guarda cada nivel ya compilado (ver app.levels.compiled), se mantiene
+    actualizado con un listener de Firestore y, si el listener no esta activo,
+    se recarga cuando pasa LEVEL_CATALOG_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl: float = LEVEL_CATALOG_TTL_SECONDS):
+        self.ttl = ttl
+        # (por level_id, por id de documento, lista ordenada por level_id)
+        self._index: Tuple[Dict[int, CompiledLevel], Dict[str, CompiledLevel], List[CompiledLevel]] = ({}, {}, [])
+        self.loaded_at: Optional[float] = None
+        self._watch = None
+        # carga en curso, compartida por las peticiones que la necesitan a la vez
+        self._loading: Optional[asyncio.Task] = None
+
+    @property
+    def listening(self) -> bool:
+        """True si hay un listener y sigue activo (un error del stream lo cierra)."""
+        return self._watch is not None and getattr(self._watch, "is_active", True)
+
+    @property
+    def size(self) -> int:
+        """Numero de niveles cargados (con 'level_id')."""
+        return len(self._index[0])
+
+    def is_stale(self) -> bool:
+        if self.loaded_at is None:
+            return True
+        if self.listening:
+            return False
+        return time.time() - self.loaded_at >= self.ttl
+
+    def _replace(self, documents: List[Tuple[str, dict]]):
+        by_level_id: Dict[int, CompiledLevel] = {}
+        by_doc_id: Dict[str, CompiledLevel] = {}
+        for doc_id, data in documents:
+            level = compile_level(doc_id, data)
+            by_doc_id[doc_id] = level
+            if level.level_id is not None:
+                by_level_id[level.level_id] = level
+        ordered = sorted(by_level_id.values(), key=lambda lvl: lvl.level_id)
+        # se sustituye la tupla completa de una vez para que los lectores nunca
+        # vean un indice a medio construir (el listener corre en otro hilo)
+        self._index = (by_level_id, by_doc_id, ordered)
+        self.loaded_at = time.time()
+
+    async def load(self):
+        """Lee la coleccion 'levels' completa y reconstruye los indices."""
+        docs = await datastore.query("levels")
+        self._replace([(doc.id, doc.to_dict()) for doc in docs])
+        logger.info(f"Catalogo de niveles cargado: {len(self._index[1])} documentos")
+
+    async def _ensure_loaded(self):
+        if not self.is_stale():
+            return
+        if self._watch is not None and not self.listening:
+            # el listener se ha caido: se recarga por TTL y se intenta suscribir de nuevo
+            logger.warning("El listener de niveles no esta activo; se vuelve a iniciar")
+            self.stop_listener()
+            self.start_listener()
+            if not self.is_stale():
+                return
+        loop = asyncio.get_running_loop()
+        task = self._loading
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = self._loading = loop.create_task(self.load())
+        await asyncio.shield(task)
+
+    def _on_snapshot(self, col_snapshot, changes, read_time):
+        try:
+            self._replace([(doc.id, doc.to_dict()) for doc in col_snapshot])
+            logger.info(f"Catalogo de niveles actualizado por listener ({len(changes)} cambios)")
+        except Exception as e:
+            logger.error(f"Error aplicando cambios de niveles: {e}")
+
+    def start_listener(self):
+        """Se suscribe a los cambios de la coleccion 'levels'."""
+        if self._watch is not None:
+            return
+        try:
+            self._watch = datastore.collection("levels").on_snapshot(self._on_snapshot)
+        except Exception as e:
+            # sin listener el catalogo sigue funcionando con recarga por TTL
+            logger.warning(f"No se pudo iniciar el listener de niveles: {e}")
+            self._watch = None
+
+    def stop_listener(self):
+        if self._watch is not None:
+            try:
+                self._watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error cerrando el listener de niveles: {e}")
+            finally:
+                self._watch = None
+
+    def upsert(self, doc_id: str, data: Dict[str, Any]):
+        """Anade o sustituye un nivel en el catalogo sin esperar al listener."""
+        self.upsert_many([(doc_id, data)])
+
+    def upsert_many(self, items: List[Tuple[str, Dict[str, Any]]]):
+        """Anade o sustituye varios niveles (id de documento, datos) en una sola reconstruccion."""
+        _, by_doc_id, _ = self._index
+        replaced = {doc_id for doc_id, _ in items}
+        documents = [(key, level.data) for key, level in by_doc_id.items() if key not in replaced]
+        documents.extend((doc_id, dict(data)) for doc_id, data in items)
+        loaded_at = self.loaded_at
+        self._replace(documents)
+        if loaded_at is not None:
+            # una escritura local no cuenta como recarga completa
+            self.loaded_at = loaded_at
+
+    async def all(self) -> List[dict]:
+        """
+        Devuelve todos los niveles ordenados por 'level_id'.
+        Returns:
+            List[dict]: Copias de los niveles, que el llamador puede modificar.
+        """
+        await self._ensure_loaded()
+        return [dict(level.data) for level in self._index[2]]
+
+    async def get(self, level_id: int) -> Optional[dict]:
+        """Busca un nivel por su campo 'level_id'. Devuelve una copia o None."""
+        await self._ensure_loaded()
+        level = self._index[0].get(level_id)
+        return dict(level.data) if level is not None else None
+
+    async def get_by_doc_id(self, doc_id: str) -> Optional[dict]:
+        """Busca un nivel por el id de su documento (p. ej. 'Level1'). Devuelve una copia o None."""
+        await self._ensure_loaded()
+        level = self._index[1].get(doc_id)
+        return dict(level.data) if level is not None else None
+
+    async def all_compiled(self) -> List[CompiledLevel]:
+        """Todos los niveles compilados, ordenados por 'level_id'."""
+        await self._ensure_loaded()
+        return list(self._index[2])
+
+    async def compiled(self, level_id: int) -> Optional[CompiledLevel]:
+        """Nivel compilado por su campo 'level_id', o None."""
+        await self._ensure_loaded()
+        return self._index[0].get(level_id)
+
+    async def compiled_by_doc_id(self, doc_id: str) -> Optional[CompiledLevel]:
+        """Nivel compilado por el id de su documento, o None."""
+        await self._ensure_loaded()
+        return self._index[1].get(doc_id)
+
+
+level_catalog = LevelCatalog()
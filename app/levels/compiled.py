@@ -0,0 +1,78 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CompiledLevel:
+    """
+    Representacion precalculada de un nivel, construida una sola vez al cargarlo
+    o crearlo para no recorrer 'listCommands' en cada peticion.
+
+    Attributes:
+        doc_id (str): Id del documento en Firestore.
+        level_id (int | None): Campo 'level_id' del nivel.
+        data (dict): Documento original del nivel.
+        expected_commands (FrozenSet[str]): Comandos que debe enviar el usuario.
+        commands (Tuple[str, ...]): Lista plana de comandos que se muestra al cliente.
+        potions_config (dict): Cantidades esperadas de cada tipo de pocion.
+        perfect_score (int): Numero ideal de bloques en los niveles de pociones.
+        version (str): Huella del contenido del documento; cambia solo si cambia el nivel.
+    """
+    doc_id: str
+    level_id: Optional[int]
+    data: Dict[str, Any]
+    expected_commands: FrozenSet[str]
+    commands: Tuple[str, ...]
+    potions_config: Dict[str, int]
+    perfect_score: int
+    version: str
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Copia del documento con la lista plana de comandos ya incluida."""
+        return {**self.data, "commands": list(self.commands)}
+
+
+def flatten_commands(list_commands: Dict[str, Any]) -> List[str]:
+    """
+    Aplana el mapa 'listCommands' de un nivel. Los submapas (como 'ESTANTE')
+    aportan todos sus valores.
+    """
+    commands: List[str] = []
+    for value in list_commands.values():
+        if isinstance(value, dict):
+            commands.extend(value.values())
+        else:
+            commands.append(value)
+    return commands
+
+
+def level_version(data: Dict[str, Any]) -> str:
+    """Huella estable del contenido de un nivel (no depende del orden de las claves)."""
+    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def compile_level(doc_id: str, data: Dict[str, Any]) -> CompiledLevel:
+    """
+    Construye la representacion precalculada de un documento de nivel.
+    Args:
+        doc_id (str): Id del documento.
+        data (dict): Datos del nivel tal como estan en Firestore.
+    Returns:
+        CompiledLevel: Nivel con comandos esperados y objetivos de pociones precalculados.
+    """
+    flattened = flatten_commands(data.get("listCommands", {}) or {})
+    # si el documento ya trae una lista 'commands' se respeta para el listado
+    commands = data["commands"] if "commands" in data else flattened
+    return CompiledLevel(
+        doc_id=doc_id,
+        level_id=data.get("level_id"),
+        data=data,
+        expected_commands=frozenset(flattened),
+        commands=tuple(commands),
+        potions_config=dict(data.get("potions_config", {}) or {}),
+        perfect_score=data.get("perfect_score", 3),
+        version=level_version(data),
+    )
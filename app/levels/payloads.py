@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Container, Iterable, List, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from .compiled import CompiledLevel
+from .schemas import LevelResponse, LevelWithCompletion
+
+# payloads serializados que se guardan (dos por version de nivel: detalle y elemento del listado)
+LEVEL_PAYLOAD_CACHE_SIZE = int(os.getenv("LEVEL_PAYLOAD_CACHE_SIZE", "512"))
+# el detalle de un nivel no depende del usuario: el cliente lo puede reutilizar sin preguntar
+LEVEL_CACHE_CONTROL = f"private, max-age={int(os.getenv('LEVEL_CACHE_MAX_AGE_SECONDS', '60'))}"
+# el listado cambia al completar un nivel: se revalida siempre (con If-None-Match es barato)
+LEVEL_LIST_CACHE_CONTROL = "private, no-cache"
+
+_COMPLETED = b',"isCompleted":true}'
+_NOT_COMPLETED = b',"isCompleted":false}'
+
+
+def _dumps(content) -> bytes:
+    # mismo formato que JSONResponse de Starlette
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _etag(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def _level_fields(level: CompiledLevel) -> dict:
+    data = level.data
+    return {
+        "level_id": level.level_id,
+        "name": data.get("name"),
+        "description": data.get("description"),
+        "max_score": data.get("max_score"),
+        "order": data.get("order"),
+        "estimated_time": data.get("estimated_time"),
+        "potions_config": level.potions_config,
+        "commands": list(level.commands),
+    }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparacion debil de If-None-Match (RFC 9110): ignora el prefijo W/ y admite "*"."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cached_json_response(request: Request, body: bytes, etag: str, cache_control: str) -> Response:
+    """Respuesta JSON ya serializada con ETag, o 304 si el cliente tiene esa version."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+class LevelPayloadCache:
+    """
+    Respuestas de /api/levels ya validadas y serializadas, por version de nivel
+    (ver CompiledLevel.version). Como la version depende solo del contenido, las
+    recargas del catalogo que no cambian un nivel siguen usando su payload.
+
+    El listado guarda cada elemento sin el campo isCompleted ni la llave de
+    cierre; en cada peticion solo se anade ese campo segun el progreso del usuario.
+    """
+
+    def __init__(self, max_entries: int = LEVEL_PAYLOAD_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _cached(self, key: Tuple[str, str], build) -> Tuple[bytes, str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        body = build()
+        entry = (body, _etag(body))
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def detail(self, level: CompiledLevel) -> Tuple[bytes, str]:
+        """Cuerpo de GET /levels/{level_id} y su ETag."""
+        return self._cached(("detail", level.version), lambda: _dumps(LevelResponse(**_level_fields(level)).dict()))
+
+    def _list_item(self, level: CompiledLevel) -> Tuple[bytes, str]:
+        def build():
+            item = LevelWithCompletion(**_level_fields(level), isCompleted=False).dict()
+            del item["isCompleted"]
+            # sin la llave de cierre: se completa con el campo isCompleted
+            return _dumps(item)[:-1]
+        return self._cached(("list_item", level.version), build)
+
+    def listing(self, levels: Iterable[CompiledLevel], completed: Container[int]) -> Tuple[bytes, str]:
+        """
+        Cuerpo de GET /levels/ con isCompleted para el usuario y su ETag, que
+        depende de las versiones de los niveles y de cuales ha completado.
+        completed debe tener pertenencia en O(1) (set o LevelBitset).
+        """
+        parts: List[bytes] = []
+        fingerprint = hashlib.sha256()
+        for level in levels:
+            item, item_etag = self._list_item(level)
+            done = level.level_id in completed
+            parts.append(item + (_COMPLETED if done else _NOT_COMPLETED))
+            fingerprint.update(item_etag.encode("ascii") + (b"1" if done else b"0"))
+        return b"[" + b",".join(parts) + b"]", f'"{fingerprint.hexdigest()[:32]}"'
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+level_payloads = LevelPayloadCache()
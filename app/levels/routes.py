@@ -1,154 +1,81 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from pydantic import BaseModel
-from typing import List, Optional, Dict
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from typing import List
 from .schemas import Level, LevelCreate, LevelResponse, LevelWithCompletion
-from .service import LevelService
-from ..auth.service import AuthService
+from .payloads import LEVEL_CACHE_CONTROL, LEVEL_LIST_CACHE_CONTROL, cached_json_response, level_payloads
+from .service import LevelService, MAX_BULK_LEVELS
+from ..auth.dependencies import UserContext, get_current_user
 from app.progress.service import ProgressService
 
 router = APIRouter(prefix="/levels", tags=["Levels"])
 
 @router.get("/", response_model=List[LevelWithCompletion], summary="Obtener todos los niveles")
-async def get_levels(authorization: Optional[str] = Header(None)):
+async def get_levels(request: Request, user: UserContext = Depends(get_current_user)):
     """
     Obtiene la lista completa de niveles disponibles y añade el estado 'isCompleted' por usuario.
+    Los niveles se sirven ya serializados (ver app.levels.payloads); por petición
+    solo se calcula isCompleted. Responde 304 si If-None-Match coincide con el ETag.
     Args:
-        authorization (str, optional): Token JWT Bearer para identificar al usuario.
+        request (Request): Petición, para leer If-None-Match.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
     Returns:
         List[LevelWithCompletion]: Lista de niveles con flag isCompleted.
     """ 
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
-    uid = decoded_token["uid"]
+    uid = user.uid
 
-    # Obtener todos los niveles
-    levels = await LevelService.get_all_levels()
-    print("Niveles obtenidos:", levels)
+    # Obtener todos los niveles (ya compilados, con los comandos aplanados)
+    levels = await LevelService.get_compiled_levels()
 
-    # Obtener niveles completados por el usuario
-    completed_levels = await ProgressService.get_levels_completed_by_user(uid) or []
+    # Niveles completados: bitset del documento del usuario (pertenencia en O(1));
+    # los usuarios aun sin bitsets se resuelven con su resumen
+    state = await user.level_state()
+    completed_levels = state.completed if state.tracked else set(await ProgressService.get_levels_completed_by_user(uid) or [])
 
-    # Añadir isCompleted a cada nivel
-    levels_with_status = []
-    for lvl in levels:
-        level_dict = dict(lvl) if not isinstance(lvl, dict) else lvl
-        if "commands" not in level_dict:
-            raw_cmds = level_dict.get("listCommands", {})
-            commands = []
-            for key, val in raw_cmds.items():
-                if isinstance(val, dict):
-                    commands.extend(val.values())
-                else:
-                    commands.append(val)
-            level_dict["commands"] = commands
-        level_dict["isCompleted"] = level_dict.get("level_id") in completed_levels
-        levels_with_status.append(level_dict)
-
-    return levels_with_status
+    # Añadir isCompleted a cada nivel sobre su payload ya serializado
+    body, etag = level_payloads.listing(levels, completed_levels)
+    return cached_json_response(request, body, etag, LEVEL_LIST_CACHE_CONTROL)
 @router.get("/{level_id}", response_model=LevelResponse, summary="Obtener detalles de un nivel")
-async def get_level(level_id: int, authorization: Optional[str] = Header(None)):
+async def get_level(level_id: int, request: Request, user: UserContext = Depends(get_current_user)):
     """
     Obtiene información detallada de un nivel específico, incluyendo configuración de pociones
     y comandos esperados.
+    La respuesta se serializa una vez por versión del nivel y lleva ETag y
+    Cache-Control; con If-None-Match coincidente responde 304 sin cuerpo.
     Args:
         level_id (int): ID del nivel a consultar.
-        authorization (str, optional): Token JWT en el header Authorization (Bearer).
+        request (Request): Petición, para leer If-None-Match.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
     Raises:
         HTTPException 401: Si no se proporciona o es inválido el token.
         HTTPException 404: Si el nivel no existe.
     Returns:
         LevelResponse: Detalles del nivel, configuración y comandos esperados.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )   
-    try:
-        token = authorization.split("Bearer ")[1]
-    except IndexError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Formato del token incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    decoded_token = await AuthService.verify_token(token)
-    level = await LevelService.get_level_by_id(level_id)
-    if not level:
+    compiled = await LevelService.get_compiled_level(level_id)
+    if not compiled:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Nivel no encontrado"
         )
-    #extraer y poner comandos desde listcommands
-    raw_cmds: Dict = level.get("listCommands", {})
-    commands: List[str] = []
-    for key, val in raw_cmds.items():
-        if isinstance(val, dict):
-            commands.extend(val.values())
-        else:
-            commands.append(val)
-    return LevelResponse(
-        level_id=level.get("level_id"),
-        name=level.get("name"),
-        description=level.get("description"),
-        #difficulty=level.get("difficulty"),
-        max_score=level.get("max_score"),
-        order=level.get("order"),
-        estimated_time=level.get("estimated_time"),
-        potions_config=level.get("potions_config", {}),
-        commands=commands
-        )
-    #return LevelResponse(
-     #   level_id=level.level_id,
-     #   name=level.name,
-     #   description=level.description,
-     #   max_score=level.max_score,
-     #   order=level.order,
-     #   estimated_time=level.estimated_time
-     #   potions_config=data.get("potions_config", {}),
-     #   commands=data.get("commands", [])
-    # 
+    #comandos ya aplanados desde listCommands al compilar el nivel
+    body, etag = level_payloads.detail(compiled)
+    return cached_json_response(request, body, etag, LEVEL_CACHE_CONTROL)
 
 # solo admins pueden crear actualizar niveles
 @router.post("/", response_model=Level, status_code=status.HTTP_201_CREATED, summary="Crear un nuevo nivel")
-async def create_level(level: LevelCreate, authorization: Optional[str] = Header(None)):
+async def create_level(level: LevelCreate, user: UserContext = Depends(get_current_user)):
     """
     Crea un nuevo nivel. Solo accesible para usuarios con permisos de administrador.
     Args:
         level (LevelCreate): Datos para crear el nuevo nivel.
-        authorization (str, optional): Token JWT en el header Authorization (Bearer).
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
     Raises:
         HTTPException 401: Si no se proporciona o es inválido el token.
         HTTPException 403: Si el usuario no tiene permisos de administrador.
     Returns:
         Level: Nivel creado con los datos registrados.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )   
-    try:
-        token = authorization.split("Bearer ")[1]
-    except IndexError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Formato del token incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
-    decoded_token = await AuthService.verify_token(token)
     # verificar si el user es admin
-    is_admin = await LevelService.is_admin(decoded_token["uid"])
+    is_admin = await LevelService.is_admin(user)
     if not is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -156,4 +83,33 @@ async def create_level(level: LevelCreate, authorization: Optional[str] = Header
         )
 
     new_level = await LevelService.create_level(level)
-    return new_level
\ No newline at end of file
+    return new_level
+
+
+@router.post("/bulk", response_model=List[Level], status_code=status.HTTP_201_CREATED, summary="Crear varios niveles")
+async def create_levels(levels: List[LevelCreate], user: UserContext = Depends(get_current_user)):
+    """
+    Crea varios niveles a la vez reservando un bloque de IDs consecutivos.
+    Solo accesible para usuarios con permisos de administrador.
+    Args:
+        levels (List[LevelCreate]): Datos de los nuevos niveles.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
+    Raises:
+        HTTPException 400: Si la lista está vacía o supera el máximo por petición.
+        HTTPException 401: Si no se proporciona o es inválido el token.
+        HTTPException 403: Si el usuario no tiene permisos de administrador.
+    Returns:
+        List[Level]: Niveles creados, en el mismo orden que la petición.
+    """
+    if not await LevelService.is_admin(user):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tiene permisos para crear niveles"
+        )
+    if not levels or len(levels) > MAX_BULK_LEVELS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Se deben enviar entre 1 y {MAX_BULK_LEVELS} niveles"
+        )
+
+    return await LevelService.create_levels(levels)
@@ -1,5 +1,13 @@
 from fastapi import HTTPException, status
-from app.config.firebase import db
+from app.config.datastore import datastore
+from app.levels.catalog import level_catalog
+from app.auth.dependencies import UserContext
+
+# contador de level_id: counters/levels {"last_id": n}
+COUNTERS_COLLECTION = "counters"
+LEVEL_COUNTER_ID = "levels"
+# una transaccion admite 500 escrituras: los niveles mas el contador
+MAX_BULK_LEVELS = 499
 
 
 class LevelService:
@@ -15,15 +23,8 @@ class LevelService:
             HTTPException: Error interno en caso de fallo al obtener datos.
         """
         try:
-            levels_ref = db.collection('levels')
-            levels = levels_ref.order_by('level_id').get()
-            
-            result = []
-            for level in levels:
-                level_dict = level.to_dict()
-                level_dict["level_id"] = level_dict.get("level_id")
-                result.append(level_dict)
-            return result
+            # lectura en memoria desde el catalogo de niveles
+            return await level_catalog.all()
             
         except Exception as e:
             raise HTTPException(
@@ -43,10 +44,7 @@ class LevelService:
             HTTPException: Error interno en caso de fallo al consultar.
         """
         try:
-            query = db.collection("levels").where("level_id", "==", level_id).limit(1).get()
-            if not query:
-                return None
-            return query[0].to_dict()
+            return await level_catalog.get(level_id)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -54,30 +52,53 @@ class LevelService:
             )
     
     @staticmethod
-    async def is_admin(uid: str):
+    async def get_compiled_levels():
         """
-        Verifica si un usuario tiene rol de administrador.
+        Obtiene todos los niveles ya compilados (comandos aplanados y esperados).
+        Returns:
+            List[CompiledLevel]: Niveles ordenados por level_id.
+        Raises:
+            HTTPException: Error interno en caso de fallo al obtener datos.
+        """
+        try:
+            return await level_catalog.all_compiled()
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error al obtener niveles: {str(e)}"
+            )
+
+    @staticmethod
+    async def get_compiled_level(level_id: int):
+        """
+        Obtiene un nivel compilado mediante su level_id.
         Args:
-            uid (str): ID del usuario a verificar.
+            level_id (int): Identificador del nivel a buscar.
         Returns:
-            bool: True si es admin, False en caso contrario.
+            CompiledLevel | None: Nivel compilado, None si no se encuentra.
         Raises:
             HTTPException: Error interno en caso de fallo al consultar.
         """
         try:
-            # Aquí asumimos que tienes una colección de administradores
-            admin_ref = db.collection('users').document(uid)
-            admin = admin_ref.get()
-            if not admin.exists:
-                return False
-            
-            # Verificar si el usuario tiene rol de administrador
-            return admin.get('role') == 'admin'
+            return await level_catalog.compiled(level_id)
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error al verificar permisos: {str(e)}"
-            )            
+                detail=f"Error al obtener nivel: {str(e)}"
+            )
+
+    @staticmethod
+    async def is_admin(user: UserContext):
+        """
+        Verifica si un usuario tiene rol de administrador.
+        El rol se lee del custom claim del token ya verificado, sin leer Firestore.
+        Args:
+            user (UserContext): Usuario autenticado.
+        Returns:
+            bool: True si es admin, False en caso contrario.
+        """
+        return user.role == 'admin'
+
     @staticmethod
     async def create_level(level):
         """
@@ -89,28 +110,51 @@ class LevelService:
         Raises:
             HTTPException: Error interno en caso de fallo al crear el nivel.
         """
-        try:
-            levels_ref = db.collection('levels')
-            # Obtener todos los niveles para determinar el máximo level_id actual
-            levels = levels_ref.get()
-            max_id = 0
-            for doc in levels:
-                data = doc.to_dict()
-                if 'level_id' in data and isinstance(data['level_id'], int):
-                    if data['level_id'] > max_id:
-                        max_id = data['level_id']
-            new_id = max_id + 1
+        created = await LevelService.create_levels([level])
+        return created[0]
 
-            new_level_data = level.dict()
-            # Agregar el campo level_id
-            new_level_data['level_id'] = new_id
+    @staticmethod
+    async def create_levels(levels):
+        """
+        Crea varios niveles reservando un bloque de level_id consecutivos.
+        El contador counters/levels se incrementa en la misma transacción que crea
+        los niveles, así que dos creaciones simultáneas nunca reciben el mismo id y
+        el coste no depende del número de niveles existentes.
+        Args:
+            levels (List[LevelCreate]): Modelos con los datos de los nuevos niveles.
+        Returns:
+            List[dict]: Datos de los niveles creados, en el mismo orden, con su level_id.
+        Raises:
+            HTTPException: Error interno en caso de fallo al crear los niveles.
+        """
+        try:
+            payloads = [level.dict() for level in levels]
+            # semilla para el contador: el mayor level_id conocido (catalogo en memoria);
+            # tambien protege frente a niveles creados a mano sin pasar por el contador
+            known_ids = [lvl.level_id for lvl in await level_catalog.all_compiled() if isinstance(lvl.level_id, int)]
+            seed = max(known_ids, default=0)
+            counter_ref = datastore.collection(COUNTERS_COLLECTION).document(LEVEL_COUNTER_ID)
+            levels_ref = datastore.collection('levels')
 
-            # Crear el documento con el id generado (convertido a cadena)
-            levels_ref.document(str(new_id)).set(new_level_data)
+            def allocate(transaction):
+                snapshot = transaction.get(counter_ref)
+                last_id = snapshot.to_dict().get("last_id", 0) if snapshot.exists else 0
+                last_id = max(last_id, seed)
+                created = []
+                for offset, payload in enumerate(payloads, start=1):
+                    # Crear el documento con el id generado (convertido a cadena)
+                    new_level_data = {**payload, "level_id": last_id + offset}
+                    transaction.set(levels_ref.document(str(new_level_data["level_id"])), new_level_data)
+                    created.append(new_level_data)
+                transaction.set(counter_ref, {"last_id": last_id + len(payloads)})
+                return created
 
-            return new_level_data
+            created = await datastore.transaction('levels', allocate)
+            # el catalogo se actualiza al momento, sin esperar al listener
+            level_catalog.upsert_many([(str(data['level_id']), data) for data in created])
+            return created
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al crear el nivel: {str(e)}"
-            )
\ No newline at end of file
+            )
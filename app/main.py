@@ -1,4 +1,9 @@
 
+import time
+# inicio del arranque en frio: se mide desde aqui hasta la primera peticion atendida
+BOOT_STARTED_AT = time.perf_counter()
+
+import asyncio
 from fastapi.responses import RedirectResponse, JSONResponse
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -6,13 +11,31 @@ from app.auth.routes import router as auth_router
 from app.levels.routes import router as levels_router
 from app.progress.routes import router as progress_router
 from app.game.routes import router as game_router
+from app.health.routes import router as health_router
+from app.health.readiness import FirstRequestMiddleware, readiness
+from app.metrics.middleware import MetricsMiddleware, instrument_routes
+from app.metrics.registry import registry
+from app.metrics.routes import router as metrics_router
+from app.profiling.middleware import PROFILING_ENABLED, ProfilingMiddleware
+from app.profiling.routes import router as profiling_router
+from app.config import backend
+from app.config.datastore import datastore
+from app.auth.token_cache import certificate_cache, token_cache, token_verifier
+from app.auth.identity import identity_client
+from app.levels.catalog import level_catalog
+from app.levels.payloads import level_payloads
+from app.game.autosave import state_buffer
+import logging
 # Cargar variables de entorno desde el archivo .env
 
 from dotenv import load_dotenv
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 #from app.config.firebase import firebase_app
 
+readiness.booted_at = BOOT_STARTED_AT
+
 
 app = FastAPI(title="DevQuest API", description="Backend API for DevQuest application", version= "1.0.0", docs_url="/api/docs", redoc_url=None, openapi_url="/api/openapi.json")
 
@@ -22,7 +45,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Authorization", "Content-Type"],
+    expose_headers=["X-Next-Cursor", "X-Profile-Id"],
 )
+app.add_middleware(FirstRequestMiddleware, readiness=readiness)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+# el ultimo middleware anadido es el mas externo: mide la peticion completa
+app.add_middleware(MetricsMiddleware)
 #registrar los routers de cada modulo de la aplicacion
 #app.include_router(auth_router, tags=["Authentication"])
 #app.include_router(levels_router, tags=["Levels"])
@@ -40,6 +69,88 @@ app.include_router(auth_router,     prefix="/api")
 app.include_router(levels_router,   prefix="/api")
 app.include_router(progress_router, prefix="/api")
 app.include_router(game_router,     prefix="/api")
+app.include_router(health_router,   prefix="/api")
+app.include_router(metrics_router,  prefix="/api")
+app.include_router(profiling_router, prefix="/api")
+instrument_routes(app)
+
+registry.gauge("auth_token_cache_hits_total", "Aciertos de la cache de tokens verificados.", lambda: token_cache.hits, kind="counter")
+registry.gauge("auth_token_cache_misses_total", "Fallos de la cache de tokens verificados.", lambda: token_cache.misses, kind="counter")
+registry.gauge("level_catalog_levels", "Niveles cargados en el catalogo en memoria.", lambda: level_catalog.size)
+registry.gauge("level_payload_cache_hits_total", "Respuestas de niveles servidas ya serializadas.", lambda: level_payloads.hits, kind="counter")
+registry.gauge("level_payload_cache_misses_total", "Respuestas de niveles que hubo que serializar.", lambda: level_payloads.misses, kind="counter")
+registry.gauge("level_state_buffer_pending", "Estados de nivel autoguardados pendientes de escribir.", lambda: state_buffer.pending)
+
+
+@app.on_event("startup")
+async def initialize_backend():
+    """
+    Inicializa el backend (credenciales, SDK y cliente de Firestore) antes que
+    nada; si falla, la app no llega a arrancar.
+    """
+    readiness.mark_elapsed("import_seconds")
+    seconds = await asyncio.get_running_loop().run_in_executor(None, backend.initialize)
+    readiness.mark("backend_init_seconds", seconds)
+
+
+@app.on_event("startup")
+async def start_identity_client():
+    """Abre el pool de conexiones HTTP hacia Identity Toolkit."""
+    await identity_client.start()
+
+
+@app.on_event("startup")
+async def start_certificate_refresh():
+    """Descarga los certificados de firma de los ID tokens antes de atender peticiones y los mantiene actualizados."""
+    start = time.perf_counter()
+    if not await certificate_cache.warm():
+        # se reintenta en segundo plano; mientras tanto el worker no esta listo
+        logger.warning("No se pudieron precargar los certificados de firma")
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, lambda: token_verifier.project_id)
+    except Exception as e:
+        logger.warning(f"No se pudo obtener el id del proyecto: {e}")
+    readiness.mark("auth_warmup_seconds", time.perf_counter() - start)
+    certificate_cache.start()
+
+
+@app.on_event("startup")
+async def load_level_catalog():
+    """Carga el catalogo de niveles en memoria y se suscribe a sus cambios."""
+    start = time.perf_counter()
+    try:
+        await level_catalog.load()
+    except Exception as e:
+        # se reintentara en la primera lectura (o en /api/health/ready)
+        logger.warning(f"No se pudo precargar el catalogo de niveles: {e}")
+    level_catalog.start_listener()
+    readiness.mark("catalog_warmup_seconds", time.perf_counter() - start)
+
+
+@app.on_event("startup")
+async def start_state_autosave():
+    """Arranca la escritura periodica de los estados de nivel autoguardados."""
+    state_buffer.start()
+
+
+@app.on_event("startup")
+async def mark_ready():
+    """Ultimo paso del arranque: a partir de aqui /api/health/ready puede responder 200."""
+    readiness.mark_ready()
+
+
+@app.on_event("shutdown")
+async def shutdown_resources():
+    """Detiene tareas en segundo plano y libera conexiones y el pool de hilos de Firestore."""
+    readiness.mark_stopping()
+    level_catalog.stop_listener()
+    # escribe los estados pendientes antes de liberar el pool de hilos
+    await state_buffer.stop()
+    await certificate_cache.stop()
+    await identity_client.close()
+    datastore.shutdown()
+
+
 @app.get("/api",  include_in_schema=False)
 @app.get("/api/", include_in_schema=False)
 def read_root():
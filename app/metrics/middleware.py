@@ -0,0 +1,107 @@
+import asyncio
+import functools
+import os
+import time
+from typing import Any, Callable, Dict
+
+from fastapi.routing import APIRoute
+
+from .registry import RequestMetrics, current_request, flush_request
+
+# anade la cabecera Server-Timing (auth, firestore, serializacion, total) a cada respuesta
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "false").lower() in ("1", "true", "yes")
+# etiqueta de las peticiones que no coinciden con ninguna ruta (404), para no crear una serie por URL
+UNMATCHED_ROUTE = "unmatched"
+
+
+def _timed_endpoint(call: Callable) -> Callable:
+    # marca cuando termina el endpoint: lo que pasa desde ahi hasta enviar la respuesta es serializacion
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                request = current_request.get()
+                if request is not None:
+                    request.endpoint_finished_at = time.perf_counter()
+    else:
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            try:
+                return call(*args, **kwargs)
+            finally:
+                request = current_request.get()
+                if request is not None:
+                    request.endpoint_finished_at = time.perf_counter()
+    endpoint._metrics_timed = True
+    return endpoint
+
+
+def instrument_routes(app):
+    """Envuelve los endpoints de la app para medir el tiempo de serializacion."""
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not getattr(route.dependant.call, "_metrics_timed", False):
+            route.dependant.call = _timed_endpoint(route.dependant.call)
+
+
+def server_timing(request: RequestMetrics, now: float) -> str:
+    """Valor de la cabecera Server-Timing de una peticion (duraciones en ms)."""
+    parts = []
+    if "auth" in request.timings:
+        parts.append(f"auth;dur={request.timings['auth'] * 1000:.2f}")
+    if request.firestore_calls:
+        parts.append(f'firestore;dur={request.timings.get("firestore", 0.0) * 1000:.2f};desc="{request.firestore_calls} llamadas"')
+    if request.endpoint_finished_at is not None:
+        parts.append(f"serialization;dur={(now - request.endpoint_finished_at) * 1000:.2f}")
+    parts.append(f"total;dur={(now - request.started_at) * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada peticion HTTP por plantilla de ruta (p. ej.
+    /api/levels/{level_id}), vuelca las operaciones de Firestore que ha hecho y,
+    si SERVER_TIMING_ENABLED, anade la cabecera Server-Timing.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: Dict[Any, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        template = self._templates.get(endpoint)
+        if template is None:
+            # las rutas no cambian tras el arranque: se construye el indice una vez
+            for route in scope["app"].routes:
+                self._templates.setdefault(getattr(route, "endpoint", None), getattr(route, "path", UNMATCHED_ROUTE))
+            template = self._templates.get(endpoint, UNMATCHED_ROUTE)
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = RequestMetrics()
+        token = current_request.set(request)
+        status = 500
+
+        async def send_with_metrics(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                request.response_started_at = time.perf_counter()
+                if SERVER_TIMING_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(request, request.response_started_at).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            current_request.reset(token)
+            flush_request(request, scope["method"], self._route(scope), status, time.perf_counter() - request.started_at)
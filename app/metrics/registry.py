@@ -0,0 +1,236 @@
+import bisect
+import threading
+import time
+from collections import Counter as CounterDict
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# prefijo de todas las metricas expuestas
+METRICS_NAMESPACE = "devquest"
+# limites (segundos) de los histogramas de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# etiqueta de ruta para el trabajo que no pertenece a ninguna peticion (autoguardado, listeners...)
+BACKGROUND_ROUTE = "background"
+
+Labels = Tuple[str, ...]
+
+
+def collection_label(path: str) -> str:
+    """
+    Etiqueta de una coleccion: las subcolecciones se agrupan sustituyendo los ids
+    de documento, p. ej. "level_stats/3/shards" -> "level_stats/{id}/shards".
+    """
+    if "/" not in path:
+        return path
+    segments = path.strip("/").split("/")
+    return "/".join(segment if index % 2 == 0 else "{id}" for index, segment in enumerate(segments))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Contador con etiquetas (tipo "counter" de Prometheus)."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}" for labels, value in items)
+        return lines
+
+
+class Histogram:
+    """Histograma con etiquetas y limites fijos (tipo "histogram" de Prometheus)."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # por etiquetas: (observaciones por cubeta, suma, total)
+        self._values: Dict[Labels, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Labels, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, labels: Labels) -> int:
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(entry[0]), entry[1], entry[2])) for labels, entry in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, observed in zip(self.buckets + (float("inf"),), counts):
+                cumulative += observed
+                bucket = _format_labels(self.labels, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """
+    Valor que se lee al exportar (tipo "gauge" de Prometheus, o "counter" si
+    read devuelve un total que acumula otro componente).
+    """
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", f"{self.name} {_format_value(self.read())}"]
+
+
+class MetricsRegistry:
+    """Metricas del proceso, exportadas en el formato de texto de Prometheus."""
+
+    def __init__(self, namespace: str = METRICS_NAMESPACE):
+        self.namespace = namespace
+        self._metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f"{self.namespace}_{name}", documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(f"{self.namespace}_{name}", documentation, labels, buckets))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float], kind: str = "gauge") -> Gauge:
+        return self._register(Gauge(f"{self.namespace}_{name}", documentation, read, kind))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # una metrica que no se puede leer no debe romper el resto
+                continue
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """
+    Lo que cuesta una peticion: operaciones de Firestore por coleccion y tiempo
+    en cada fase (auth, firestore...). Se acumula durante la peticion y se vuelca
+    en las metricas del proceso al terminar, cuando ya se conoce la ruta.
+    """
+
+    __slots__ = ("started_at", "operations", "timings", "firestore_calls", "endpoint_finished_at", "response_started_at")
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.operations: CounterDict = CounterDict()
+        self.timings: Dict[str, float] = {}
+        self.firestore_calls = 0
+        self.endpoint_finished_at: Optional[float] = None
+        self.response_started_at: Optional[float] = None
+
+    def add_time(self, phase: str, seconds: float):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+
+current_request: ContextVar[Optional[RequestMetrics]] = ContextVar("current_request_metrics", default=None)
+
+registry = MetricsRegistry()
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "Duracion de las peticiones HTTP por ruta.",
+    ("method", "route", "status"),
+)
+firestore_operations = registry.counter(
+    "firestore_operations_total",
+    "Operaciones de Firestore por ruta y coleccion (read, write, query, round_trip).",
+    ("route", "collection", "operation"),
+)
+firestore_call_duration = registry.histogram(
+    "firestore_call_duration_seconds",
+    "Duracion de cada llamada a Firestore, incluida la espera por el limite de concurrencia.",
+    ("collection",),
+)
+
+
+def record_firestore_operation(collection: str, operation: str, amount: int = 1):
+    """Anota operaciones de Firestore en la peticion actual (o como trabajo en segundo plano)."""
+    if amount <= 0:
+        return
+    label = collection_label(collection)
+    request = current_request.get()
+    if request is None:
+        firestore_operations.inc((BACKGROUND_ROUTE, label, operation), amount)
+    else:
+        request.operations[(label, operation)] += amount
+
+
+def record_firestore_call(collection: str, seconds: float):
+    """Anota una llamada (ida y vuelta) a Firestore y lo que ha tardado."""
+    label = collection_label(collection)
+    firestore_call_duration.observe((label,), seconds)
+    request = current_request.get()
+    if request is None:
+        firestore_operations.inc((BACKGROUND_ROUTE, label, "round_trip"))
+        return
+    request.operations[(label, "round_trip")] += 1
+    request.firestore_calls += 1
+    request.add_time("firestore", seconds)
+
+
+def record_time(phase: str, seconds: float):
+    """Suma tiempo a una fase (p. ej. "auth") de la peticion actual."""
+    request = current_request.get()
+    if request is not None:
+        request.add_time(phase, seconds)
+
+
+def flush_request(request: RequestMetrics, method: str, route: str, status: int, duration: float):
+    """Vuelca en las metricas del proceso lo acumulado por una peticion."""
+    http_request_duration.observe((method, route, str(status)), duration)
+    for (collection, operation), amount in request.operations.items():
+        firestore_operations.inc((route, collection, operation), amount)
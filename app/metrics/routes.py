@@ -0,0 +1,39 @@
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from .registry import registry
+
+# /api/metrics exige "Authorization: Bearer <METRICS_TOKEN>"; sin METRICS_TOKEN
+# configurado el endpoint queda cerrado
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+PROMETHEUS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, summary="Métricas en formato Prometheus")
+async def metrics(authorization: Optional[str] = Header(None)):
+    """
+    Expone las métricas del proceso en el formato de texto de Prometheus:
+    latencia por ruta, operaciones de Firestore por ruta y colección y
+    estado de las cachés.
+    Raises:
+        HTTPException 403: Si METRICS_TOKEN no está configurado.
+        HTTPException 401: Si el token no coincide con METRICS_TOKEN.
+    """
+    if not METRICS_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Métricas deshabilitadas",
+        )
+    if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de métricas no válido",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return PlainTextResponse(registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
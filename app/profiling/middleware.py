@@ -0,0 +1,105 @@
+import logging
+import os
+import sys
+import time
+from typing import Optional
+from urllib.parse import parse_qs
+
+from app.auth.dependencies import UserContext, bearer_token
+from app.auth.service import AuthService
+from .profiler import PROFILE_MODES, SAMPLE, TRACE, Profile, ProfileStore, SamplingProfiler, TracingProfiler, profile_store
+
+logger = logging.getLogger(__name__)
+
+# si es false no se instala el middleware y los flags de perfilado se ignoran
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() in ("1", "true", "yes")
+# "X-Profile: sample|trace" o "?profile=sample|trace" (cualquier otro valor verdadero equivale a sample)
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = "profile"
+# cabecera de la respuesta con el id del perfil capturado
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+def _mode(value: str) -> Optional[str]:
+    value = value.strip().lower()
+    if value in PROFILE_MODES:
+        return value
+    return SAMPLE if value in ("1", "true", "yes") else None
+
+
+def requested_mode(scope) -> Optional[str]:
+    """Modo de perfilado que pide la peticion, o None si no lleva el flag."""
+    for name, value in scope["headers"]:
+        if name == PROFILE_HEADER:
+            return _mode(value.decode("latin-1"))
+    query_string = scope.get("query_string", b"")
+    if b"profile=" in query_string:
+        values = parse_qs(query_string.decode("latin-1")).get(PROFILE_QUERY)
+        if values:
+            return _mode(values[0])
+    return None
+
+
+async def _admin_user(scope) -> Optional[UserContext]:
+    # solo se perfilan las peticiones de administradores; si el token no es valido
+    # la peticion sigue sin perfil y el endpoint respondera 401 si lo exige
+    authorization = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"authorization"), None)
+    try:
+        user = UserContext(await AuthService.verify_token(bearer_token(authorization)))
+    except Exception:
+        return None
+    if user.role != "admin":
+        return None
+    # get_current_user reutiliza el usuario ya verificado
+    scope.setdefault("state", {})["user"] = user
+    return user
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que captura, bajo demanda, el perfil de una peticion de un
+    administrador marcada con la cabecera X-Profile o el parametro ?profile=.
+    Las peticiones sin el flag solo pagan la busqueda de la cabecera; el
+    perfilador no se instala.
+    """
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = requested_mode(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+        user = await _admin_user(scope)
+        if user is None:
+            await self.app(scope, receive, send)
+            return
+        await self._profiled(mode, user, scope, receive, send)
+
+    async def _profiled(self, mode: str, user: UserContext, scope, receive, send):
+        # el frame de esta corrutina es la raiz de las pilas del perfil
+        root = sys._getframe()
+        profiler = TracingProfiler(root) if mode == TRACE else SamplingProfiler(root)
+        profile = Profile(mode, profiler.unit, scope["method"], scope["path"], user.uid)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile.id.encode("latin-1"))]}
+            await send(message)
+
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            profile.duration = time.perf_counter() - start
+            profile.stacks = profiler.stacks
+            self.store.add(profile)
+            logger.info(f"Perfil {profile.id} ({mode}) de {profile.method} {profile.path}: {profile.duration * 1000:.1f} ms")
@@ -0,0 +1,234 @@
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# perfiles que se guardan; al llegar al limite se descarta el mas antiguo
+PROFILE_RETENTION = int(os.getenv("PROFILE_RETENTION", "20"))
+# intervalo entre muestras del perfil por muestreo
+PROFILE_SAMPLE_INTERVAL_SECONDS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1")) / 1000
+# un perfil deja de tomar datos pasado este tiempo, aunque la peticion siga en curso
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))
+# muestras tomadas mientras la peticion no se esta ejecutando (esperando a Firestore o a otras tareas)
+WAITING_FRAME = "[esperando]"
+
+SAMPLE = "sample"
+TRACE = "trace"
+PROFILE_MODES = (SAMPLE, TRACE)
+
+
+def _frame_label(code) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}:{code.co_firstlineno}"
+
+
+def _builtin_label(function) -> str:
+    module = getattr(function, "__module__", None) or "builtins"
+    return f"{module}.{getattr(function, '__qualname__', repr(function))}"
+
+
+class SamplingProfiler:
+    """
+    Perfil por muestreo de una peticion: un hilo toma cada
+    PROFILE_SAMPLE_INTERVAL_SECONDS la pila del hilo del event loop y la cuenta
+    solo si contiene el frame raiz de la peticion; si no, la peticion esta
+    esperando. Los valores del perfil son numero de muestras.
+    """
+
+    unit = "samples"
+
+    def __init__(self, root_frame, interval: float = PROFILE_SAMPLE_INTERVAL_SECONDS):
+        self.stacks: Counter = Counter()
+        self.interval = interval
+        self._root = root_frame
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._root = None
+
+    def _run(self):
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            self._sample()
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._thread_id)
+        stack = []
+        while frame is not None and frame is not self._root:
+            stack.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if self._stop.is_set():
+            # la pila puede ser la del propio stop()
+            return
+        if frame is None:
+            self.stacks[WAITING_FRAME] += 1
+        elif stack:
+            self.stacks[";".join(reversed(stack))] += 1
+
+
+# perfil determinista activo en la tarea actual; el hook de sys.setprofile lo consulta en cada evento
+_active_tracer: ContextVar[Optional["TracingProfiler"]] = ContextVar("active_tracer", default=None)
+_tracers_lock = threading.Lock()
+_tracers_running = 0
+
+
+def _profile_hook(frame, event, arg):
+    tracer = _active_tracer.get()
+    if tracer is not None:
+        tracer.event(frame, event, arg)
+
+
+class TracingProfiler:
+    """
+    Perfil determinista de una peticion con sys.setprofile: registra cada
+    llamada (tambien a funciones en C) y acumula el tiempo propio de cada pila
+    en microsegundos. Es mucho mas costoso que el muestreo y, mientras esta
+    activo, el hook se ejecuta tambien para el resto de tareas del event loop
+    (que lo descartan enseguida).
+
+    Solo se mide el hilo del event loop: el trabajo que se manda al pool de
+    hilos (llamadas a Firestore) aparece como tiempo propio de quien lo espera.
+    """
+
+    unit = "microseconds"
+
+    def __init__(self, root_frame):
+        self.stacks: Counter = Counter()
+        self._root = root_frame
+        # pila de llamadas en curso: [etiqueta, inicio, tiempo en llamadas hijas, frame, es funcion en C]
+        self._calls: List[list] = []
+        self._labels: List[str] = []
+        self._token = None
+        self._deadline = 0.0
+
+    def start(self):
+        global _tracers_running
+        self._deadline = time.perf_counter() + PROFILE_MAX_SECONDS
+        # el frame raiz ya se esta ejecutando: se apila a mano
+        self._push(_frame_label(self._root.f_code), self._root, False, time.perf_counter())
+        self._token = _active_tracer.set(self)
+        with _tracers_lock:
+            _tracers_running += 1
+            if _tracers_running == 1:
+                sys.setprofile(_profile_hook)
+
+    def stop(self):
+        global _tracers_running
+        _active_tracer.reset(self._token)
+        with _tracers_lock:
+            _tracers_running -= 1
+            if _tracers_running == 0:
+                sys.setprofile(None)
+        self._root = None
+        self._calls.clear()
+        self._labels.clear()
+
+    def _push(self, label: str, frame, builtin: bool, now: float):
+        self._calls.append([label, now, 0.0, frame, builtin])
+        self._labels.append(label)
+
+    def event(self, frame, event, arg):
+        now = time.perf_counter()
+        if event == "call" or event == "c_call":
+            if not self._calls:
+                # solo se mide a partir del frame raiz (al reanudarse una corrutina
+                # tambien se "llaman" los frames que la esperan)
+                if event == "c_call" or frame is not self._root or now > self._deadline:
+                    return
+            if event == "call":
+                self._push(_frame_label(frame.f_code), frame, False, now)
+            else:
+                self._push(_builtin_label(arg), frame, True, now)
+            return
+        if not self._calls:
+            return
+        # return, c_return o c_exception: se ignoran los de frames que no se apilaron
+        # (p. ej. el retorno del propio start())
+        entry = self._calls[-1]
+        if entry[3] is not frame or entry[4] != (event != "return"):
+            return
+        self._calls.pop()
+        elapsed = now - entry[1]
+        self.stacks[";".join(self._labels)] += max(int((elapsed - entry[2]) * 1_000_000), 0)
+        self._labels.pop()
+        if self._calls:
+            self._calls[-1][2] += elapsed
+
+
+class Profile:
+    """Perfil de una peticion ya terminada, en formato de pilas colapsadas."""
+
+    __slots__ = ("id", "mode", "unit", "method", "path", "status", "uid", "created_at", "duration", "stacks")
+
+    def __init__(self, mode: str, unit: str, method: str, path: str, uid: str):
+        self.id = secrets.token_hex(8)
+        self.mode = mode
+        self.unit = unit
+        self.method = method
+        self.path = path
+        self.uid = uid
+        self.status = 500
+        self.created_at = time.time()
+        self.duration = 0.0
+        self.stacks: Counter = Counter()
+
+    def collapsed(self) -> str:
+        """Una linea "frame;frame;... valor" por pila (entrada de flamegraph.pl o speedscope)."""
+        return "".join(f"{stack} {value}\n" for stack, value in sorted(self.stacks.items()) if value > 0)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "unit": self.unit,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "uid": self.uid,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration * 1000, 2),
+            "stacks": len(self.stacks),
+            "total": sum(self.stacks.values()),
+        }
+
+
+class ProfileStore:
+    """Ultimos perfiles capturados, en un buffer circular de tamano fijo."""
+
+    def __init__(self, retention: int = PROFILE_RETENTION):
+        self._profiles: deque = deque(maxlen=retention)
+        self._lock = threading.Lock()
+
+    def add(self, profile: Profile):
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[Profile]:
+        """Perfiles guardados, del mas reciente al mas antiguo."""
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        with self._lock:
+            return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+
+
+profile_store = ProfileStore()
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.auth.dependencies import UserContext, get_current_user
+from .profiler import profile_store
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+
+def _require_admin(user: UserContext):
+    if user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Solo los administradores pueden ver los perfiles"
+        )
+
+
+@router.get("/", summary="Listar los perfiles capturados")
+async def list_profiles(user: UserContext = Depends(get_current_user)):
+    """
+    Lista los últimos perfiles capturados con X-Profile o ?profile=, del más
+    reciente al más antiguo. Solo se guardan los PROFILE_RETENTION últimos.
+    Raises:
+        HTTPException 401: Token no proporcionado o inválido.
+        HTTPException 403: Si el usuario no es administrador.
+    Returns:
+        list: Id, modo, unidad, ruta, estado, duración y tamaño de cada perfil.
+    """
+    _require_admin(user)
+    return [profile.summary() for profile in profile_store.list()]
+
+
+@router.get("/{profile_id}", response_class=PlainTextResponse, summary="Descargar un perfil en pilas colapsadas")
+async def download_profile(profile_id: str, user: UserContext = Depends(get_current_user)):
+    """
+    Descarga un perfil en formato de pilas colapsadas ("frame;frame;... valor"
+    por línea), listo para flamegraph.pl o speedscope. El valor es el número
+    de muestras (modo sample) o microsegundos de tiempo propio (modo trace).
+    Raises:
+        HTTPException 401: Token no proporcionado o inválido.
+        HTTPException 403: Si el usuario no es administrador.
+        HTTPException 404: Si el perfil no existe o ya se ha descartado.
+    """
+    _require_admin(user)
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Perfil no encontrado"
+        )
+    return PlainTextResponse(
+        profile.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.collapsed"'},
+    )
@@ -0,0 +1,137 @@
+"""
+Registro de intentos (correctos o no), solo de escritura y particionado por dia:
+
+    attempt_log/{YYYY-MM-DD}/attempts/{id}
+
+Los intentos correctos se escriben en el mismo commit que su progreso; los
+fallidos, junto con el contador de intentos de las estadisticas del nivel y el de
+fallos del resumen. El registro de progress (la mejor marca) no se toca al fallar.
+
+La compactacion (app.progress.compact_attempts) pasa los fallos de los dias
+antiguos a un contador por usuario y nivel (attempt_failures/{uid}_{level_id},
+tambien para los niveles sin completar) y borra esos dias, de modo que la
+coleccion solo guarda los ultimos ATTEMPT_LOG_RETENTION_DAYS. Los fallos de un
+usuario o de un nivel son siempre los contadores mas lo que siga en el registro
+(user_failures, level_failures), que es lo que usan las reconstrucciones.
+"""
+import logging
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from firebase_admin import firestore
+
+from app.config.datastore import datastore
+from app.game import statistics
+from .records import SideWrite, progress_doc_id
+from .summary import SUMMARY_COLLECTION, failures_update, normalize_level_id
+
+logger = logging.getLogger(__name__)
+
+ATTEMPT_LOG_COLLECTION = "attempt_log"
+ATTEMPTS_SUBCOLLECTION = "attempts"
+# fallos ya compactados, uno por usuario y nivel
+FAILURES_COLLECTION = "attempt_failures"
+# si es false no se escribe el registro (los fallos siguen contando en las estadisticas)
+ATTEMPT_LOG_ENABLED = os.getenv("ATTEMPT_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+# dias completos que se conservan antes de compactar
+ATTEMPT_LOG_RETENTION_DAYS = int(os.getenv("ATTEMPT_LOG_RETENTION_DAYS", "30"))
+
+
+def partition_id(when: datetime) -> str:
+    """Particion (dia UTC) de un intento."""
+    return when.strftime("%Y-%m-%d")
+
+
+def partition_path(day: str) -> str:
+    return f"{ATTEMPT_LOG_COLLECTION}/{day}/{ATTEMPTS_SUBCOLLECTION}"
+
+
+def attempt_writes(uid: str, level_id: int, kind: str, correct: bool, stars: int, now: datetime, score: Optional[int] = None) -> List[SideWrite]:
+    """
+    Escritura de un intento en el registro, para añadir al commit del progreso.
+    Args:
+        kind (str): "commands", "potions" o "score" (POST /progress).
+    Returns:
+        List[SideWrite]: La escritura del intento (vacia si el registro esta desactivado).
+    """
+    if not ATTEMPT_LOG_ENABLED:
+        return []
+    entry: Dict[str, Any] = {
+        "user_id": uid,
+        "level_id": level_id,
+        "kind": kind,
+        "correct": correct,
+        "stars": stars,
+        "at": now,
+    }
+    if score is not None:
+        entry["score"] = score
+    # id generado en el cliente: el set(merge=True) sobre un id nuevo es una insercion
+    return [(partition_path(partition_id(now)), uuid.uuid4().hex, entry)]
+
+
+def failed_attempt_writes(uid: str, level_id: int, kind: str, stars: int, now: datetime) -> List[SideWrite]:
+    """
+    Escrituras de un intento fallido: su entrada en el registro, el intento en las
+    estadisticas del nivel y el fallo en el resumen del usuario.
+    """
+    return attempt_writes(uid, level_id, kind, False, stars, now) + [
+        statistics.attempt_write(level_id),
+        (SUMMARY_COLLECTION, uid, failures_update({level_id: 1})),
+    ]
+
+
+def failures_write(uid: str, level_id: int, count: int) -> SideWrite:
+    """Escritura que suma fallos compactados al contador de (usuario, nivel), con Increment."""
+    return (FAILURES_COLLECTION, progress_doc_id(uid, level_id), {
+        "user_id": uid,
+        "level_id": level_id,
+        "failed_attempts": firestore.Increment(count),
+    })
+
+
+async def user_failures(uid: str) -> Dict[int, int]:
+    """
+    Intentos fallidos de un usuario por nivel: los contadores compactados mas las
+    entradas que siguen en el registro (consulta de collection group sobre attempts).
+    """
+    failed: Dict[int, int] = defaultdict(int)
+    async for doc in datastore.stream(FAILURES_COLLECTION, [("user_id", "==", uid)]):
+        data = doc.to_dict()
+        level_id = normalize_level_id(data.get("level_id"))
+        if level_id is not None:
+            failed[level_id] += data.get("failed_attempts") or 0
+    async for doc in datastore.stream(ATTEMPTS_SUBCOLLECTION, [("user_id", "==", uid)], group=True):
+        data = doc.to_dict()
+        level_id = normalize_level_id(data.get("level_id"))
+        if not data.get("correct") and level_id is not None:
+            failed[level_id] += 1
+    return {level_id: count for level_id, count in failed.items() if count}
+
+
+async def level_failures(level_id: int) -> int:
+    """Intentos fallidos de todos los usuarios en un nivel: contadores compactados mas registro."""
+    failed = 0
+    async for doc in datastore.stream(FAILURES_COLLECTION, [("level_id", "==", level_id)]):
+        failed += doc.to_dict().get("failed_attempts") or 0
+    async for doc in datastore.stream(ATTEMPTS_SUBCOLLECTION, [("level_id", "==", level_id)], group=True):
+        if not doc.to_dict().get("correct"):
+            failed += 1
+    return failed
+
+
+async def record_failed_attempt(uid: str, level_id: int, kind: str, stars: int = 0, now: Optional[datetime] = None):
+    """
+    Guarda un intento fallido en un unico commit. Un error se registra en el log
+    pero no se propaga: no debe hacer fallar la respuesta al jugador.
+    """
+    batch = datastore.batch()
+    for collection, doc_id, data in failed_attempt_writes(uid, level_id, kind, stars, now or datetime.utcnow()):
+        batch.set(collection, doc_id, data, merge=True)
+    try:
+        await batch.commit(ATTEMPT_LOG_COLLECTION)
+    except Exception as e:
+        logger.error(f"Error guardando el intento fallido de {uid} en el nivel {level_id}: {str(e)}")
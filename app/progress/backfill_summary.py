@@ -0,0 +1,67 @@
+"""
+Construye el resumen de progreso (progress_summaries/{uid}) de los usuarios existentes
+a partir de su progreso, y con el los bitsets de niveles completados y estrellas de
+su documento (app.progress.level_state).
+
+Uso:
+    python -m app.progress.backfill_summary            # todos los usuarios
+    python -m app.progress.backfill_summary --uid UID  # un usuario concreto
+"""
+import argparse
+import asyncio
+import logging
+
+from app.config.datastore import datastore
+from app.progress.service import ProgressService
+
+logger = logging.getLogger(__name__)
+
+
+async def _user_ids(chunk_size: int):
+    """Recorre los ids de la coleccion users por bloques, ordenados por id de documento."""
+    last = None
+    while True:
+        def fetch_chunk(last=last):
+            query = datastore.collection("users").order_by("__name__").limit(chunk_size)
+            if last is not None:
+                query = query.start_after(last)
+            return query.get()
+
+        docs = await datastore.run("users", fetch_chunk)
+        if not docs:
+            return
+        yield [doc.id for doc in docs]
+        if len(docs) < chunk_size:
+            return
+        last = docs[-1]
+
+
+async def backfill(uid: str = None, chunk_size: int = 100) -> int:
+    """
+    Reconstruye los resumenes de progreso.
+    Args:
+        uid (str, optional): Si se indica, solo se reconstruye el de ese usuario.
+        chunk_size (int): Usuarios que se procesan en cada bloque.
+    Returns:
+        int: Numero de resumenes reconstruidos.
+    """
+    if uid:
+        await ProgressService.rebuild_summary(uid)
+        return 1
+
+    total = 0
+    async for user_ids in _user_ids(chunk_size):
+        await asyncio.gather(*(ProgressService.rebuild_summary(user_id) for user_id in user_ids))
+        total += len(user_ids)
+        logger.info(f"Resumenes reconstruidos: {total}")
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uid", help="reconstruir solo este usuario")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    args = parser.parse_args()
+    count = asyncio.run(backfill(args.uid, args.chunk_size))
+    print(f"Resumenes de progreso reconstruidos: {count}")
+    datastore.shutdown()
@@ -0,0 +1,123 @@
+"""
+Compacta el registro de intentos (attempt_log/{dia}/attempts, ver app.progress.attempts)
+y aplica la retencion: los dias anteriores a los ultimos --retention-days se
+pasan a contadores y se borran.
+
+Los intentos correctos ya estan contados en el registro de progress, asi que
+solo se borran. Los fallidos se suman, con Increment, al contador de su usuario
+y nivel (attempt_failures/{uid}_{level_id}), exista o no registro de progress.
+El resumen y las estadisticas ya los contaron al escribirse, asi que no cambian.
+Cada bloque se suma y se borra en un unico commit: los totales (contadores mas
+registro) no varian y el proceso se puede interrumpir y volver a lanzar sin
+contar nada dos veces. El ultimo dia compactado se guarda en
+attempt_log_state/compaction y la siguiente ejecucion continua desde el.
+Pensado para ejecutarse una vez al dia.
+
+Uso:
+    python -m app.progress.compact_attempts                        # retencion por defecto
+    python -m app.progress.compact_attempts --retention-days 7
+    python -m app.progress.compact_attempts --since 2024-01-01     # revisar desde ese dia
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config.datastore import datastore
+from app.progress.attempts import ATTEMPT_LOG_COLLECTION, ATTEMPT_LOG_RETENTION_DAYS, failures_write, partition_path
+from app.progress.summary import normalize_level_id
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "attempt_log_state"
+STATE_DOC = "compaction"
+# sin ejecuciones anteriores ni --since, dias hacia atras que se revisan
+FIRST_RUN_LOOKBACK_DAYS = 365
+# cada intento supone como mucho un borrado y un contador
+MAX_CHUNK_SIZE = 250
+
+
+async def compact_chunk(day: str, docs: List[Any]) -> int:
+    """
+    Suma a los contadores de (usuario, nivel) los fallos de un bloque de intentos
+    de un dia y los borra, todo en un commit.
+    Returns:
+        int: Intentos fallidos sumados.
+    """
+    failed: Dict[Tuple[str, int], int] = defaultdict(int)
+    for doc in docs:
+        data = doc.to_dict()
+        level_id = normalize_level_id(data.get("level_id"))
+        if not data.get("correct") and data.get("user_id") and level_id is not None:
+            failed[(data["user_id"], level_id)] += 1
+
+    batch = datastore.batch()
+    for (uid, level_id), count in failed.items():
+        batch.set(*failures_write(uid, level_id, count), merge=True)
+    for doc in docs:
+        batch.delete(partition_path(day), doc.id)
+    await batch.commit(ATTEMPT_LOG_COLLECTION)
+    return sum(failed.values())
+
+
+async def compact_day(day: str, chunk_size: int) -> Dict[str, int]:
+    """Compacta y vacia la particion de un dia."""
+    totals = {"attempts": 0, "failed": 0}
+    while True:
+        def fetch_chunk():
+            return datastore.collection(partition_path(day)).order_by("__name__").limit(chunk_size).get()
+
+        # lo ya compactado se borra, asi que siempre se lee desde el principio
+        docs = await datastore.run(ATTEMPT_LOG_COLLECTION, fetch_chunk)
+        if not docs:
+            return totals
+        totals["failed"] += await compact_chunk(day, docs)
+        totals["attempts"] += len(docs)
+        if len(docs) < chunk_size:
+            return totals
+
+
+async def compact(retention_days: int = ATTEMPT_LOG_RETENTION_DAYS, since: Optional[date] = None, chunk_size: int = 100, today: Optional[date] = None) -> Dict[str, int]:
+    """
+    Compacta los dias anteriores a la ventana de retencion (el dia en curso nunca).
+    Args:
+        retention_days (int): Dias completos que se conservan, ademas del actual.
+        since (date, optional): Primer dia a revisar; por defecto el siguiente al
+            ultimo compactado.
+        chunk_size (int): Intentos por commit (maximo MAX_CHUNK_SIZE).
+        today (date, optional): Dia actual (UTC).
+    Returns:
+        dict: Dias revisados, intentos borrados y fallos sumados.
+    """
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=max(retention_days, 0))
+    if since is None:
+        state = await datastore.get(STATE_COLLECTION, STATE_DOC)
+        last = (state.to_dict() or {}).get("compacted_through") if state.exists else None
+        since = date.fromisoformat(last) + timedelta(days=1) if last else cutoff - timedelta(days=FIRST_RUN_LOOKBACK_DAYS)
+
+    totals = {"days": 0, "attempts": 0, "failed": 0}
+    day = since
+    while day < cutoff:
+        result = await compact_day(day.isoformat(), chunk_size)
+        await datastore.set(STATE_COLLECTION, STATE_DOC, {"compacted_through": day.isoformat(), "updated_at": datetime.utcnow()})
+        totals["days"] += 1
+        for name, value in result.items():
+            totals[name] += value
+        if result["attempts"]:
+            logger.info(f"Intentos del {day.isoformat()} compactados: {result}")
+        day += timedelta(days=1)
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--retention-days", type=int, default=ATTEMPT_LOG_RETENTION_DAYS)
+    parser.add_argument("--since", type=date.fromisoformat, help="primer dia a revisar (YYYY-MM-DD)")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    args = parser.parse_args()
+    totals = asyncio.run(compact(args.retention_days, args.since, args.chunk_size))
+    print(f"Dias revisados: {totals['days']}, intentos borrados: {totals['attempts']}, fallos sumados: {totals['failed']}")
+    datastore.shutdown()
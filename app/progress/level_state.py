@@ -0,0 +1,131 @@
+"""
+Estado de niveles de cada usuario guardado en su propio documento (users/{uid}):
+
+    completed_bits: bitset de niveles completados (bit n = nivel n)
+    unlocked_bits: bitset de niveles desbloqueados
+    best_stars: un byte por nivel con sus mejores estrellas (posicion n = nivel n)
+
+Se actualiza en la misma escritura que el progreso, asi que login y GET /levels
+lo tienen con la lectura del usuario, sin leer el progreso ni el resumen.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+COMPLETED_BITS = "completed_bits"
+UNLOCKED_BITS = "unlocked_bits"
+BEST_STARS = "best_stars"
+
+
+class LevelBitset:
+    """Conjunto de ids de nivel como bitset: pertenencia y alta en O(1)."""
+
+    __slots__ = ("_bits",)
+
+    def __init__(self, data: Optional[bytes] = None):
+        self._bits = bytearray(data or b"")
+
+    @classmethod
+    def from_levels(cls, level_ids: Iterable[int]) -> "LevelBitset":
+        bitset = cls()
+        for level_id in level_ids:
+            bitset.add(level_id)
+        return bitset
+
+    def __contains__(self, level_id: Any) -> bool:
+        if not isinstance(level_id, int) or level_id < 0:
+            return False
+        index = level_id >> 3
+        return index < len(self._bits) and bool(self._bits[index] & (1 << (level_id & 7)))
+
+    def add(self, level_id: int) -> bool:
+        """Añade un nivel. Devuelve True si no estaba."""
+        if level_id < 0:
+            raise ValueError(f"level_id no valido: {level_id}")
+        if level_id in self:
+            return False
+        index = level_id >> 3
+        if index >= len(self._bits):
+            self._bits.extend(bytes(index + 1 - len(self._bits)))
+        self._bits[index] |= 1 << (level_id & 7)
+        return True
+
+    def __iter__(self) -> Iterator[int]:
+        for index, byte in enumerate(self._bits):
+            while byte:
+                low = byte & -byte
+                yield (index << 3) + low.bit_length() - 1
+                byte ^= low
+
+    def __len__(self) -> int:
+        return sum(bin(byte).count("1") for byte in self._bits)
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+
+class LevelState:
+    """
+    Estado de niveles de un usuario leido de su documento. record() y unlock()
+    lo modifican en memoria y update() devuelve los campos cambiados para un
+    set(merge=True) del documento.
+    """
+
+    def __init__(self, user_data: Optional[Dict[str, Any]] = None):
+        user_data = user_data or {}
+        # los usuarios anteriores a los bitsets no tienen completed_bits hasta que
+        # se inicializan desde su resumen (login o backfill_summary)
+        self.tracked = user_data.get(COMPLETED_BITS) is not None
+        self.completed = LevelBitset(user_data.get(COMPLETED_BITS))
+        unlocked = user_data.get(UNLOCKED_BITS)
+        self.unlocked = LevelBitset(unlocked) if unlocked is not None else LevelBitset.from_levels(user_data.get("unlocked_levels", []))
+        self._stars = bytearray(user_data.get(BEST_STARS) or b"")
+        self._changed = set()
+
+    def best_stars(self, level_id: int) -> int:
+        return self._stars[level_id] if 0 <= level_id < len(self._stars) else 0
+
+    def levels_completed(self) -> List[int]:
+        return list(self.completed)
+
+    def record(self, level_id: int, stars: int = 0):
+        """Registra un intento guardado: el nivel queda completado (como en el resumen) y se conserva la mejor marca."""
+        if not self.tracked:
+            # sin el estado inicial no se puede escribir un bitset completo
+            return
+        if self.completed.add(level_id):
+            self._changed.add(COMPLETED_BITS)
+        stars = min(max(stars or 0, 0), 255)
+        if stars > self.best_stars(level_id):
+            if level_id >= len(self._stars):
+                self._stars.extend(bytes(level_id + 1 - len(self._stars)))
+            self._stars[level_id] = stars
+            self._changed.add(BEST_STARS)
+
+    def merge_summary(self, summary: Dict[str, Any]):
+        """
+        Añade los niveles completados y las mejores estrellas del resumen de
+        progreso sin quitar nada de lo que ya haya (inicializa el estado de los
+        usuarios anteriores a los bitsets). Los desbloqueos no estan en el resumen.
+        """
+        if not self.tracked:
+            self.tracked = True
+            self._changed.add(COMPLETED_BITS)
+        for level_key, entry in summary.get("levels", {}).items():
+            self.record(int(level_key), entry.get("best_stars", 0))
+        for level_id in summary.get("completed_levels", []):
+            self.record(level_id)
+
+    def unlock(self, level_id: int):
+        if self.unlocked.add(level_id):
+            self._changed.add(UNLOCKED_BITS)
+
+    def fields(self) -> Dict[str, bytes]:
+        return {
+            COMPLETED_BITS: self.completed.to_bytes(),
+            UNLOCKED_BITS: self.unlocked.to_bytes(),
+            BEST_STARS: bytes(self._stars),
+        }
+
+    def update(self) -> Dict[str, bytes]:
+        """Campos modificados desde la lectura (vacio si no hay cambios)."""
+        fields = self.fields()
+        return {name: fields[name] for name in self._changed}
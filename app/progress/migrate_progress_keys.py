@@ -0,0 +1,124 @@
+"""
+Pasa los documentos de progress antiguos (id autogenerado y, en los niveles de
+pociones, level_id "level{n}") al documento de clave fija {uid}_{level_id}, con
+level_id entero. Si un usuario tiene varios registros del mismo nivel se fusionan:
+se queda la mejor marca, se suman los intentos y se conserva la primera fecha.
+
+Cada documento antiguo se fusiona y se borra en una transaccion, por lo que el
+proceso se puede interrumpir y volver a lanzar. Al terminar conviene reconstruir
+las estadisticas (python -m app.game.reconcile_statistics) y los resumenes
+(python -m app.progress.backfill_summary).
+
+Al pasar el progreso a users/{uid}/progress (app.progress.migrate_progress_subcollections)
+esta normalizacion se hace durante la copia, sin necesidad de ejecutar antes este proceso.
+
+Uso:
+    python -m app.progress.migrate_progress_keys              # toda la coleccion
+    python -m app.progress.migrate_progress_keys --dry-run    # solo cuenta
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.config.datastore import datastore
+from app.progress.records import PROGRESS_COLLECTION, progress_doc_id
+from app.progress.summary import normalize_level_id
+
+logger = logging.getLogger(__name__)
+
+
+def _rank(record: Dict[str, Any]):
+    return (record.get("stars") or 0, record.get("score") or 0)
+
+
+def merge_records(current: Optional[Dict[str, Any]], legacy: Dict[str, Any], level_id: int) -> Dict[str, Any]:
+    """
+    Fusiona un registro antiguo con el registro de clave fija (si ya existe).
+    La marca y sus campos se toman del mejor de los dos; los intentos se suman.
+    """
+    legacy = {**legacy, "level_id": level_id, "attempts": legacy.get("attempts") or 1}
+    if current is None:
+        return legacy
+    best, other = (legacy, current) if _rank(legacy) > _rank(current) else (current, legacy)
+    merged = {**other, **best, "level_id": level_id}
+    merged["attempts"] = (current.get("attempts") or 1) + legacy["attempts"]
+    start_dates = [date for date in (current.get("start_date"), legacy.get("start_date")) if date is not None]
+    if start_dates:
+        merged["start_date"] = min(start_dates)
+    return merged
+
+
+async def migrate_document(doc_id: str, data: Dict[str, Any], dry_run: bool = False) -> bool:
+    """
+    Migra un documento de progress si no esta ya en su clave fija.
+    Returns:
+        bool: True si el documento era antiguo (y se ha migrado salvo dry_run).
+    """
+    level_id = normalize_level_id(data.get("level_id"))
+    uid = data.get("user_id")
+    if level_id is None or not uid:
+        logger.warning(f"Documento de progress {doc_id} sin user_id o level_id validos; se deja como esta")
+        return False
+    target_id = progress_doc_id(uid, level_id)
+    if doc_id == target_id and data.get("level_id") == level_id:
+        return False
+    if dry_run:
+        return True
+
+    collection = datastore.collection(PROGRESS_COLLECTION)
+    legacy_ref, target_ref = collection.document(doc_id), collection.document(target_id)
+
+    def migrate(transaction):
+        legacy = transaction.get(legacy_ref)
+        if not legacy.exists:
+            # ya migrado por una ejecucion anterior
+            return
+        if doc_id == target_id:
+            # solo hay que normalizar el level_id
+            transaction.set(target_ref, {**legacy.to_dict(), "level_id": level_id})
+            return
+        current = transaction.get(target_ref)
+        transaction.set(target_ref, merge_records(current.to_dict() if current.exists else None, legacy.to_dict(), level_id))
+        transaction.delete(legacy_ref)
+
+    await datastore.transaction(PROGRESS_COLLECTION, migrate)
+    return True
+
+
+async def migrate(chunk_size: int = 200, dry_run: bool = False) -> int:
+    """
+    Recorre la coleccion progress por bloques y migra los documentos antiguos.
+    Returns:
+        int: Numero de documentos migrados (o que se migrarian con dry_run).
+    """
+    total = 0
+    last = None
+    while True:
+        def fetch_chunk(last=last):
+            query = datastore.collection(PROGRESS_COLLECTION).order_by("__name__").limit(chunk_size)
+            if last is not None:
+                query = query.start_after(last)
+            return query.get()
+
+        docs = await datastore.run(PROGRESS_COLLECTION, fetch_chunk)
+        if not docs:
+            break
+        for doc in docs:
+            if await migrate_document(doc.id, doc.to_dict(), dry_run):
+                total += 1
+        logger.info(f"Documentos de progress revisados hasta {docs[-1].id}; migrados: {total}")
+        if len(docs) < chunk_size:
+            break
+        last = docs[-1]
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="solo contar los documentos a migrar")
+    args = parser.parse_args()
+    count = asyncio.run(migrate(args.chunk_size, args.dry_run))
+    print(f"Documentos de progress {'por migrar' if args.dry_run else 'migrados'}: {count}")
+    datastore.shutdown()
@@ -0,0 +1,151 @@
+"""
+Pasa el progreso de la coleccion global progress a las subcolecciones
+users/{uid}/progress, normalizando los registros por el camino (level_id entero,
+un documento {uid}_{level_id} por usuario y nivel; los duplicados se fusionan
+como en app.progress.migrate_progress_keys).
+
+Pasos del cambio, sin parar el servicio:
+  1. Desplegar con PROGRESS_STORAGE=dual: se sigue leyendo de progress y cada
+     escritura va a las dos colecciones.
+  2. Copiar con este proceso (modo dual). Cada bloque se copia en una
+     transaccion, asi que no pisa las escrituras que lleguen a la vez.
+  3. Crear el indice de level_id con alcance de collection group, que Firestore
+     no crea por defecto (sin el, las consultas por nivel fallan con
+     FAILED_PRECONDITION), y esperar a que este listo:
+         firebase deploy --only firestore:indexes    # firestore.indexes.json
+     Despues, desplegar con PROGRESS_STORAGE=user: lecturas y escrituras solo en
+     users/{uid}/progress y consultas por nivel de collection group.
+  4. Vaciar la coleccion global con --delete-legacy (modo user). Lo que aun no
+     se hubiera copiado se copia antes de borrarlo; lo ya copiado no se pisa.
+
+El proceso recorre la coleccion por bloques ordenados por id y registra el
+ultimo id de cada bloque: se puede relanzar desde el principio (copiar es
+idempotente) o continuar con --start-after.
+
+Uso:
+    PROGRESS_STORAGE=dual python -m app.progress.migrate_progress_subcollections
+    PROGRESS_STORAGE=dual python -m app.progress.migrate_progress_subcollections --start-after <id>
+    PROGRESS_STORAGE=user python -m app.progress.migrate_progress_subcollections --delete-legacy
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from app.config.datastore import datastore
+from app.progress import records
+from app.progress.migrate_progress_keys import merge_records
+from app.progress.records import PROGRESS_COLLECTION, progress_doc_id, user_progress_path
+from app.progress.summary import normalize_level_id
+
+logger = logging.getLogger(__name__)
+
+# cada documento puede suponer hasta tres escrituras y una transaccion admite 500
+MAX_CHUNK_SIZE = 150
+
+
+def _canonical(data: Dict[str, Any], uid: str, level_id: int) -> Dict[str, Any]:
+    return {**data, "user_id": uid, "level_id": level_id}
+
+
+def migrate_chunk(transaction, doc_ids: List[str], delete_legacy: bool = False) -> Dict[str, int]:
+    """
+    Copia (y con delete_legacy borra) un bloque de documentos de la coleccion
+    global dentro de una transaccion. Los documentos se vuelven a leer en la
+    transaccion junto con su registro canonico y su destino.
+    Returns:
+        dict: Documentos escritos en las subcolecciones y documentos borrados.
+    """
+    legacy = datastore.collection(PROGRESS_COLLECTION)
+    snapshots = {snapshot.id: snapshot for snapshot in transaction.get_all([legacy.document(doc_id) for doc_id in doc_ids])}
+
+    groups = defaultdict(list)
+    for doc_id, snapshot in snapshots.items():
+        if not snapshot.exists:
+            continue
+        data = snapshot.to_dict()
+        uid, level_id = data.get("user_id"), normalize_level_id(data.get("level_id"))
+        if not uid or level_id is None:
+            logger.warning(f"Documento de progress {doc_id} sin user_id o level_id validos; se deja como esta")
+            continue
+        groups[(uid, level_id)].append((doc_id, data))
+
+    keys = list(groups)
+    canonical_refs = [legacy.document(progress_doc_id(uid, level_id)) for uid, level_id in keys]
+    target_refs = [datastore.collection(user_progress_path(uid)).document(progress_doc_id(uid, level_id)) for uid, level_id in keys]
+    reads = {snapshot.reference.path: snapshot for snapshot in transaction.get_all(canonical_refs + target_refs)}
+
+    written = deleted = 0
+    for key, canonical_ref, target_ref in zip(keys, canonical_refs, target_refs):
+        uid, level_id = key
+        canonical = reads[canonical_ref.path].to_dict() if reads[canonical_ref.path].exists else None
+        target = reads[target_ref.path].to_dict() if reads[target_ref.path].exists else None
+        if canonical is not None:
+            canonical = _canonical(canonical, uid, level_id)
+        # en modo dual manda la coleccion global; en modo user, la subcoleccion
+        record = (target or canonical) if delete_legacy else (canonical or target)
+        for doc_id, data in groups[key]:
+            if doc_id != canonical_ref.id:
+                record = merge_records(record, _canonical(data, uid, level_id), level_id)
+                transaction.delete(legacy.document(doc_id))
+                deleted += 1
+        if record != target:
+            transaction.set(target_ref, record)
+            written += 1
+        if delete_legacy:
+            if canonical is not None:
+                transaction.delete(canonical_ref)
+                deleted += 1
+        elif record != reads[canonical_ref.path].to_dict():
+            transaction.set(canonical_ref, record)
+    return {"written": written, "deleted": deleted}
+
+
+async def migrate(chunk_size: int = 100, start_after: Optional[str] = None, delete_legacy: bool = False) -> Dict[str, int]:
+    """
+    Recorre la coleccion global por bloques y los migra.
+    Args:
+        chunk_size (int): Documentos por bloque (maximo MAX_CHUNK_SIZE).
+        start_after (str, optional): Id del ultimo documento ya procesado.
+        delete_legacy (bool): Borrar los documentos de la coleccion global.
+    Returns:
+        dict: Documentos revisados, escritos en las subcolecciones y borrados.
+    """
+    chunk_size = max(1, min(chunk_size, MAX_CHUNK_SIZE))
+    totals = {"read": 0, "written": 0, "deleted": 0}
+    last: Any = {"__name__": start_after} if start_after else None
+    while True:
+        def fetch_chunk(last=last):
+            query = datastore.collection(PROGRESS_COLLECTION).order_by("__name__").limit(chunk_size)
+            if last is not None:
+                query = query.start_after(last)
+            return query.get()
+
+        docs = await datastore.run(PROGRESS_COLLECTION, fetch_chunk)
+        if not docs:
+            break
+        doc_ids = [doc.id for doc in docs]
+        result = await datastore.transaction(PROGRESS_COLLECTION, lambda transaction: migrate_chunk(transaction, doc_ids, delete_legacy))
+        totals["read"] += len(docs)
+        for name, value in result.items():
+            totals[name] += value
+        logger.info(f"Progreso migrado hasta {docs[-1].id}: {totals}")
+        if len(docs) < chunk_size:
+            break
+        last = docs[-1]
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--start-after", help="continuar despues de este id de documento")
+    parser.add_argument("--delete-legacy", action="store_true", help="copiar lo que falte y vaciar la coleccion global")
+    args = parser.parse_args()
+    required = "user" if args.delete_legacy else "dual"
+    if records.PROGRESS_STORAGE != required:
+        parser.error(f"este paso requiere PROGRESS_STORAGE={required} (actual: {records.PROGRESS_STORAGE})")
+    totals = asyncio.run(migrate(args.chunk_size, args.start_after, args.delete_legacy))
+    print(f"Progreso migrado: {totals['read']} revisados, {totals['written']} escritos, {totals['deleted']} borrados")
+    datastore.shutdown()
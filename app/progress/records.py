@@ -0,0 +1,235 @@
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.config.datastore import Filter, datastore
+from .level_state import LevelState
+from .summary import normalize_level_id
+
+logger = logging.getLogger(__name__)
+
+# coleccion global antigua y id de la subcoleccion users/{uid}/progress
+PROGRESS_COLLECTION = "progress"
+
+# donde se guarda el progreso durante el paso a users/{uid}/progress
+# (ver app.progress.migrate_progress_subcollections):
+#   legacy: solo en la coleccion global progress
+#   dual: se lee de la coleccion global y se escribe en las dos (mientras se migra)
+#   user: solo en users/{uid}/progress; las consultas por nivel son de collection group
+PROGRESS_STORAGE = os.getenv("PROGRESS_STORAGE", "dual").lower()
+PROGRESS_STORAGE_MODES = ("legacy", "dual", "user")
+if PROGRESS_STORAGE not in PROGRESS_STORAGE_MODES:
+    logger.warning(f"PROGRESS_STORAGE invalido ({PROGRESS_STORAGE}); se usa dual")
+    PROGRESS_STORAGE = "dual"
+
+# escritura adicional de la misma transaccion: (coleccion, id, datos para set(merge=True))
+SideWrite = Tuple[str, str, Dict[str, Any]]
+
+
+def progress_doc_id(uid: str, level_id: Any) -> str:
+    """
+    Id del documento de progress de un usuario en un nivel: uno por (usuario, nivel),
+    de forma que se lee y escribe por clave, sin consultas.
+    Raises:
+        ValueError: Si el level_id no es un nivel valido.
+    """
+    level = normalize_level_id(level_id)
+    if level is None:
+        raise ValueError(f"level_id no valido: {level_id!r}")
+    return f"{uid}_{level}"
+
+
+def user_progress_path(uid: str) -> str:
+    """Ruta de la subcoleccion de progreso de un usuario."""
+    return f"users/{uid}/{PROGRESS_COLLECTION}"
+
+
+def reads_user_progress() -> bool:
+    """True si el progreso se lee de las subcolecciones de los usuarios."""
+    return PROGRESS_STORAGE == "user"
+
+
+def progress_read_path(uid: str) -> str:
+    """Coleccion de la que se lee el progreso de un usuario."""
+    return user_progress_path(uid) if reads_user_progress() else PROGRESS_COLLECTION
+
+
+def progress_write_paths(uid: str) -> List[str]:
+    """Colecciones en las que se escribe el progreso de un usuario (las dos en modo dual)."""
+    if PROGRESS_STORAGE == "legacy":
+        return [PROGRESS_COLLECTION]
+    if PROGRESS_STORAGE == "dual":
+        return [PROGRESS_COLLECTION, user_progress_path(uid)]
+    return [user_progress_path(uid)]
+
+
+def user_progress_source(uid: str) -> Tuple[str, List[Filter]]:
+    """
+    Coleccion y filtros para recorrer el progreso de un usuario: su subcoleccion
+    entera o, en la coleccion global, los documentos con su user_id.
+    """
+    if reads_user_progress():
+        return user_progress_path(uid), []
+    return PROGRESS_COLLECTION, [("user_id", "==", uid)]
+
+
+def level_progress_cursor(progress_id: str) -> Dict[str, Any]:
+    """
+    Cursor start_after ordenando por __name__ a partir de un progress_id. En una
+    consulta de collection group el nombre es la ruta completa del documento, que
+    se obtiene del propio id ({uid}_{level_id}).
+    """
+    if not reads_user_progress():
+        return {"__name__": progress_id}
+    uid = progress_id.rsplit("_", 1)[0]
+    return {"__name__": datastore.client.document(f"{user_progress_path(uid)}/{progress_id}")}
+
+
+def is_legacy_progress(doc) -> bool:
+    """True si el documento esta en la coleccion global y no en la de un usuario."""
+    return doc.reference.path.count("/") == 1
+
+
+def _level_query(level_id: int, limit: Optional[int], start_after: Optional[str]) -> Dict[str, Any]:
+    # en modo user es una consulta de collection group: necesita el indice de
+    # level_id con alcance COLLECTION_GROUP de firestore.indexes.json
+    return {
+        "filters": [("level_id", "==", level_id)],
+        "order_by": "__name__",
+        "limit": limit,
+        "start_after": level_progress_cursor(start_after) if start_after else None,
+        "group": reads_user_progress(),
+    }
+
+
+async def query_level_progress(level_id: int, limit: Optional[int] = None, start_after: Optional[str] = None) -> Tuple[List[Any], Optional[str]]:
+    """
+    Una pagina del progreso de todos los usuarios en un nivel, ordenada por documento:
+    de la coleccion global o, en modo user, con una consulta de collection group
+    sobre las subcolecciones progress.
+    Returns:
+        Tuple[List[DocumentSnapshot], str | None]: Registros y progress_id con el que
+            pedir la pagina siguiente (None si no hay mas).
+    """
+    query = _level_query(level_id, limit, start_after)
+    docs = []
+    while True:
+        page = await datastore.query(PROGRESS_COLLECTION, **query)
+        # la coleccion global tambien se llama progress: en modo user sus restos no
+        # cuentan. Van antes que users/... en el orden, asi que se sigue leyendo
+        docs += [doc for doc in page if not (query["group"] and is_legacy_progress(doc))]
+        if not limit or len(page) < limit or len(docs) >= limit:
+            break
+        query["start_after"] = page[-1]
+    docs = docs[:limit] if limit else docs
+    next_cursor = docs[-1].id if limit and len(docs) == limit else None
+    return docs, next_cursor
+
+
+async def stream_level_progress(level_id: int, limit: Optional[int] = None, start_after: Optional[str] = None):
+    """
+    Como query_level_progress, pero documento a documento sin cargar la lista completa.
+    Yields:
+        DocumentSnapshot: Registros del nivel.
+    """
+    query = _level_query(level_id, limit, start_after)
+    async for doc in datastore.stream(PROGRESS_COLLECTION, **query):
+        if query["group"] and is_legacy_progress(doc):
+            continue
+        yield doc
+
+
+def best_progress(
+    previous: Optional[Dict[str, Any]],
+    uid: str,
+    level_id: int,
+    metric: str,
+    value: int,
+    now: datetime,
+    best_fields: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Registro de progress tras un intento. El intento siempre cuenta (attempts); la
+    marca (metric y best_fields) solo se sustituye si value la mejora.
+    attempts se suma aqui y no con Increment: el registro ya se lee en la
+    transaccion de upsert_progress (para comparar la marca), que se reintenta si
+    otro intento lo cambia, y la respuesta y las estadisticas necesitan el valor.
+    Los fallos no pasan por aqui (ver app.progress.attempts).
+    Args:
+        previous (dict | None): Registro actual, None si es el primer intento.
+        uid (str): ID del usuario.
+        level_id (int): Nivel, ya como entero.
+        metric (str): Campo de la marca ("score" o "stars").
+        value (int): Valor obtenido en el intento.
+        now (datetime): Fecha del intento.
+        best_fields (dict, optional): Otros campos que acompañan a la marca (p. ej. potions).
+    Returns:
+        dict: Registro completo tal como queda guardado.
+    """
+    if previous is None:
+        return {"user_id": uid, "level_id": level_id, metric: value, **(best_fields or {}),
+                "start_date": now, "completion_date": now, "attempts": 1}
+    record = {**previous, "user_id": uid, "level_id": level_id, "attempts": (previous.get("attempts") or 1) + 1}
+    if value > (previous.get(metric) or 0):
+        record.update(best_fields or {})
+        record[metric] = value
+        record["completion_date"] = now
+    return record
+
+
+async def get_progress_records(uid: str, level_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Registros de progress de un usuario en varios niveles, leidos por clave en una
+    sola llamada. Los niveles sin registro no aparecen en el resultado.
+    """
+    level_ids = list(dict.fromkeys(level_ids))
+    if not level_ids:
+        return {}
+    snapshots = await datastore.get_many(progress_read_path(uid), [progress_doc_id(uid, level_id) for level_id in level_ids])
+    records = {}
+    for level_id in level_ids:
+        snapshot = snapshots.get(progress_doc_id(uid, level_id))
+        if snapshot is not None and snapshot.exists:
+            records[level_id] = snapshot.to_dict()
+    return records
+
+
+async def upsert_progress(
+    uid: str,
+    level_id: int,
+    build: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]],
+    side_writes: Callable[[Optional[Dict[str, Any]], Dict[str, Any], LevelState], List[SideWrite]] = lambda previous, record, state: [],
+) -> Tuple[str, Optional[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Lee por clave el registro de progress de (usuario, nivel), calcula el nuevo con
+    build(previo) y lo escribe en una transaccion junto con side_writes(previo, nuevo,
+    estado) (resumen, estadisticas...). Si otro intento escribe a la vez, se reintenta.
+    En modo dual el registro se escribe igual en las dos colecciones.
+
+    El documento del usuario tambien se lee en la transaccion: side_writes recibe su
+    LevelState y, si lo modifica (record/unlock), los bitsets se escriben en el mismo
+    commit. Firestore no tiene operaciones de bits, asi que se leen y reescriben.
+    """
+    doc_id = progress_doc_id(uid, level_id)
+    ref = datastore.collection(progress_read_path(uid)).document(doc_id)
+    user_ref = datastore.collection("users").document(uid)
+    targets = [datastore.collection(path).document(doc_id) for path in progress_write_paths(uid)]
+
+    def upsert(transaction):
+        snapshot = transaction.get(ref)
+        user = transaction.get(user_ref)
+        previous = snapshot.to_dict() if snapshot.exists else None
+        record = build(previous)
+        state = LevelState(user.to_dict() if user.exists else None)
+        for target in targets:
+            transaction.set(target, record)
+        for collection, side_doc_id, data in side_writes(previous, record, state):
+            transaction.set(datastore.collection(collection).document(side_doc_id), data, merge=True)
+        level_update = state.update()
+        if level_update:
+            transaction.set(user_ref, level_update, merge=True)
+        return previous, record
+
+    previous, record = await datastore.transaction(PROGRESS_COLLECTION, upsert)
+    return doc_id, previous, record
@@ -1,64 +1,66 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 from .service import ProgressService
-from ..auth.service import AuthService
+from ..auth.dependencies import UserContext, get_current_user
 from .schemas import Progress, ProgressCreate
+from app.config.streaming import ndjson_response
 
 # Crear un router específico para la gestión del progreso del usuario.
 router = APIRouter(prefix="/progress", tags=["Progress"])
+
+MAX_PAGE_SIZE = 500
+# cabecera con el cursor de la siguiente pagina
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
 #modelo base para progress
 
 @router.get("/", response_model=List[Progress], summary="Obtener progreso del usuario")
-async def get_user_progress(authorization: Optional[str] = Header(None)):
+async def get_user_progress(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Tamaño de página"),
+    start_after: Optional[str] = Query(None, description="progress_id del último elemento de la página anterior"),
+    stream: bool = Query(False, description="Devolver el progreso como NDJSON, un registro por línea"),
+    user: UserContext = Depends(get_current_user),
+):
     """
     Obtiene el progreso de un usuario autenticado.
     Args:
-        authorization (str, optional): Token de autorización en formato Bearer.
+        limit (int, optional): Tamaño de página. Si la página está completa se devuelve
+            la cabecera X-Next-Cursor con el cursor de la siguiente.
+        start_after (str, optional): Cursor devuelto por la página anterior.
+        stream (bool): Si es True, responde en NDJSON leyendo de Firestore según se envía.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
     Raises:
         HTTPException: Si el token no está presente o no es válido.
     Returns:
         List[Progress]: Lista con el progreso de los niveles del usuario.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    #extraer y verificar el token
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
+    if stream:
+        return ndjson_response(ProgressService.stream_user_progress(user.uid, limit, start_after))
+
     # Obtener el progreso del usuario desde el servicio
-    user_progress = await ProgressService.get_user_progress(decoded_token["uid"])
+    user_progress = await ProgressService.get_user_progress(user.uid, limit, start_after)
+    if limit and len(user_progress) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = user_progress[-1]["progress_id"]
     return user_progress
 
 @router.post("/", response_model=Progress, status_code=status.HTTP_201_CREATED, summary="Registrar progreso del usuario")
-async def record_progress(progress: ProgressCreate, authorization: Optional[str] = Header(None)):
+async def record_progress(progress: ProgressCreate, user: UserContext = Depends(get_current_user)):
     """
     Registra el progreso de un usuario en un nivel específico.
     Args:
         progress (ProgressCreate): Datos del progreso a registrar.
-        authorization (str, optional): Token de autorización en formato Bearer.
+        user (UserContext): Usuario autenticado (token Bearer verificado una vez por petición).
     Raises:
         HTTPException: Si el token no está presente o no es válido.
     Returns:
         Progress: El registro del progreso creado.
     """
-    if not authorization or not authorization.startswith("Bearer "):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token no proporcionado o formato incorrecto",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    token = authorization.split("Bearer ")[1]
-    decoded_token = await AuthService.verify_token(token)
     
     # Registrar el progreso utilizando el servicio correspondiente
     new_progress = await ProgressService.record_progress(
-        user_id=decoded_token["uid"],
+        user_id=user.uid,
         level_id=progress.level_id,
         score=progress.score
     )
@@ -1,7 +1,17 @@
-from app.config.firebase import db
+import asyncio
+import logging
+from app.config.datastore import datastore
 from fastapi import HTTPException, status
 from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.game import statistics
+from app.levels.catalog import level_catalog
+from .attempts import attempt_writes, user_failures
+from .level_state import LevelState
+from .records import SideWrite, best_progress, upsert_progress, user_progress_source
+from .summary import SUMMARY_COLLECTION, build_summary, completed_levels, normalize_level_id, summary_update
 
+logger = logging.getLogger(__name__)
 
 
 class ProgressService:
@@ -10,29 +20,136 @@ class ProgressService:
     async def get_levels_completed_by_user(uid: str):
         """
         Obtiene los niveles completados por un usuario específico.
+        Se lee del resumen materializado del usuario, sin recorrer su progreso.
         """
         try:
-            query = db.collection("progress").where("user_id", "==", uid).get()
-            if not query:
-                return None
-            level_ids = []
-            for doc in query:
-                data = doc.to_dict()
-                level_id = data.get("level_id")
-                if level_id is not None and level_id not in level_ids:
-                    level_ids.append(level_id)
+            summary = await ProgressService.get_summary(uid)
+            level_ids = completed_levels(summary)
             return level_ids if level_ids else None
         except Exception as e:
-            print(f"Error al obtener levels_completed: {str(e)}")
+            logger.error(f"Error al obtener levels_completed de {uid}: {str(e)}")
             return []
+
+    @staticmethod
+    async def get_summary(uid: str):
+        """
+        Obtiene el resumen de progreso del usuario (mejores estrellas por nivel,
+        intentos y niveles completados). Si aun no existe o no se ha construido
+        desde los datos originales, se reconstruye.
+        Args:
+            uid (str): ID del usuario.
+        Returns:
+            dict: Resumen de progreso del usuario.
+        """
+        summary = await ProgressService.read_summary(uid)
+        if summary is not None:
+            return summary
+        return await ProgressService.rebuild_summary(uid)
+
+    @staticmethod
+    async def read_summary(uid: str) -> Optional[Dict[str, Any]]:
+        """
+        Lee el resumen de progreso del usuario sin reconstruirlo.
+        Returns:
+            dict | None: Resumen, o None si no existe o no se ha construido aun.
+        """
+        doc = await datastore.get(SUMMARY_COLLECTION, uid)
+        if doc.exists:
+            summary = doc.to_dict()
+            if summary.get("built_at"):
+                summary.setdefault("levels", {})
+                summary.setdefault("completed_levels", [])
+                return summary
+        return None
+
+    @staticmethod
+    async def rebuild_summary(uid: str):
+        """
+        Reconstruye el resumen de un usuario a partir de todo su progreso y sus
+        intentos fallidos, y añade a los bitsets de su documento lo que falte
+        (ver sync_level_state).
+        Args:
+            uid (str): ID del usuario.
+        Returns:
+            dict: Resumen reconstruido y guardado.
+        """
+        collection, filters = user_progress_source(uid)
+        docs, failed = await asyncio.gather(datastore.query(collection, filters), user_failures(uid))
+        summary = build_summary(uid, (doc.to_dict() for doc in docs), failed)
+        summary["built_at"] = datetime.utcnow()
+        await datastore.set(SUMMARY_COLLECTION, uid, summary)
+        await ProgressService.sync_level_state(uid)
+        return summary
+
+    @staticmethod
+    async def sync_level_state(uid: str) -> Optional[LevelState]:
+        """
+        Añade al estado de niveles del documento del usuario (bitsets) los niveles
+        de su resumen, o lo inicializa si es anterior a los bitsets. Nunca quita
+        niveles ni baja estrellas: el usuario y el resumen se leen en una
+        transaccion, asi que un intento guardado a la vez (que escribe los dos en la
+        misma transaccion) no se pierde.
+        Args:
+            uid (str): ID del usuario.
+        Returns:
+            LevelState | None: Estado resultante, o None si el usuario no existe.
+        """
+        user_ref = datastore.collection("users").document(uid)
+        summary_ref = datastore.collection(SUMMARY_COLLECTION).document(uid)
+
+        def sync(transaction):
+            user = transaction.get(user_ref)
+            summary = transaction.get(summary_ref)
+            if not user.exists:
+                return None
+            state = LevelState(user.to_dict())
+            state.merge_summary(summary.to_dict() if summary.exists else {})
+            level_update = state.update()
+            if level_update:
+                transaction.set(user_ref, level_update, merge=True)
+            return state
+
+        return await datastore.transaction("users", sync)
+
+    @staticmethod
+    async def update_summary(uid: str, level_id, stars: int = 0, score: Optional[int] = None, now: Optional[datetime] = None):
+        """
+        Actualiza de forma incremental el resumen tras escribir un registro de progreso.
+        Es una sola escritura, sin lectura previa.
+        Args:
+            uid (str): ID del usuario.
+            level_id (int): Nivel del registro.
+            stars (int): Estrellas obtenidas.
+            score (int, optional): Puntuacion obtenida.
+            now (datetime, optional): Fecha del registro.
+        """
+        level_id = normalize_level_id(level_id)
+        if level_id is None:
+            return
+        await datastore.set(SUMMARY_COLLECTION, uid, summary_update(uid, level_id, stars, score, now), merge=True)
     
     
     
     @staticmethod
-    async def get_user_progress(user_id: str):
+    async def get_user_progress(user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None):
+        """
+        Obtiene el progreso de un usuario, paginado por id de documento.
+        Args:
+            user_id (str): ID del usuario.
+            limit (int, optional): Tamaño de pagina. Sin limite devuelve todo el progreso.
+            start_after (str, optional): progress_id del ultimo elemento de la pagina anterior.
+        Returns:
+            List[dict]: Registros de progreso con su progress_id.
+        """
         try:
-            progress_ref = db.collection('progress')
-            progress = progress_ref.where("user_id", "==", user_id).get()
+            collection, filters = user_progress_source(user_id)
+            progress = await datastore.query(
+                collection,
+                filters,
+                order_by="__name__",
+                limit=limit,
+                start_after={"__name__": start_after} if start_after else None,
+            )
             return [
                 {
                     "progress_id": doc.id,
@@ -44,51 +161,74 @@ class ProgressService:
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al obtener progreso: {str(e)}"
             )
+
+    @staticmethod
+    async def stream_user_progress(user_id: str, limit: Optional[int] = None, start_after: Optional[str] = None):
+        """
+        Recorre el progreso de un usuario documento a documento, sin cargar la lista completa.
+        Mismos argumentos que get_user_progress.
+        Yields:
+            dict: Registro de progreso con su progress_id.
+        """
+        collection, filters = user_progress_source(user_id)
+        async for doc in datastore.stream(
+            collection,
+            filters,
+            order_by="__name__",
+            limit=limit,
+            start_after={"__name__": start_after} if start_after else None,
+        ):
+            yield {"progress_id": doc.id, **doc.to_dict()}
     
+    @staticmethod
+    def _score_writes(uid: str, level_id: int, score: int, now: datetime, state: LevelState, previous: Optional[Dict[str, Any]], record: Dict[str, Any]) -> List[SideWrite]:
+        """Escrituras que acompañan a un intento con puntuacion: resumen, estadisticas, estado de niveles y registro de intentos."""
+        state.record(level_id, record.get("stars", 0))
+        return [
+            (SUMMARY_COLLECTION, uid, summary_update(uid, level_id, score=score, now=now)),
+            statistics.shard_write(level_id, previous, record),
+        ] + attempt_writes(uid, level_id, "score", True, record.get("stars", 0), now, score=score)
+
     @staticmethod
     async def record_progress(user_id: str, level_id: int, score: int):
+        """
+        Registra un intento con puntuacion en el documento de progress del usuario en
+        el nivel (uno por usuario y nivel, ver app.progress.records), que guarda la
+        mejor puntuacion y el numero de intentos. Se lee por clave y se escribe en una
+        transaccion junto con el resumen y las estadisticas del nivel, sin consultas;
+        la respuesta se construye con los datos escritos.
+        Args:
+            user_id (str): ID del usuario.
+            level_id (int): Nivel del intento.
+            score (int): Puntuacion obtenida.
+        Returns:
+            dict: Registro de progress guardado, con su progress_id.
+        Raises:
+            HTTPException(404): Si el nivel no esta en el catalogo.
+            HTTPException: Error interno si falla la escritura.
+        """
+        level_id = normalize_level_id(level_id)
+        # solo niveles del catalogo: el id es la posicion en los bitsets del
+        # documento del usuario, que creceria hasta el id recibido
+        if level_id is None or await level_catalog.compiled(level_id) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Nivel no encontrado"
+            )
         try:
-            # Verificar si ya existe un progreso para este nivel y usuario
-            progress_ref = db.collection('progress')
-            existing_progress = progress_ref.where("user_id", "==", user_id)\
-                                          .where("level_id", "==", level_id)\
-                                          .get()
-            
             now = datetime.utcnow()
-            
-            if len(existing_progress) > 0:
-                # Actualizar progreso existente
-                progress_id = existing_progress[0].id
-                progress_ref.document(progress_id).update({
-                    "puntuacion": score,
-                    "fecha_completado": now
-                })
-                
-                # Obtener el documento actualizado
-                updated_doc = progress_ref.document(progress_id).get()
-                return {
-                    "progress_id": progress_id,
-                    **updated_doc.to_dict()
-                }
-            else:
-                # Crear nuevo progreso
-                new_progress = {
-                    "user_id": user_id,
-                    "level_id": level_id,
-                    "score": score,
-                    "start_date": now,
-                    "completion_date": now
-                }
-                
-                new_doc = progress_ref.add(new_progress)[1]
-                progress_id = new_doc.id
-                
-                return {
-                    "progress_id": progress_id,
-                    **new_progress
-                }
+            progress_id, _, record = await upsert_progress(
+                user_id,
+                level_id,
+                lambda previous: best_progress(previous, user_id, level_id, "score", score, now),
+                lambda previous, record, state: ProgressService._score_writes(user_id, level_id, score, now, state, previous, record),
+            )
+            return {
+                "progress_id": progress_id,
+                **record
+            }
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error al registrar progreso: {str(e)}"
-            )
\ No newline at end of file
+            )
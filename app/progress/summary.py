@@ -0,0 +1,125 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from firebase_admin import firestore
+
+# un documento por usuario: progress_summaries/{uid}
+SUMMARY_COLLECTION = "progress_summaries"
+
+
+def normalize_level_id(level_id: Any) -> Optional[int]:
+    """
+    Convierte un level_id guardado en progress a entero.
+    Acepta enteros y el formato antiguo de los niveles de pociones ("level3").
+    """
+    if isinstance(level_id, bool):
+        return None
+    if isinstance(level_id, int):
+        return level_id
+    if isinstance(level_id, str):
+        digits = level_id[5:] if level_id.lower().startswith("level") else level_id
+        if digits.isdigit():
+            return int(digits)
+    return None
+
+
+def empty_summary(uid: str) -> Dict[str, Any]:
+    return {
+        "user_id": uid,
+        "levels": {},
+        "completed_levels": [],
+        "total_attempts": 0,
+        # intentos fallidos por nivel (tambien de niveles sin completar)
+        "failed_attempts": {},
+        "total_failed_attempts": 0,
+    }
+
+
+def apply_progress(summary: Dict[str, Any], level_id: int, stars: int = 0, score: Optional[int] = None, now: Optional[datetime] = None, attempts: int = 1) -> Dict[str, Any]:
+    """
+    Aplica en memoria un registro de progreso al resumen, igual que summary_update en Firestore.
+    Args:
+        summary (dict): Resumen del usuario, se modifica en el sitio.
+        level_id (int): Nivel del registro.
+        stars (int): Estrellas obtenidas.
+        score (int, optional): Puntuacion obtenida, si el registro la tiene.
+        now (datetime, optional): Fecha del registro.
+        attempts (int): Intentos que representa el registro (los registros por
+            usuario y nivel acumulan varios).
+    Returns:
+        dict: El mismo resumen actualizado.
+    """
+    entry = summary["levels"].setdefault(str(level_id), {"best_stars": 0, "attempts": 0})
+    entry["attempts"] = entry.get("attempts", 0) + attempts
+    entry["best_stars"] = max(entry.get("best_stars", 0), stars or 0)
+    if score is not None:
+        entry["best_score"] = max(entry.get("best_score", score), score)
+    if now is not None:
+        entry["last_completion"] = now
+        summary["updated_at"] = now
+    if level_id not in summary["completed_levels"]:
+        summary["completed_levels"].append(level_id)
+    summary["total_attempts"] = summary.get("total_attempts", 0) + attempts
+    return summary
+
+
+def summary_update(uid: str, level_id: int, stars: int = 0, score: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Datos para un set(merge=True) que actualiza el resumen de forma incremental,
+    sin leerlo antes: contadores con Increment, mejores marcas con Maximum y
+    niveles completados con ArrayUnion.
+    """
+    now = now or datetime.utcnow()
+    entry: Dict[str, Any] = {
+        "attempts": firestore.Increment(1),
+        "best_stars": firestore.Maximum(stars or 0),
+        "last_completion": now,
+    }
+    if score is not None:
+        entry["best_score"] = firestore.Maximum(score)
+    return {
+        "user_id": uid,
+        "levels": {str(level_id): entry},
+        "completed_levels": firestore.ArrayUnion([level_id]),
+        "total_attempts": firestore.Increment(1),
+        "updated_at": now,
+    }
+
+
+def failures_update(failed: Dict[int, int]) -> Dict[str, Any]:
+    """Datos para un set(merge=True) que suma intentos fallidos por nivel al resumen, con Increment."""
+    return {
+        "failed_attempts": {str(level_id): firestore.Increment(count) for level_id, count in failed.items()},
+        "total_failed_attempts": firestore.Increment(sum(failed.values())),
+    }
+
+
+def build_summary(uid: str, progress_records: Iterable[Dict[str, Any]], failed: Optional[Dict[int, int]] = None) -> Dict[str, Any]:
+    """
+    Construye el resumen completo a partir de los documentos de progress de un
+    usuario y de sus intentos fallidos por nivel (app.progress.attempts.user_failures).
+    """
+    summary = empty_summary(uid)
+    for record in progress_records:
+        level_id = normalize_level_id(record.get("level_id"))
+        if level_id is None:
+            continue
+        apply_progress(summary, level_id, record.get("stars", 0), record.get("score"), record.get("completion_date"), record.get("attempts") or 1)
+    for level_id, count in sorted((failed or {}).items()):
+        summary["failed_attempts"][str(level_id)] = count
+        summary["total_failed_attempts"] += count
+    summary["completed_levels"].sort()
+    return summary
+
+
+def completed_levels(summary: Dict[str, Any]) -> List[int]:
+    """Ids de los niveles completados segun el resumen."""
+    return list(summary.get("completed_levels", []))
+
+
+def summary_progress(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Progreso por nivel del resumen, en el formato de lista que devuelve la API."""
+    progress = []
+    for level_key, entry in sorted(summary.get("levels", {}).items(), key=lambda item: int(item[0])):
+        progress.append({"level_id": int(level_key), **entry})
+    return progress
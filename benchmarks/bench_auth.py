@@ -0,0 +1,80 @@
+"""
+Benchmark del coste de autenticacion por peticion (app.auth.token_cache).
+
+Firma tokens con una clave RSA generada al vuelo y mide, por peticion:
+    - verificacion local de firma y claims con certificados cacheados
+    - acierto en la cache de tokens verificados (hash + busqueda LRU)
+
+La verificacion original (auth.verify_id_token) anade ademas la descarga o
+revalidacion de certificados, que depende de la red y no se mide aqui.
+
+Uso:
+    python -m benchmarks.bench_auth [--requests 2000]
+"""
+import argparse
+import asyncio
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+
+from app.auth.token_cache import CertificateCache, LocalTokenVerifier, TokenCache
+
+PROJECT_ID = "devquest-bench"
+
+
+def _make_verifier_and_signer():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    certificates = CertificateCache()
+    certificates.certs = {"bench": public_pem}
+    certificates.expires_at = time.time() + 3600
+    verifier = LocalTokenVerifier(certificates)
+    verifier._project_id = PROJECT_ID
+    return verifier, crypt.RSASigner.from_string(private_pem, key_id="bench")
+
+
+def _make_token(signer, uid: str) -> str:
+    now = int(time.time())
+    return jwt.encode(signer, {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": uid,
+        "iat": now,
+        "exp": now + 3600,
+    }).decode()
+
+
+async def main(total_requests: int):
+    verifier, signer = _make_verifier_and_signer()
+    token = _make_token(signer, "bench-user")
+    cache = TokenCache()
+
+    start = time.perf_counter()
+    for _ in range(total_requests):
+        await verifier.verify(token)
+    local = (time.perf_counter() - start) / total_requests
+
+    cache.put(token, await verifier.verify(token))
+    start = time.perf_counter()
+    for _ in range(total_requests):
+        cache.get(token)
+    cached = (time.perf_counter() - start) / total_requests
+
+    print(f"peticiones: {total_requests}")
+    print(f"verificacion local : {local * 1e6:9.1f} us/peticion")
+    print(f"acierto en cache   : {cached * 1e6:9.1f} us/peticion")
+    print(f"estadisticas cache : {cache.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
@@ -0,0 +1,91 @@
+"""
+Benchmark del arranque en frio: tiempo desde que se lanza el proceso hasta que
+se atiende la primera peticion, sobre el backend en memoria.
+
+Cada ejecucion lanza un proceso nuevo que importa app.main, ejecuta el arranque
+(inicializacion del backend y precarga del catalogo y de los certificados) y
+atiende un login y la primera lectura de un nivel. Se informa de la mediana y
+el maximo de cada fase:
+    - import: lanzamiento del proceso hasta terminar de importar la app
+    - startup: eventos de arranque hasta que /api/health/ready responde 200
+    - primera peticion: login + GET /api/levels/1 con las caches ya precargadas
+
+Uso:
+    python -m benchmarks.bench_cold_start [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def child():
+    """Proceso medido: escribe en stdout los tiempos en JSON."""
+    spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+    os.environ["FIREBASE_BACKEND"] = "memory"
+    import asyncio
+
+    import httpx
+
+    from app.main import app
+    from benchmarks.bench_load import PASSWORD, _email, _uid, seed
+
+    imported_at = time.time()
+    # los datos de prueba no forman parte del arranque
+    seed(1)
+    seeded_at = time.time()
+
+    async def run():
+        await app.router.startup()
+        ready_at = time.time()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            ready = await client.get("/api/health/ready")
+            login = await client.post("/api/auth/login", json={"email": _email(_uid(0)), "password": PASSWORD})
+            token = login.json()["auth"]
+            level = await client.get("/api/levels/1", headers={"Authorization": f"Bearer {token}"})
+        served_at = time.time()
+        await app.router.shutdown()
+        return ready.status_code, level.status_code, ready_at, served_at
+
+    ready_status, level_status, ready_at, served_at = asyncio.run(run())
+    print(json.dumps({
+        "import": imported_at - spawned_at,
+        "startup": ready_at - seeded_at,
+        "first_request": served_at - ready_at,
+        "total": served_at - spawned_at - (seeded_at - imported_at),
+        "ready_status": ready_status,
+        "level_status": level_status,
+    }))
+
+
+def main(runs: int):
+    results = []
+    for _ in range(runs):
+        env = dict(os.environ, BENCH_SPAWNED_AT=repr(time.time()))
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_cold_start", "--child"],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"ejecuciones: {runs}")
+    for phase in ("import", "startup", "first_request", "total"):
+        values = [result[phase] * 1000 for result in results]
+        print(f"{phase:<14}: mediana {statistics.median(values):8.1f} ms   max {max(values):8.1f} ms")
+    statuses = {(result["ready_status"], result["level_status"]) for result in results}
+    print(f"codigos (ready, nivel): {sorted(statuses)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+    else:
+        main(args.runs)
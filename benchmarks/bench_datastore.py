@@ -0,0 +1,97 @@
+"""
+Benchmark de la capa de acceso a datos (app.config.datastore).
+
+Simula un cliente de Firestore cuyas lecturas bloquean el hilo durante una
+latencia fija y compara el rendimiento de llamar al cliente directamente desde
+el event loop (comportamiento anterior) con el de DataStore, para distintos
+numeros de clientes concurrentes.
+
+Uso:
+    python -m benchmarks.bench_datastore [--latency-ms 20] [--requests 200]
+"""
+import argparse
+import asyncio
+import time
+
+from app.config.datastore import DataStore
+
+
+class _SlowSnapshot:
+    exists = True
+
+    def to_dict(self):
+        return {"level_id": 1}
+
+
+class _SlowDocument:
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def get(self):
+        time.sleep(self._latency)
+        return _SlowSnapshot()
+
+
+class _SlowCollection:
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def document(self, doc_id: str):
+        return _SlowDocument(self._latency)
+
+
+class SlowClient:
+    """Cliente falso: cada lectura bloquea `latency` segundos, como un round trip real."""
+
+    def __init__(self, latency: float):
+        self._latency = latency
+
+    def collection(self, name: str):
+        return _SlowCollection(self._latency)
+
+
+async def _run_clients(handler, concurrency: int, total_requests: int) -> float:
+    queue = asyncio.Queue()
+    for i in range(total_requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await handler()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def main(latency_ms: float, total_requests: int):
+    latency = latency_ms / 1000
+    client = SlowClient(latency)
+    store = DataStore(client_factory=lambda: client, max_workers=64, default_limit=32)
+
+    async def blocking_handler():
+        # lo que hacian los servicios: llamada sincrona dentro de una corrutina
+        client.collection("users").document("uid").get()
+
+    async def datastore_handler():
+        await store.get("users", "uid")
+
+    print(f"latencia simulada: {latency_ms} ms, peticiones: {total_requests}")
+    print(f"{'clientes':>8} | {'bloqueante req/s':>16} | {'datastore req/s':>15}")
+    for concurrency in (1, 2, 4, 8, 16, 32):
+        blocking = await _run_clients(blocking_handler, concurrency, total_requests)
+        offloaded = await _run_clients(datastore_handler, concurrency, total_requests)
+        print(f"{concurrency:>8} | {total_requests / blocking:>16.1f} | {total_requests / offloaded:>15.1f}")
+    store.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.latency_ms, args.requests))
@@ -0,0 +1,303 @@
+"""
+Prueba de carga de todos los routers de app.main sobre el backend en memoria
+(FIREBASE_BACKEND=memory), sin red ni credenciales.
+
+Cada jugador simulado inicia sesion y repite un recorrido tipico: listar y abrir
+niveles, autoguardar y recuperar el estado, enviar comandos (aciertos y fallos)
+y lotes, registrar y consultar progreso, ver estadisticas y salir. Ademas hay
+registros de usuarios nuevos y operaciones de administracion.
+
+Informa de:
+    - peticiones por segundo de toda la prueba
+    - latencia p50/p95/p99 por ruta
+    - operaciones de Firestore por peticion (lecturas, escrituras, consultas),
+      medidas en una pasada secuencial para poder atribuirlas a cada ruta
+
+Uso:
+    python -m benchmarks.bench_load [--players 50] [--rounds 5] [--json resultados.json]
+"""
+import os
+
+# la prueba siempre va contra el backend en memoria
+os.environ["FIREBASE_BACKEND"] = "memory"
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.config import backend
+from app.main import app
+
+COMMAND_LEVELS = 8
+POTION_LEVELS = 2
+PASSWORD = "Bench1234!"
+ADMIN_UID = "bench-admin"
+
+
+def _level(level_id: int) -> Dict[str, Any]:
+    level = {
+        "level_id": level_id,
+        "name": f"Nivel {level_id}",
+        "description": f"Nivel {level_id} de la prueba de carga",
+        "max_score": 100,
+        "order": level_id,
+        "estimated_time": 10,
+        "potions_config": {},
+        "listCommands": {"ESTANTE": {"1": f"ESTANTE{level_id}", "2": "SALUD"}, "condicion": "IF"},
+    }
+    if level_id > COMMAND_LEVELS:
+        level.update(potions_config={"pocion_vida": 2, "pocion_mana": 1}, perfect_score=3, listCommands={})
+    return level
+
+
+def _expected_commands(level_id: int) -> List[str]:
+    return [f"ESTANTE{level_id}", "SALUD", "IF"]
+
+
+def _uid(player: int) -> str:
+    return f"bench-player-{player}"
+
+
+def _email(uid: str) -> str:
+    return f"{uid}@bench.devquest"
+
+
+def seed(players: int):
+    """Usuarios (jugadores y un administrador) y niveles iniciales."""
+    firestore = backend.memory_firestore()
+    auth = backend.memory_auth()
+    firestore.reset()
+    auth.reset()
+    now = datetime.utcnow()
+    documents = {}
+    for level_id in range(1, COMMAND_LEVELS + POTION_LEVELS + 1):
+        documents[f"levels/Level{level_id}"] = _level(level_id)
+    documents["counters/levels"] = {"last_id": COMMAND_LEVELS + POTION_LEVELS}
+    for uid, role in [(_uid(player), "user") for player in range(players)] + [(ADMIN_UID, "admin")]:
+        auth.create_user(uid=uid, email=_email(uid), password=PASSWORD, display_name=uid)
+        auth.set_custom_user_claims(uid, {"role": role})
+        documents[f"users/{uid}"] = {
+            "email": _email(uid),
+            "username": uid,
+            "registration_date": now,
+            "premium": False,
+            "role": role,
+            "last_login": now,
+            # los niveles de pociones se pueden jugar desde el principio
+            "unlocked_levels": [1] + list(range(COMMAND_LEVELS + 1, COMMAND_LEVELS + POTION_LEVELS + 1)),
+        }
+    firestore.load(documents)
+    firestore.ops.reset()
+
+
+class Recorder:
+    """Latencias y codigos de estado por ruta."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, route: str, method: str, url: str, token: Optional[str] = None, **kwargs) -> httpx.Response:
+        headers = {"Authorization": f"Bearer {token}"} if token else None
+        start = time.perf_counter()
+        response = await client.request(method, url, headers=headers, **kwargs)
+        self.latencies[route].append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            self.errors[route] += 1
+        return response
+
+
+async def _login(recorder: Recorder, client: httpx.AsyncClient, uid: str) -> str:
+    response = await recorder.request(client, "POST /api/auth/login", "POST", "/api/auth/login", json={"email": _email(uid), "password": PASSWORD})
+    response.raise_for_status()
+    return response.json()["auth"]
+
+
+async def player_session(recorder: Recorder, client: httpx.AsyncClient, player: int, rounds: int, rng: random.Random):
+    """Recorrido de un jugador: sesion y varias rondas de juego."""
+    token = await _login(recorder, client, _uid(player))
+    await recorder.request(client, "POST /api/auth/verify-token", "POST", "/api/auth/verify-token", token)
+    level_id = 1
+    for round_number in range(rounds):
+        await recorder.request(client, "GET /api/levels/", "GET", "/api/levels/", token)
+        await recorder.request(client, "GET /api/levels/{level_id}", "GET", f"/api/levels/{level_id}", token)
+        response = await recorder.request(
+            client, "POST /api/game/save-level-state", "POST", "/api/game/save-level-state", token,
+            json={"level_id": level_id, "state": {"round": round_number, "blocks": [f"b{i}" for i in range(20)]}},
+        )
+        version = response.json().get("version", 1)
+        await recorder.request(
+            client, "POST /api/game/save-level-state", "POST", "/api/game/save-level-state", token,
+            json={"level_id": level_id, "patch": [{"op": "replace", "path": "/round", "value": round_number + 1}], "base_version": version},
+        )
+        await recorder.request(client, "GET /api/game/level-state/{level_id}", "GET", f"/api/game/level-state/{level_id}", token)
+        await recorder.request(
+            client, "POST /api/game/validate-commands", "POST", "/api/game/validate-commands", token,
+            json={"level_id": level_id, "list_commands": ["WHILE"]},
+        )
+        response = await recorder.request(
+            client, "POST /api/game/validate-commands", "POST", "/api/game/validate-commands", token,
+            json={"level_id": level_id, "list_commands": _expected_commands(level_id)},
+        )
+        if response.status_code == 200 and response.json().get("correct"):
+            level_id = min(level_id + 1, COMMAND_LEVELS)
+        potion_level = rng.randint(COMMAND_LEVELS + 1, COMMAND_LEVELS + POTION_LEVELS)
+        await recorder.request(
+            client, "POST /api/game/submit-batch", "POST", "/api/game/submit-batch", token,
+            json={"items": [
+                {"level_id": level_id, "list_commands": _expected_commands(level_id)},
+                {"level_id": potion_level, "potions": {"pocion_vida": 2, "pocion_mana": 1}, "bloques_utilizados": ["A", "B"]},
+            ]},
+        )
+        await recorder.request(client, "POST /api/progress/", "POST", "/api/progress/", token, json={"level_id": level_id, "score": rng.randint(10, 100)})
+        await recorder.request(client, "GET /api/progress/", "GET", "/api/progress/", token)
+        await recorder.request(client, "GET /api/progress/?limit=", "GET", "/api/progress/", token, params={"limit": 5})
+        await recorder.request(client, "GET /api/progress/?stream=", "GET", "/api/progress/", token, params={"stream": True})
+        await recorder.request(client, "GET /api/game/level-statistics/{level_id}", "GET", f"/api/game/level-statistics/{level_id}", token)
+        await recorder.request(
+            client, "GET /api/game/level-statistics/{level_id}/progress", "GET", f"/api/game/level-statistics/{level_id}/progress", token,
+            params={"limit": 20},
+        )
+        await recorder.request(client, "POST /api/game/validate-code", "POST", "/api/game/validate-code", token, json={"level_id": level_id, "code": "print(1)", "script": {}})
+        await recorder.request(client, "GET /api/", "GET", "/api/")
+    await recorder.request(client, "POST /api/game/exit", "POST", "/api/game/exit", token)
+
+
+async def admin_session(recorder: Recorder, client: httpx.AsyncClient, registrations: int):
+    """Altas de usuarios, creacion de niveles y cambios de rol."""
+    token = await _login(recorder, client, ADMIN_UID)
+    for index in range(registrations):
+        email = f"bench-new-{index}-{int(time.time() * 1000)}@bench.devquest"
+        await recorder.request(
+            client, "POST /api/auth/register", "POST", "/api/auth/register",
+            json={"email": email, "password": PASSWORD, "username": f"nuevo{index}"},
+        )
+        level = {"name": f"Nivel extra {index}", "description": "Creado en la prueba de carga", "max_score": 100, "order": 100 + index, "estimated_time": 5}
+        await recorder.request(client, "POST /api/levels/", "POST", "/api/levels/", token, json=level)
+        await recorder.request(client, "POST /api/levels/bulk", "POST", "/api/levels/bulk", token, json=[level, level])
+        await recorder.request(client, "PUT /api/auth/users/{uid}/role", "PUT", f"/api/auth/users/{_uid(index)}/role", token, json={"role": "user"})
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(percent / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+async def _run(players: int, rounds: int, registrations: int, seed_value: int) -> Recorder:
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        rng = random.Random(seed_value)
+        await asyncio.gather(
+            admin_session(recorder, client, registrations),
+            *(player_session(recorder, client, player, rounds, random.Random(rng.random())) for player in range(players)),
+        )
+    return recorder
+
+
+async def _ops_per_route(players: int) -> Dict[str, Dict[str, float]]:
+    """
+    Operaciones de Firestore de cada ruta, con un solo jugador y peticiones de
+    una en una para poder atribuirlas sin mezclar las de otras peticiones.
+    """
+    firestore = backend.memory_firestore()
+    ops: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    counts: Dict[str, int] = defaultdict(int)
+
+    class CountingRecorder(Recorder):
+        async def request(self, client, route, method, url, token=None, **kwargs):
+            before = firestore.ops.totals()
+            response = await super().request(client, route, method, url, token, **kwargs)
+            # espera a que terminen las escrituras en segundo plano de esta peticion
+            await asyncio.sleep(0)
+            after = firestore.ops.totals()
+            counts[route] += 1
+            for kind, value in after.items():
+                ops[route][kind] += value - before[kind]
+            return response
+
+    recorder = CountingRecorder()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await player_session(recorder, client, players - 1, 2, random.Random(0))
+        await admin_session(recorder, client, 1)
+    return {route: {kind: value / counts[route] for kind, value in kinds.items()} for route, kinds in ops.items()}
+
+
+def report(recorder: Recorder, elapsed: float, ops: Dict[str, Dict[str, float]], totals: Dict[str, int]) -> Dict[str, Any]:
+    total_requests = sum(len(values) for values in recorder.latencies.values())
+    routes = {}
+    for route in sorted(recorder.latencies):
+        values = recorder.latencies[route]
+        route_ops = ops.get(route, {})
+        routes[route] = {
+            "requests": len(values),
+            "errors_5xx": recorder.errors.get(route, 0),
+            "p50_ms": _percentile(values, 50) * 1000,
+            "p95_ms": _percentile(values, 95) * 1000,
+            "p99_ms": _percentile(values, 99) * 1000,
+            "reads_per_request": route_ops.get("reads", 0.0),
+            "writes_per_request": route_ops.get("writes", 0.0),
+            "queries_per_request": route_ops.get("queries", 0.0),
+        }
+    return {
+        "requests": total_requests,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": total_requests / elapsed if elapsed else 0.0,
+        "firestore_ops_per_request": {kind: value / total_requests for kind, value in totals.items()} if total_requests else {},
+        "routes": routes,
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"peticiones: {result['requests']} en {result['elapsed_seconds']:.2f}s -> {result['throughput_rps']:.1f} peticiones/s")
+    print("operaciones de Firestore por peticion (media de la prueba): " + ", ".join(
+        f"{kind} {value:.2f}" for kind, value in result["firestore_ops_per_request"].items()
+    ))
+    print()
+    header = f"{'ruta':<52} {'n':>6} {'5xx':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'lect':>6} {'escr':>6} {'cons':>6}"
+    print(header)
+    print("-" * len(header))
+    for route, row in result["routes"].items():
+        print(
+            f"{route:<52} {row['requests']:>6} {row['errors_5xx']:>4} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+            f" {row['reads_per_request']:>6.2f} {row['writes_per_request']:>6.2f} {row['queries_per_request']:>6.2f}"
+        )
+
+
+async def main(players: int, rounds: int, registrations: int, seed_value: int, output: Optional[str]):
+    seed(players)
+    await app.router.startup()
+    try:
+        start = time.perf_counter()
+        recorder = await _run(players, rounds, registrations, seed_value)
+        elapsed = time.perf_counter() - start
+        totals = backend.memory_firestore().ops.totals()
+        ops = await _ops_per_route(players)
+    finally:
+        await app.router.shutdown()
+    result = report(recorder, elapsed, ops, totals)
+    print_report(result)
+    if output:
+        with open(output, "w", encoding="utf-8") as handle:
+            json.dump(result, handle, indent=2)
+        print(f"\nresultados guardados en {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=50, help="jugadores simulados concurrentes")
+    parser.add_argument("--rounds", type=int, default=5, help="rondas de juego por jugador")
+    parser.add_argument("--registrations", type=int, default=5, help="altas de usuarios y niveles del administrador")
+    parser.add_argument("--seed", type=int, default=1, help="semilla de la parte aleatoria del recorrido")
+    parser.add_argument("--json", dest="output", help="guardar los resultados en este fichero JSON")
+    args = parser.parse_args()
+    asyncio.run(main(args.players, args.rounds, args.registrations, args.seed, args.output))
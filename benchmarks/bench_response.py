@@ -0,0 +1,104 @@
+"""
+Benchmark de la serializacion de respuestas grandes (app.config.fast_response).
+
+Construye respuestas de estadisticas de nivel (LevelStatisticsResponse) con
+distinto numero de registros de progreso, con fechas de Firestore
+(DatetimeWithNanoseconds), y compara:
+
+  - actual: validacion con el response_model, jsonable_encoder y JSONResponse,
+    igual que hace FastAPI con la ruta normal;
+  - rapida: fast_json_response sin compresion (sin revalidar, con orjson si
+    esta instalado);
+  - rapida+gzip: fast_json_response comprimiendo la respuesta.
+
+Uso:
+    python -m benchmarks.bench_response [--records 10 100 1000 5000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import timedelta, timezone
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from starlette.requests import Request
+
+from app.config import fast_response
+from app.game.schemas import LevelStatisticsResponse
+from app.main import app
+
+STATISTICS_PATH = "/api/game/level-statistics/{level_id}"
+
+
+def _statistics(records: int):
+    rng = random.Random(records)
+    start = DatetimeWithNanoseconds(2024, 1, 1, tzinfo=timezone.utc)
+    progress = []
+    for i in range(records):
+        started = start + timedelta(minutes=i, microseconds=rng.randint(0, 999999))
+        progress.append({
+            "progress_id": f"p{i:06d}",
+            "user_id": f"user-{rng.randint(0, 999):03d}",
+            "level_id": 3,
+            "score": rng.randint(0, 100),
+            "stars": rng.randint(0, 3),
+            "attempts": rng.randint(1, 20),
+            "start_date": started,
+            "completion_date": started + timedelta(seconds=rng.randint(30, 900)),
+            "commands": [rng.choice(["ESTANTE1", "ESTANTE2", "IF", "SALUD"]) for _ in range(4)],
+        })
+    return {
+        "total_attempts": records,
+        "completed_count": records // 2,
+        "average_stars": 1.8,
+        "three_stars_count": records // 5,
+        "progress": progress,
+        "levels_completed": [3],
+        "next_cursor": None,
+    }
+
+
+def _request(accept_encoding: str) -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+
+def _timed(function, repeat: int):
+    body = function()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return body, (time.perf_counter() - start) / repeat
+
+
+def main(records_list, repeat: int):
+    route = next(route for route in app.routes if isinstance(route, APIRoute) and route.path == STATISTICS_PATH)
+    field = route.secure_cloned_response_field
+    loop = asyncio.new_event_loop()
+
+    def current(content):
+        encoded = loop.run_until_complete(serialize_response(field=field, response_content=content))
+        return JSONResponse(encoded).body
+
+    plain, compressed = _request("identity"), _request("gzip")
+    print(f"serializador: {'orjson' if fast_response.orjson is not None else 'json'}, umbral de compresion {fast_response.FAST_RESPONSE_COMPRESSION_THRESHOLD} bytes")
+    print(f"{'registros':>9} {'ruta':>12} {'ms':>9} {'bytes':>10} {'x':>6}")
+    for records in records_list:
+        content = _statistics(records)
+        reference, reference_time = _timed(lambda: current(content), repeat)
+        for label, request in (("actual", None), ("rapida", plain), ("rapida+gzip", compressed)):
+            if request is None:
+                body, elapsed = reference, reference_time
+            else:
+                body, elapsed = _timed(lambda: fast_response.fast_json_response(request, content, LevelStatisticsResponse).body, repeat)
+            print(f"{records:>9} {label:>12} {elapsed * 1000:>9.3f} {len(body):>10} {reference_time / elapsed:>6.1f}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    main(args.records, args.repeat)
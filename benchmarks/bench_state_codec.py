@@ -0,0 +1,69 @@
+"""
+Benchmark de la codificacion de estados de nivel (app.game.state_codec).
+
+Para estados representativos (pequeño, tablero mediano y tablero grande con
+historial de movimientos) compara el tamaño guardado y el tiempo de codificar y
+decodificar con cada combinacion disponible de serializacion y compresion.
+La referencia "json" es el tamaño del estado como JSON compacto, parecido a lo
+que ocupaba como mapa de Firestore.
+
+Uso:
+    python -m benchmarks.bench_state_codec [--repeat 200]
+"""
+import argparse
+import random
+import time
+
+from app.game.state_codec import BLOB_FIELD, StateCodec, _compressors, _serializers
+
+
+def _representative_states():
+    rng = random.Random(7)
+    small = {"posicion": {"x": 3, "y": 4}, "inventario": ["llave", "pocion_vida"], "vidas": 3}
+    medium = {
+        "tablero": [[rng.choice(["", "muro", "estante", "pocion"]) for _ in range(20)] for _ in range(20)],
+        "bloques": [{"tipo": rng.choice(["MOVER", "GIRAR", "COLOCAR"]), "arg": rng.randint(0, 9)} for _ in range(60)],
+        "jugador": {"x": 0, "y": 0, "orientacion": "N"},
+    }
+    large = {
+        "tablero": [[rng.choice(["", "muro", "estante", "pocion"]) for _ in range(100)] for _ in range(100)],
+        "historial": [
+            {"t": i, "accion": rng.choice(["MOVER", "GIRAR", "COLOCAR"]), "x": rng.randint(0, 99), "y": rng.randint(0, 99)}
+            for i in range(2000)
+        ],
+    }
+    return {"pequeño": small, "mediano": medium, "grande": large}
+
+
+def _measure(codec: StateCodec, state, repeat: int):
+    encoded = codec.encode(state)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        codec.encode(state)
+    encode_time = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        codec.decode(encoded)
+    decode_time = (time.perf_counter() - start) / repeat
+    return len(encoded[BLOB_FIELD]), encode_time, decode_time
+
+
+def main(repeat: int):
+    configs = [(serializer, "none") for serializer in _serializers()]
+    configs += [(serializer, compression) for serializer in _serializers() for compression in _compressors()]
+    for name, state in _representative_states().items():
+        reference = len(StateCodec("json", "none", max_bytes=1 << 30).encode(state)[BLOB_FIELD])
+        print(f"\nestado {name}: {reference} bytes como JSON")
+        print(f"{'codificacion':>16} {'bytes':>9} {'ratio':>7} {'codificar us':>13} {'decodificar us':>15}")
+        for serializer, compression in configs:
+            codec = StateCodec(serializer, compression, threshold=0, max_bytes=1 << 30)
+            size, encode_time, decode_time = _measure(codec, state, repeat)
+            label = serializer if compression == "none" else f"{serializer}+{compression}"
+            print(f"{label:>16} {size:>9} {size / reference:>7.2f} {encode_time * 1e6:>13.1f} {decode_time * 1e6:>15.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,93 @@
+import os
+
+# los tests usan el backend en memoria salvo que se pida otro (FIREBASE_BACKEND=firebase)
+os.environ.setdefault("FIREBASE_BACKEND", "memory")
+
+from datetime import datetime
+
+import pytest
+from app.config import backend
+from app.auth.token_cache import token_cache
+from app.game.autosave import state_buffer
+from app.levels.catalog import level_catalog
+
+TEST_EMAIL = "testuser5@example.com"
+TEST_PASSWORD = "Test1234!"
+TEST_UID = "testuser5"
+
+LEVELS = {
+    "levels/Level1": {
+        "level_id": 1,
+        "name": "Nivel 1: Introducción",
+        "description": "Primer nivel para familiarizarse con los controles",
+        "max_score": 100,
+        "order": 1,
+        "estimated_time": 15,
+        "potions_config": {},
+        "listCommands": {"ESTANTE": {"1": "ESTANTE1", "2": "ESTANTE2"}, "condicion": "IF"},
+    },
+    "levels/Level2": {
+        "level_id": 2,
+        "name": "Nivel 2: Bucles",
+        "description": "Repetir acciones con bucles",
+        "max_score": 100,
+        "order": 2,
+        "estimated_time": 20,
+        "potions_config": {},
+        "listCommands": {"bucle": "WHILE", "accion": "SALUD"},
+    },
+    "levels/Level3": {
+        "level_id": 3,
+        "name": "Nivel 3: Pociones",
+        "description": "Preparar las pociones indicadas",
+        "max_score": 100,
+        "order": 3,
+        "estimated_time": 20,
+        "potions_config": {"pocion_vida": 2, "pocion_mana": 1},
+        "perfect_score": 3,
+        "listCommands": {},
+    },
+}
+
+
+def seed_memory_backend():
+    """Datos iniciales del backend en memoria: un usuario de prueba y tres niveles."""
+    firestore = backend.memory_firestore()
+    auth = backend.memory_auth()
+    firestore.reset()
+    auth.reset()
+    auth.create_user(uid=TEST_UID, email=TEST_EMAIL, password=TEST_PASSWORD, display_name="testuser5")
+    auth.set_custom_user_claims(TEST_UID, {"role": "user"})
+    now = datetime.utcnow()
+    firestore.load({
+        **LEVELS,
+        f"users/{TEST_UID}": {
+            "email": TEST_EMAIL,
+            "username": "testuser5",
+            "registration_date": now,
+            "premium": False,
+            "role": "user",
+            "last_login": now,
+            "unlocked_levels": [1],
+        },
+        "progress/seed-progress-1": {
+            "user_id": TEST_UID,
+            "level_id": 1,
+            "score": 80,
+            "start_date": now,
+            "completion_date": now,
+        },
+    })
+
+
+@pytest.fixture(autouse=True)
+def memory_backend():
+    """Cada test parte de los mismos datos, sin estado de tests anteriores."""
+    if not backend.use_memory_backend():
+        yield None
+        return
+    seed_memory_backend()
+    token_cache.clear()
+    state_buffer._entries.clear()
+    level_catalog.loaded_at = None
+    yield backend.memory_firestore()
@@ -0,0 +1,101 @@
+from datetime import date, datetime, timedelta
+import asyncio
+import pytest
+from app.auth.dependencies import UserContext
+from app.game import statistics
+from app.game.reconcile_statistics import reconcile_level
+from app.progress.service import ProgressService
+from app.game.service import GameService
+from app.progress.compact_attempts import compact
+from tests.conftest import TEST_UID
+
+COMMANDS = ["ESTANTE1", "ESTANTE2", "IF"]
+
+def _log(stored, day):
+    prefix = f"attempt_log/{day}/attempts/"
+    return [data for path, data in stored.items() if path.startswith(prefix)]
+
+@pytest.mark.asyncio
+async def test_attempts_are_logged_and_failures_counted(memory_backend):
+    user = UserContext({"uid": TEST_UID})
+    await GameService.validate_commands(user, 1, COMMANDS)
+    await GameService.validate_commands(user, 1, ["NADA"])
+    await GameService.validate_potion_level(TEST_UID, 3, {}, [])
+
+    stored = memory_backend.dump()
+    log = _log(stored, datetime.utcnow().strftime("%Y-%m-%d"))
+    assert sorted((entry["level_id"], entry["kind"], entry["correct"]) for entry in log) == [
+        (1, "commands", False), (1, "commands", True), (3, "potions", False),
+    ]
+    # el fallo cuenta como intento en las estadisticas, sin tocar el registro de progress
+    assert statistics.statistics_from_aggregates(await statistics.read_aggregates(1))["total_attempts"] == 2
+    assert stored[f"progress/{TEST_UID}_1"]["attempts"] == 1
+    assert f"progress/{TEST_UID}_3" not in stored
+
+@pytest.mark.asyncio
+async def test_compaction_folds_old_failures_and_applies_retention(memory_backend):
+    await GameService.validate_commands(UserContext({"uid": TEST_UID}), 1, COMMANDS)
+    old, recent = "2024-03-01", "2024-03-30"
+    failure = {"user_id": TEST_UID, "correct": False, "stars": 0, "kind": "commands", "at": datetime(2024, 3, 1)}
+    memory_backend.load({
+        f"attempt_log/{old}/attempts/a": {**failure, "level_id": 1},
+        f"attempt_log/{old}/attempts/b": {**failure, "level_id": 1},
+        f"attempt_log/{old}/attempts/c": {**failure, "level_id": 2},
+        f"attempt_log/{old}/attempts/d": {**failure, "level_id": 1, "correct": True, "stars": 3},
+        f"attempt_log/{recent}/attempts/e": {**failure, "level_id": 1},
+    })
+
+    totals = await compact(retention_days=7, chunk_size=2, today=date(2024, 4, 1), since=date(2024, 2, 28))
+    again = await compact(retention_days=7, today=date(2024, 4, 1))
+
+    stored = memory_backend.dump()
+    assert totals == {"days": 26, "attempts": 4, "failed": 3} and again["attempts"] == 0
+    assert not _log(stored, old) and len(_log(stored, recent)) == 1
+    # los fallos pasan al contador de cada (usuario, nivel), tambien sin registro de progress
+    assert stored[f"attempt_failures/{TEST_UID}_1"]["failed_attempts"] == 2
+    assert stored[f"attempt_failures/{TEST_UID}_2"] == {"user_id": TEST_UID, "level_id": 2, "failed_attempts": 1}
+    assert "failed_attempts" not in stored[f"progress/{TEST_UID}_1"]
+    assert stored["attempt_log_state/compaction"]["compacted_through"] == "2024-03-24"
+
+@pytest.mark.asyncio
+async def test_rebuilds_count_compacted_and_logged_failures(memory_backend):
+    user = UserContext({"uid": TEST_UID})
+    await GameService.validate_commands(user, 1, COMMANDS)
+    await GameService.validate_commands(user, 1, ["NADA"])
+    # un fallo ya compactado en un nivel que el usuario nunca ha completado
+    memory_backend.load({f"attempt_failures/{TEST_UID}_2": {"user_id": TEST_UID, "level_id": 2, "failed_attempts": 4}})
+    live = memory_backend.dump()[f"progress_summaries/{TEST_UID}"]
+
+    rebuilt = await ProgressService.rebuild_summary(TEST_UID)
+    level_1, level_2 = await reconcile_level(1), await reconcile_level(2)
+
+    # el fallo del registro cuenta al escribirse y en las reconstrucciones
+    assert live["failed_attempts"] == {"1": 1}
+    assert rebuilt["failed_attempts"] == {"1": 1, "2": 4} and rebuilt["total_failed_attempts"] == 5
+    # nivel 1: el registro sembrado, el intento correcto y el fallo
+    assert level_1["attempts"] == 3 and level_1["completions"] == 1
+    assert level_2["attempts"] == 4 and level_2["completions"] == 0
+
+    # compactar mueve los fallos del registro a los contadores sin cambiar los totales
+    today = datetime.utcnow().date()
+    await compact(retention_days=0, since=today, today=today + timedelta(days=1))
+    assert (await ProgressService.rebuild_summary(TEST_UID))["failed_attempts"] == {"1": 1, "2": 4}
+    assert not _log(memory_backend.dump(), datetime.utcnow().strftime("%Y-%m-%d"))
+    assert (await reconcile_level(1))["attempts"] == 3
+
+@pytest.mark.asyncio
+async def test_record_counts_successful_attempts_and_counters_count_failures(memory_backend):
+    user = UserContext({"uid": TEST_UID})
+    # intentos correctos a la vez: la transaccion se reintenta y ninguno se pierde
+    await asyncio.gather(*(ProgressService.record_progress(TEST_UID, 1, score) for score in (10, 50, 30, 20)))
+    await GameService.validate_commands(user, 1, ["NADA"])
+    await GameService.validate_commands(user, 1, ["NADA"])
+    today = datetime.utcnow().date()
+    await compact(retention_days=0, since=today, today=today + timedelta(days=1))
+
+    stored = memory_backend.dump()
+    record = stored[f"progress/{TEST_UID}_1"]
+    # el registro guarda la mejor marca y los intentos con puntuacion, no los fallos
+    assert record["attempts"] == 4 and record["score"] == 50 and "failed_attempts" not in record
+    assert stored[f"attempt_failures/{TEST_UID}_1"]["failed_attempts"] == 2
+    assert stored[f"progress_summaries/{TEST_UID}"]["failed_attempts"] == {"1": 2}
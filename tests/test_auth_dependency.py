@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from app.auth import dependencies as dependencies_module
+from app.auth.dependencies import UserContext, get_current_user
+from app.auth.service import AuthService
+from app.config.datastore import DataStore
+from app.levels.service import LevelService
+
+class _Snapshot:
+    exists = True
+
+    def to_dict(self):
+        return {"role": "admin", "unlocked_levels": [1, 2]}
+
+class _Users:
+    def __init__(self):
+        self.reads = 0
+
+    def document(self, doc_id):
+        return self
+
+    def get(self):
+        self.reads += 1
+        return _Snapshot()
+
+class _Client:
+    def __init__(self, users):
+        self.users = users
+
+    def collection(self, name):
+        return self.users
+
+async def _same_user(user: UserContext = Depends(get_current_user)):
+    return user
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/check")
+    async def check(user: UserContext = Depends(get_current_user), again: UserContext = Depends(_same_user)):
+        admin, unlocked, _ = await asyncio.gather(LevelService.is_admin(user), again.unlocked_levels(), user.data())
+        return {"same": user is again, "admin": admin, "unlocked": unlocked}
+
+    return app
+
+@pytest.mark.asyncio
+async def test_token_and_user_document_are_resolved_once_per_request(monkeypatch):
+    users = _Users()
+    monkeypatch.setattr(dependencies_module, "datastore", DataStore(client_factory=lambda: _Client(users)))
+    calls = []
+
+    async def verify(token):
+        calls.append(token)
+        return {"uid": "u1", "email": "u1@example.com", "role": "admin"}
+
+    monkeypatch.setattr(AuthService, "verify_token", staticmethod(verify))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://test") as client:
+        response = await client.get("/check", headers={"Authorization": "Bearer abc"})
+        assert response.json() == {"same": True, "admin": True, "unlocked": [1, 2]}
+        assert calls == ["abc"] and users.reads == 1
+
+        await client.get("/check", headers={"Authorization": "Bearer abc"})
+        assert len(calls) == 2 and users.reads == 2
+
+        missing = await client.get("/check", headers={"Authorization": "Bearer "})
+        assert missing.status_code == 401
+
+@pytest.mark.asyncio
+async def test_is_admin_reads_role_claim_without_firestore(monkeypatch):
+    users = _Users()
+    monkeypatch.setattr(dependencies_module, "datastore", DataStore(client_factory=lambda: _Client(users)))
+
+    assert await LevelService.is_admin(UserContext({"uid": "a", "role": "admin"})) is True
+    assert await LevelService.is_admin(UserContext({"uid": "b"})) is False
+    assert users.reads == 0
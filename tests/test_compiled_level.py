@@ -0,0 +1,14 @@
+from app.levels.compiled import compile_level
+
+def test_compile_level_flattens_commands_once():
+    level = compile_level("Level1", {
+        "level_id": 1,
+        "listCommands": {"ESTANTE": {"a": "ESTANTE1", "b": "ESTANTE2"}, "cond": "IF"},
+        "potions_config": {"pocion_vida": 3},
+    })
+
+    assert level.commands == ("ESTANTE1", "ESTANTE2", "IF")
+    assert level.expected_commands == frozenset({"ESTANTE1", "ESTANTE2", "IF"})
+    assert level.potions_config == {"pocion_vida": 3}
+    assert level.perfect_score == 3
+    assert level.to_dict()["commands"] == ["ESTANTE1", "ESTANTE2", "IF"]
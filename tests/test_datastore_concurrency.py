@@ -0,0 +1,27 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.config.datastore import DataStore, parse_collection_limits
+
+@pytest.mark.asyncio
+async def test_datastore_respects_collection_limit():
+    lock = threading.Lock()
+    state = {"current": 0, "peak": 0}
+
+    def slow_call():
+        with lock:
+            state["current"] += 1
+            state["peak"] = max(state["peak"], state["current"])
+        time.sleep(0.02)
+        with lock:
+            state["current"] -= 1
+
+    store = DataStore(client_factory=lambda: None, max_workers=16, default_limit=8, limits={"progress": 2})
+    await asyncio.gather(*(store.run("progress", slow_call) for _ in range(10)))
+    store.shutdown()
+
+    assert state["peak"] == 2
+
+def test_parse_collection_limits():
+    assert parse_collection_limits("progress=8, levels=4,bad,users=x") == {"progress": 8, "levels": 4}
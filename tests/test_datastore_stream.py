@@ -0,0 +1,44 @@
+import pytest
+from app.config.datastore import DataStore
+
+class _Doc:
+    def __init__(self, doc_id):
+        self.id = doc_id
+
+class _Query:
+    def __init__(self, total):
+        self.total = total
+        self.pulled = 0
+
+    def where(self, *args):
+        return self
+
+    def order_by(self, field):
+        return self
+
+    def stream(self):
+        for i in range(self.total):
+            self.pulled += 1
+            yield _Doc(str(i))
+
+class _Client:
+    def __init__(self, query):
+        self.query = query
+
+    def collection(self, name):
+        return self.query
+
+@pytest.mark.asyncio
+async def test_stream_pulls_documents_in_batches():
+    query = _Query(total=25)
+    store = DataStore(client_factory=lambda: _Client(query))
+
+    ids = []
+    async for doc in store.stream("progress", [("user_id", "==", "u1")], order_by="__name__", batch_size=10):
+        ids.append(doc.id)
+        if len(ids) == 5:
+            # solo se ha pedido el primer bloque al iterador
+            assert query.pulled == 10
+    store.shutdown()
+
+    assert ids == [str(i) for i in range(25)]
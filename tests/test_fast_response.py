@@ -0,0 +1,63 @@
+import gzip
+import json
+from datetime import datetime, timezone
+import pytest
+from fastapi.encoders import jsonable_encoder
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from httpx import AsyncClient, ASGITransport
+from starlette.requests import Request
+from app.config import fast_response
+from app.game.schemas import LevelStatisticsResponse
+from app.main import app
+
+def _request(accept_encoding="gzip, deflate"):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", accept_encoding.encode())]})
+
+def _statistics(records):
+    date = DatetimeWithNanoseconds(2024, 5, 1, 10, 30, 0, 123456, tzinfo=timezone.utc)
+    return {
+        "total_attempts": records,
+        "completed_count": records,
+        "average_stars": 2.0,
+        "three_stars_count": 0,
+        "progress": [{"progress_id": f"p{i}", "level_id": 1, "score": i, "start_date": date, "completion_date": datetime(2024, 5, 2)} for i in range(records)],
+        "levels_completed": [1],
+        "next_cursor": None,
+        "interno": "no se envia",
+    }
+
+def test_fast_path_matches_the_validated_encoding():
+    content = _statistics(3)
+
+    response = fast_response.fast_json_response(_request("identity"), content, LevelStatisticsResponse)
+
+    expected = jsonable_encoder(LevelStatisticsResponse(**content))
+    assert json.loads(response.body) == expected
+    assert "interno" not in json.loads(response.body)
+    assert "content-encoding" not in response.headers
+
+def test_large_bodies_are_compressed_when_accepted():
+    content = _statistics(200)
+
+    compressed = fast_response.fast_json_response(_request(), content, LevelStatisticsResponse)
+    plain = fast_response.fast_json_response(_request("identity"), content, LevelStatisticsResponse)
+
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(compressed.body) == plain.body
+    assert len(compressed.body) < len(plain.body)
+
+@pytest.mark.asyncio
+async def test_statistics_endpoint_is_identical_with_fast_responses(monkeypatch):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login = await ac.post("/api/auth/login", json={"email": "testuser5@example.com", "password": "Test1234!"})
+        headers = {"Authorization": f"Bearer {login.json()['auth']}"}
+        url = "/api/game/level-statistics/1?include_progress=true"
+        validated = await ac.get(url, headers=headers)
+        monkeypatch.setattr(fast_response, "FAST_RESPONSES_ENABLED", True)
+        fast = await ac.get(url, headers=headers)
+
+    assert validated.status_code == fast.status_code == 200
+    assert fast.headers["vary"] == "Accept-Encoding"
+    assert fast.json() == validated.json()
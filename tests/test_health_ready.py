@@ -0,0 +1,66 @@
+import httpx
+import pytest
+from app.config import firebase
+from app.health import readiness as readiness_module
+from app.main import app
+
+def test_firebase_is_initialized_lazily(monkeypatch, tmp_path):
+    # importar el modulo no carga credenciales; el error aparece al inicializar
+    monkeypatch.setattr(firebase, "CERTIFICATE_PATH", str(tmp_path / "missing.json"))
+    monkeypatch.setattr(firebase, "_db", None)
+    with pytest.raises(FileNotFoundError):
+        firebase.initialize()
+
+@pytest.mark.asyncio
+async def test_ready_after_startup_warms_caches_and_reports_cold_start():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        before = await ac.get("/api/health/ready")
+        await app.router.startup()
+        try:
+            response = await ac.get("/api/health/ready")
+        finally:
+            await app.router.shutdown()
+
+    assert before.status_code == 503 and before.json()["status"] == "starting"
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready" and data["backend"] == "memory"
+    assert data["checks"]["firestore"]["ok"] is True
+    assert data["checks"]["level_catalog"]["levels"] == 3
+    assert data["checks"]["auth_certificates"]["keys"] == 1
+    for phase in ("import_seconds", "backend_init_seconds", "auth_warmup_seconds", "catalog_warmup_seconds", "startup_seconds"):
+        assert phase in data["cold_start"]
+
+@pytest.mark.asyncio
+async def test_ready_fails_when_firestore_does_not_answer(monkeypatch):
+    async def failing_get(collection, doc_id):
+        raise RuntimeError("deadline exceeded")
+
+    readiness = readiness_module.Readiness()
+    readiness.mark_ready()
+    monkeypatch.setattr(readiness_module.datastore, "get", failing_get)
+
+    ready, body = await readiness.check()
+
+    assert ready is False and body["status"] == "unavailable"
+    assert body["checks"]["firestore"] == {"ok": False, "latency_ms": body["checks"]["firestore"]["latency_ms"], "error": "unavailable"}
+    # el texto de la excepcion no se expone
+    assert "deadline" not in str(body)
+
+@pytest.mark.asyncio
+async def test_ready_reports_a_dead_level_listener(memory_backend, monkeypatch):
+    from app.levels.catalog import LevelCatalog
+    catalog = LevelCatalog()
+    monkeypatch.setattr(readiness_module, "level_catalog", catalog)
+    catalog.start_listener()
+    readiness = readiness_module.Readiness()
+    readiness.mark_ready()
+
+    _, body = await readiness.check()
+    assert body["checks"]["level_catalog"]["listening"] is True
+
+    memory_backend._unwatch(catalog._watch)
+    _, body = await readiness_module.Readiness().check()
+    assert body["checks"]["level_catalog"]["listening"] is False
+    catalog.stop_listener()
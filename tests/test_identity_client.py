@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+from app.auth.identity import IdentityToolkitClient
+
+@pytest.mark.asyncio
+async def test_sign_in_uses_configured_endpoint():
+    seen = {}
+
+    def handler(request):
+        seen["url"] = str(request.url)
+        return httpx.Response(200, json={"idToken": "token", "localId": "uid1"})
+
+    client = IdentityToolkitClient(base_url="http://stub.local/v1", transport=httpx.MockTransport(handler))
+    response = await client.sign_in_with_password("a@example.com", "secret", "KEY")
+    await client.close()
+
+    assert response.status_code == 200
+    assert response.json()["localId"] == "uid1"
+    assert seen["url"] == "http://stub.local/v1/accounts:signInWithPassword?key=KEY"
+
+@pytest.mark.asyncio
+async def test_sign_in_timeout_returns_503():
+    def handler(request):
+        raise httpx.ReadTimeout("timeout", request=request)
+
+    client = IdentityToolkitClient(base_url="http://stub.local/v1", transport=httpx.MockTransport(handler))
+    with pytest.raises(HTTPException) as exc:
+        await client.sign_in_with_password("a@example.com", "secret", "KEY")
+    await client.close()
+
+    assert exc.value.status_code == 503
+
+def test_loop_change_closes_previous_client():
+    import asyncio
+
+    def handler(request):
+        return httpx.Response(200, json={"idToken": "token", "localId": "uid1"})
+
+    client = IdentityToolkitClient(base_url="http://stub.local/v1", transport=httpx.MockTransport(handler))
+    asyncio.run(client.sign_in_with_password("a@example.com", "secret", "KEY"))
+    first = client._client
+
+    # en un loop nuevo se crea otro cliente y el anterior queda cerrado
+    asyncio.run(client.sign_in_with_password("a@example.com", "secret", "KEY"))
+    assert client._client is not first
+    assert first.is_closed
+    asyncio.run(client.close())
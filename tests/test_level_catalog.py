@@ -0,0 +1,90 @@
+import pytest
+from app.config.datastore import DataStore
+from app.levels import catalog as catalog_module
+from app.levels.catalog import LevelCatalog
+
+class _Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+class _Levels:
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+
+    def get(self):
+        self.reads += 1
+        return list(self.docs)
+
+class _Client:
+    def __init__(self, levels):
+        self.levels = levels
+
+    def collection(self, name):
+        return self.levels
+
+@pytest.mark.asyncio
+async def test_catalog_serves_levels_from_memory(monkeypatch):
+    levels = _Levels([
+        _Doc("Level2", {"level_id": 2, "name": "Dos"}),
+        _Doc("Level1", {"level_id": 1, "name": "Uno"}),
+    ])
+    monkeypatch.setattr(catalog_module, "datastore", DataStore(client_factory=lambda: _Client(levels)))
+    catalog = LevelCatalog(ttl=3600)
+
+    assert [lvl["level_id"] for lvl in await catalog.all()] == [1, 2]
+    assert (await catalog.get(2))["name"] == "Dos"
+    assert (await catalog.get_by_doc_id("Level1"))["name"] == "Uno"
+    assert await catalog.get(99) is None
+    assert levels.reads == 1
+
+    # las copias devueltas no alteran el catalogo
+    (await catalog.get(1))["name"] = "cambiado"
+    assert (await catalog.get(1))["name"] == "Uno"
+
+    catalog.upsert("3", {"level_id": 3, "name": "Tres"})
+    assert (await catalog.get(3))["name"] == "Tres"
+    assert levels.reads == 1
+
+@pytest.mark.asyncio
+async def test_catalog_reloads_after_ttl(monkeypatch):
+    levels = _Levels([_Doc("Level1", {"level_id": 1})])
+    monkeypatch.setattr(catalog_module, "datastore", DataStore(client_factory=lambda: _Client(levels)))
+    catalog = LevelCatalog(ttl=0)
+
+    await catalog.all()
+    await catalog.all()
+    assert levels.reads == 2
+
+@pytest.mark.asyncio
+async def test_catalog_cold_requests_share_one_load(monkeypatch):
+    import asyncio
+    levels = _Levels([_Doc("Level1", {"level_id": 1})])
+    monkeypatch.setattr(catalog_module, "datastore", DataStore(client_factory=lambda: _Client(levels)))
+    catalog = LevelCatalog(ttl=3600)
+
+    results = await asyncio.gather(*(catalog.all() for _ in range(5)))
+    assert all(len(result) == 1 for result in results)
+    assert levels.reads == 1
+
+@pytest.mark.asyncio
+async def test_catalog_falls_back_to_ttl_when_listener_dies(memory_backend):
+    catalog = LevelCatalog(ttl=0)
+    catalog.start_listener()
+    assert catalog.listening
+    assert not catalog.is_stale()
+
+    # el stream se cierra (p. ej. por un error): el catalogo vuelve a la recarga por TTL
+    memory_backend._unwatch(catalog._watch)
+    assert not catalog.listening
+    assert catalog.is_stale()
+
+    memory_backend.load({"levels/Level4": {"level_id": 4}})
+    assert (await catalog.get(4))["level_id"] == 4
+    # y se vuelve a suscribir
+    assert catalog.listening
+    catalog.stop_listener()
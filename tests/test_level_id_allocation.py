@@ -0,0 +1,44 @@
+import asyncio
+import time
+import pytest
+from app.config.datastore import DataStore
+from app.config.memory_backend import MemoryTransaction
+from app.levels import catalog as catalog_module
+from app.levels import service as service_module
+from app.levels.catalog import LevelCatalog
+from app.levels.schemas import LevelCreate
+from app.levels.service import LevelService
+
+class _OverlappingTransaction(MemoryTransaction):
+    def _record_read(self, path, version):
+        super()._record_read(path, version)
+        # fuerza que las transacciones concurrentes se solapen
+        time.sleep(0.005)
+
+@pytest.mark.asyncio
+async def test_concurrent_level_creation_never_duplicates_ids(memory_backend, monkeypatch):
+    # con tanta contencion hacen falta mas reintentos que los 5 por defecto
+    monkeypatch.setattr(memory_backend, "transaction", lambda max_attempts=5, read_only=False: _OverlappingTransaction(memory_backend, max_attempts=50))
+    store = DataStore(client_factory=lambda: memory_backend, max_workers=16, default_limit=16)
+    monkeypatch.setattr(service_module, "datastore", store)
+    monkeypatch.setattr(catalog_module, "datastore", store)
+    monkeypatch.setattr(service_module, "level_catalog", LevelCatalog(ttl=3600))
+
+    def level(n):
+        return LevelCreate(name=f"Nivel {n}", description="d", max_score=100, order=n, estimated_time=5)
+
+    single = [LevelService.create_level(level(n)) for n in range(8)]
+    bulk = [LevelService.create_levels([level(100 + n), level(200 + n)]) for n in range(4)]
+    results = await asyncio.gather(*single, *bulk)
+    store.shutdown()
+
+    ids = [r["level_id"] for r in results[:8]]
+    for block in results[8:]:
+        ids.extend(r["level_id"] for r in block)
+        assert block[1]["level_id"] == block[0]["level_id"] + 1
+
+    # los niveles 1 a 3 vienen de los datos iniciales
+    assert sorted(ids) == list(range(4, 4 + 16))
+    stored = memory_backend.dump()
+    assert stored["counters/levels"]["last_id"] == 19
+    assert all(f"levels/{level_id}" in stored for level_id in ids)
@@ -0,0 +1,69 @@
+import json
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.levels.catalog import level_catalog
+from app.levels.compiled import compile_level
+from app.levels.payloads import LevelPayloadCache, etag_matches
+from app.levels.schemas import LevelWithCompletion
+from app.main import app
+
+async def _token(ac):
+    response = await ac.post("/api/auth/login", json={"email": "testuser5@example.com", "password": "Test1234!"})
+    return response.json()["auth"]
+
+@pytest.mark.asyncio
+async def test_level_detail_has_strong_etag_and_answers_304():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = {"Authorization": f"Bearer {await _token(ac)}"}
+        first = await ac.get("/api/levels/1", headers=headers)
+        etag = first.headers["etag"]
+        again = await ac.get("/api/levels/1", headers={**headers, "If-None-Match": etag})
+        level_catalog.upsert("Level1", {**(await level_catalog.get_by_doc_id("Level1")), "name": "Nivel 1 (nuevo)"})
+        changed = await ac.get("/api/levels/1", headers={**headers, "If-None-Match": etag})
+
+    assert first.status_code == 200 and first.json()["commands"] == ["ESTANTE1", "ESTANTE2", "IF"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+    assert first.headers["cache-control"].startswith("private, max-age=")
+    assert again.status_code == 304 and again.content == b"" and again.headers["etag"] == etag
+    assert changed.status_code == 200 and changed.json()["name"] == "Nivel 1 (nuevo)"
+    assert changed.headers["etag"] != etag
+
+@pytest.mark.asyncio
+async def test_level_list_revalidates_with_etag():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        headers = {"Authorization": f"Bearer {await _token(ac)}"}
+        first = await ac.get("/api/levels/", headers=headers)
+        again = await ac.get("/api/levels/", headers={**headers, "If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert [level["level_id"] for level in first.json()] == [1, 2, 3]
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert again.status_code == 304
+
+def test_listing_overlays_completion_on_cached_items():
+    levels = [
+        compile_level("Level1", {"level_id": 1, "name": "Uno", "description": "d", "max_score": 100, "listCommands": {"a": "IF"}}),
+        compile_level("Level2", {"level_id": 2, "name": "Dos", "description": "d", "max_score": 100, "potions_config": {"pocion_vida": 1}}),
+    ]
+    cache = LevelPayloadCache()
+
+    body, etag = cache.listing(levels, [2])
+    other_body, other_etag = cache.listing(levels, [1, 2])
+
+    expected = [
+        LevelWithCompletion(level_id=1, name="Uno", description="d", max_score=100, potions_config={}, commands=["IF"], isCompleted=False).dict(),
+        LevelWithCompletion(level_id=2, name="Dos", description="d", max_score=100, potions_config={"pocion_vida": 1}, commands=[], isCompleted=True).dict(),
+    ]
+    assert json.loads(body) == expected
+    assert json.loads(other_body)[0]["isCompleted"] is True
+    assert etag != other_etag
+    # los elementos se serializan una vez por version de nivel
+    assert cache.misses == 2 and cache.hits == 2
+
+def test_if_none_match_uses_weak_comparison():
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
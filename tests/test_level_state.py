@@ -0,0 +1,69 @@
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.auth.dependencies import UserContext
+from app.game.service import GameService
+from app.main import app
+from app.progress.level_state import LevelBitset, LevelState
+from tests.conftest import TEST_UID
+
+def test_bitset_membership_and_round_trip():
+    bitset = LevelBitset.from_levels([1, 9, 3])
+
+    assert bitset.add(16) is True and bitset.add(3) is False
+    assert 9 in bitset and 2 not in bitset and 400 not in bitset and "1" not in bitset
+    assert list(bitset) == [1, 3, 9, 16] and len(bitset) == 4
+    assert list(LevelBitset(bitset.to_bytes())) == [1, 3, 9, 16]
+
+@pytest.mark.asyncio
+async def test_login_reads_completed_levels_from_the_user_document(memory_backend):
+    transport = ASGITransport(app=app)
+    credentials = {"email": "testuser5@example.com", "password": "Test1234!"}
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        # el usuario sembrado no tiene bitsets: el primer login los crea desde su resumen
+        first = await ac.post("/api/auth/login", json=credentials)
+        await GameService.validate_commands(UserContext({"uid": TEST_UID}), 1, ["ESTANTE1", "ESTANTE2", "IF"])
+        memory_backend.ops.reset()
+        second = await ac.post("/api/auth/login", json=credentials)
+        ops = memory_backend.ops.snapshot()
+        headers = {"Authorization": f"Bearer {second.json()['auth']}"}
+        levels = await ac.get("/api/levels/", headers=headers)
+
+    assert first.json()["levels_completed"] == second.json()["levels_completed"] == [1]
+    # solo el documento del usuario: ni progreso ni resumen
+    assert set(ops) == {"users"}
+    state = LevelState(memory_backend.dump()[f"users/{TEST_UID}"])
+    assert state.tracked and list(state.unlocked) == [1, 2] and state.best_stars(1) == 3
+    assert {level["level_id"]: level["isCompleted"] for level in levels.json()} == {1: True, 2: False, 3: False}
+
+@pytest.mark.asyncio
+async def test_batch_from_a_stale_context_keeps_concurrent_completions(memory_backend):
+    from app.progress.service import ProgressService
+    await ProgressService.sync_level_state(TEST_UID)
+    # contexto que ya ha leido el documento del usuario antes de los intentos siguientes
+    stale = UserContext({"uid": TEST_UID})
+    await stale.data()
+
+    await GameService.validate_commands(UserContext({"uid": TEST_UID}), 1, ["ESTANTE1", "ESTANTE2", "IF"])
+    await GameService.validate_commands(UserContext({"uid": TEST_UID}), 2, ["WHILE", "SALUD"])
+    result = await GameService.submit_batch(stale, [{"level_id": 2, "list_commands": ["WHILE"]}])
+
+    assert result["results"][0]["status"] == 200
+    state = LevelState(memory_backend.dump()[f"users/{TEST_UID}"])
+    assert list(state.completed) == [1, 2]
+    assert list(state.unlocked) == [1, 2, 3]
+    assert state.best_stars(2) == 3
+
+@pytest.mark.asyncio
+async def test_rebuilding_the_summary_never_removes_levels(memory_backend):
+    from app.progress.service import ProgressService
+    bits = LevelState({"completed_bits": b""})
+    bits.record(1, 3)
+    bits.record(7, 2)
+    memory_backend.load({f"users/{TEST_UID}": {"unlocked_levels": [1], **bits.fields()}})
+
+    # el progreso solo tiene el nivel 1 (80 puntos, sin estrellas)
+    await ProgressService.rebuild_summary(TEST_UID)
+
+    state = LevelState(memory_backend.dump()[f"users/{TEST_UID}"])
+    assert list(state.completed) == [1, 7]
+    assert state.best_stars(1) == 3 and state.best_stars(7) == 2
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+import pytest
+from httpx import AsyncClient, ASGITransport
+from app.main import app
+from app.game.statistics import aggregate_records, apply_delta, empty_aggregates, progress_delta, statistics_from_aggregates
+
+def test_incremental_deltas_match_reconciliation():
+    start = datetime(2024, 1, 1)
+    first = {"level_id": 1, "stars": 1, "start_date": start, "completion_date": start + timedelta(seconds=30)}
+    improved = {**first, "stars": 3, "completion_date": start + timedelta(seconds=50), "attempts": 2}
+    other = {"level_id": 1, "stars": 2, "start_date": start, "completion_date": start}
+
+    aggregates = empty_aggregates()
+    apply_delta(aggregates, progress_delta(None, first))
+    apply_delta(aggregates, progress_delta(first, improved))
+    apply_delta(aggregates, progress_delta(None, other))
+
+    assert aggregates == aggregate_records([improved, other])
+    stats = statistics_from_aggregates(aggregates)
+    assert stats["total_attempts"] == 3
+    assert stats["completed_count"] == 2
+    assert stats["average_stars"] == 2.5
+    assert stats["three_stars_count"] == 1
+    assert stats["average_duration_seconds"] == 25.0
+
+@pytest.mark.asyncio
+async def test_level_statistics_include_progress_by_default():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_resp = await ac.post("/api/auth/login", json={"email": "testuser5@example.com", "password": "Test1234!"})
+        headers = {"Authorization": f"Bearer {login_resp.json()['auth']}"}
+        default = await ac.get("/api/game/level-statistics/1", headers=headers)
+        page = await ac.get("/api/game/level-statistics/1", params={"limit": 1}, headers=headers)
+        aggregates_only = await ac.get("/api/game/level-statistics/1", params={"include_progress": "false"}, headers=headers)
+
+    # mismo contrato que antes de la paginacion: el progreso guardado y sus niveles
+    data = default.json()
+    assert [record["progress_id"] for record in data["progress"]] == ["seed-progress-1"]
+    assert data["levels_completed"] == [1] and data["next_cursor"] is None
+    assert page.json()["progress"] == data["progress"] and page.json()["next_cursor"] == "seed-progress-1"
+    assert aggregates_only.json()["progress"] == [] and aggregates_only.json()["levels_completed"] == []
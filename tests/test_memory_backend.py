@@ -0,0 +1,115 @@
+import threading
+import pytest
+from firebase_admin import auth, firestore
+from google.api_core.exceptions import NotFound
+from app.auth.token_cache import CertificateCache, LocalTokenVerifier
+from app.config.memory_backend import MemoryAuth, MemoryFirestore
+
+def _client():
+    client = MemoryFirestore()
+    client.load({
+        "progress/a": {"user_id": "u1", "level_id": 1, "stars": 3},
+        "progress/b": {"user_id": "u1", "level_id": 2, "stars": 1},
+        "progress/c": {"user_id": "u2", "level_id": 1, "stars": 2},
+        "progress/d": {"user_id": "u1", "level_id": "level3"},
+    })
+    return client
+
+def test_queries_filter_order_and_paginate_like_firestore():
+    client = _client()
+    progress = client.collection("progress")
+
+    assert [d.id for d in progress.where("user_id", "==", "u1").get()] == ["a", "b", "d"]
+    assert [d.id for d in progress.where("level_id", "in", [1, "level3"]).get()] == ["a", "c", "d"]
+    # los documentos sin el campo de orden no aparecen
+    by_stars = progress.order_by("stars", direction=firestore.Query.DESCENDING).get()
+    assert [d.id for d in by_stars] == ["a", "c", "b"]
+    page = progress.order_by("__name__").start_after({"__name__": "b"}).limit(1).get()
+    assert [d.id for d in page] == ["c"]
+    assert [d.id for d in progress.order_by("stars").start_after(by_stars[-1]).get()] == ["c", "a"]
+
+    assert client.ops.snapshot()["progress"]["queries"] == 5
+
+def test_writes_apply_transforms_and_batches_are_atomic():
+    client = _client()
+    ref = client.collection("summaries").document("u1")
+    ref.set({"levels": {"1": {"attempts": firestore.Increment(1)}}, "completed": firestore.ArrayUnion([1])}, merge=True)
+    ref.set({"levels": {"1": {"attempts": firestore.Increment(2)}, "2": {"attempts": 1}}, "completed": firestore.ArrayUnion([1, 2])}, merge=True)
+    ref.update({"levels.2.attempts": firestore.DELETE_FIELD, "total": firestore.Increment(5)})
+
+    assert ref.get().to_dict() == {"levels": {"1": {"attempts": 3}, "2": {}}, "completed": [1, 2], "total": 5}
+
+    batch = client.batch()
+    batch.set(client.collection("progress").document("e"), {"user_id": "u3"})
+    batch.update(client.collection("progress").document("missing"), {"stars": 1})
+    with pytest.raises(NotFound):
+        batch.commit()
+    assert not client.collection("progress").document("e").get().exists
+
+def test_transactions_retry_on_contention():
+    client = MemoryFirestore()
+    counter = client.collection("counters").document("levels")
+    counter.set({"last_id": 0})
+    attempts = []
+
+    def allocate(transaction):
+        last_id = counter.get(transaction=transaction).to_dict()["last_id"]
+        attempts.append(last_id)
+        if len(attempts) == 1:
+            # otra escritura entre la lectura y el commit obliga a reintentar
+            counter.set({"last_id": 10})
+        transaction.set(counter, {"last_id": last_id + 1})
+        return last_id + 1
+
+    assert firestore.transactional(allocate)(client.transaction()) == 11
+    assert attempts == [0, 10]
+    assert counter.get().to_dict() == {"last_id": 11}
+
+def test_concurrent_transactions_do_not_lose_increments():
+    client = MemoryFirestore()
+    counter = client.collection("counters").document("levels")
+    counter.set({"last_id": 0})
+
+    def allocate(transaction):
+        last_id = counter.get(transaction=transaction).to_dict()["last_id"]
+        transaction.set(counter, {"last_id": last_id + 1})
+
+    threads = [threading.Thread(target=lambda: firestore.transactional(allocate)(client.transaction(max_attempts=50))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.get().to_dict() == {"last_id": 8}
+
+def test_collection_group_and_listeners():
+    client = MemoryFirestore()
+    events = []
+    watch = client.collection("levels").on_snapshot(lambda docs, changes, read_time: events.append(sorted(d.id for d in docs)))
+    client.collection("levels").document("Level1").set({"level_id": 1})
+    watch.unsubscribe()
+    client.collection("levels").document("Level2").set({"level_id": 2})
+    client.collection("level_stats/1/shards").document("0").set({"attempts": 2})
+    client.collection("level_stats/2/shards").document("0").set({"attempts": 3})
+
+    assert events == [[], ["Level1"]]
+    assert sorted(d.get("attempts") for d in client.collection_group("shards").get()) == [2, 3]
+
+@pytest.mark.asyncio
+async def test_memory_auth_tokens_pass_local_verification():
+    memory_auth = MemoryAuth()
+    user = memory_auth.create_user(email="a@example.com", password="secret1")
+    memory_auth.set_custom_user_claims(user.uid, {"role": "admin"})
+    with pytest.raises(auth.EmailAlreadyExistsError):
+        memory_auth.create_user(email="A@example.com", password="secret1")
+    assert memory_auth.sign_in_with_password("a@example.com", "wrong") is None
+
+    token = memory_auth.sign_in_with_password("a@example.com", "secret1")["idToken"]
+    certificates = CertificateCache()
+    certificates.certs = memory_auth.certificates()
+    certificates.expires_at = float("inf")
+    verifier = LocalTokenVerifier(certificates)
+    verifier._project_id = memory_auth.project_id
+
+    claims = verifier.decode(token)
+    assert claims["uid"] == user.uid and claims["role"] == "admin"
+    assert memory_auth.verify_id_token(token)["email"] == "a@example.com"
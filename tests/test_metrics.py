@@ -0,0 +1,105 @@
+import re
+import httpx
+import pytest
+from app.main import app
+from app.metrics import middleware as middleware_module
+from app.metrics import routes as routes_module
+from app.metrics.registry import Histogram, collection_label, firestore_operations, http_request_duration
+
+def _metric(text, name, **labels):
+    selector = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{re.escape(name)}\{{{re.escape(selector)}\}} (\S+)$", text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+async def _login(ac):
+    response = await ac.post("/api/auth/login", json={"email": "testuser5@example.com", "password": "Test1234!"})
+    return response.json()["auth"]
+
+def test_collection_labels_group_subcollections():
+    assert collection_label("progress") == "progress"
+    assert collection_label("level_stats/3/shards") == "level_stats/{id}/shards"
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "test", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(("/a",), value)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/a",le="0.1"} 2' in lines
+    assert 'test_seconds_bucket{route="/a",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{route="/a",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{route="/a"} 4' in lines
+
+@pytest.mark.asyncio
+async def test_routes_are_labeled_by_template_with_their_firestore_cost(monkeypatch):
+    monkeypatch.setattr(routes_module, "METRICS_TOKEN", "secreto")
+    labels = ("GET", "/api/levels/{level_id}", "200")
+    before = http_request_duration.count(labels)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        # el primer login inicializa los bitsets del usuario en una transaccion
+        await _login(ac)
+        login_reads = firestore_operations.value(("/api/auth/login", "users", "read"))
+        token = await _login(ac)
+        await ac.get("/api/levels/1", headers={"Authorization": f"Bearer {token}"})
+        await ac.get("/api/levels/2", headers={"Authorization": f"Bearer {token}"})
+        await ac.get("/api/no-existe")
+        response = await ac.get("/api/metrics", headers={"Authorization": "Bearer secreto"})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert http_request_duration.count(labels) == before + 2
+    assert http_request_duration.count(("GET", "unmatched", "404")) >= 1
+    # el login lee el documento del usuario y lo actualiza
+    assert firestore_operations.value(("/api/auth/login", "users", "read")) == login_reads + 1
+    text = response.text
+    assert _metric(text, "devquest_http_request_duration_seconds_count", method="GET", route="/api/levels/{level_id}", status="200") == before + 2
+    assert _metric(text, "devquest_firestore_operations_total", route="/api/auth/login", collection="users", operation="write") >= 1
+    assert "# TYPE devquest_level_catalog_levels gauge" in text
+
+@pytest.mark.asyncio
+async def test_metrics_require_the_configured_token(monkeypatch):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        monkeypatch.setattr(routes_module, "METRICS_TOKEN", None)
+        disabled = await ac.get("/api/metrics", headers={"Authorization": "Bearer "})
+        monkeypatch.setattr(routes_module, "METRICS_TOKEN", "secreto")
+        missing = await ac.get("/api/metrics")
+        wrong = await ac.get("/api/metrics", headers={"Authorization": "Bearer otro"})
+
+    # sin token configurado el endpoint queda cerrado
+    assert disabled.status_code == 403
+    assert missing.status_code == 401 and wrong.status_code == 401
+
+@pytest.mark.asyncio
+async def test_server_timing_header_is_optional(monkeypatch):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        token = await _login(ac)
+        headers = {"Authorization": f"Bearer {token}"}
+        without = await ac.get("/api/progress/", headers=headers)
+        monkeypatch.setattr(middleware_module, "SERVER_TIMING_ENABLED", True)
+        with_timing = await ac.get("/api/progress/", headers=headers)
+
+    assert "server-timing" not in without.headers
+    timing = with_timing.headers["server-timing"]
+    assert re.search(r"auth;dur=[\d.]+", timing)
+    assert re.search(r'firestore;dur=[\d.]+;desc="\d+ llamadas"', timing)
+    assert re.search(r"serialization;dur=[\d.]+", timing)
+    assert re.search(r"total;dur=[\d.]+", timing)
+
+@pytest.mark.asyncio
+async def test_transaction_reads_and_writes_count_towards_the_request():
+    route = "/api/game/validate-commands"
+    counted = [("progress", "read"), ("users", "read"), ("progress", "write"), ("progress_summaries", "write"), ("users", "write")]
+    before = {key: firestore_operations.value((route, *key)) for key in counted}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        token = await _login(ac)
+        response = await ac.post("/api/game/validate-commands", json={"level_id": 1, "list_commands": ["ESTANTE1", "ESTANTE2", "IF"]}, headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200 and response.json()["correct"]
+    # las lecturas y escrituras de la transaccion (y del batch que se aplica en ella)
+    for key in counted:
+        assert firestore_operations.value((route, *key)) > before[key], key
@@ -0,0 +1,23 @@
+from datetime import datetime
+import pytest
+from app.progress import migrate_progress_keys
+from tests.conftest import TEST_UID
+
+@pytest.mark.asyncio
+async def test_legacy_progress_is_merged_into_keyed_document(memory_backend):
+    memory_backend.load({
+        "progress/legacy-2": {"user_id": TEST_UID, "level_id": 1, "score": 95, "start_date": datetime(2024, 1, 1), "completion_date": datetime(2024, 1, 2)},
+        "progress/legacy-potions": {"user_id": TEST_UID, "level_id": "level3", "stars": 2, "potions": {"pocion_vida": 2}},
+    })
+
+    assert await migrate_progress_keys.migrate(chunk_size=1, dry_run=True) == 3
+    assert await migrate_progress_keys.migrate(chunk_size=1) == 3
+    assert await migrate_progress_keys.migrate(chunk_size=1) == 0
+
+    ids = sorted(ref.id for ref in memory_backend.collection("progress").list_documents())
+    assert ids == [f"{TEST_UID}_1", f"{TEST_UID}_3"]
+    level1 = memory_backend.document(f"progress/{TEST_UID}_1").get().to_dict()
+    assert level1["score"] == 95 and level1["attempts"] == 2
+    assert level1["start_date"] == datetime(2024, 1, 1)
+    level3 = memory_backend.document(f"progress/{TEST_UID}_3").get().to_dict()
+    assert level3["level_id"] == 3 and level3["potions"] == {"pocion_vida": 2}
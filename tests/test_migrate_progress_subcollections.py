@@ -0,0 +1,69 @@
+import pytest
+from app.game.service import GameService
+from app.progress import migrate_progress_subcollections as migration
+from app.progress import records as records_module
+from app.progress.service import ProgressService
+from tests.conftest import TEST_UID
+
+USER_PROGRESS = f"users/{TEST_UID}/progress"
+
+@pytest.mark.asyncio
+async def test_dual_write_copy_then_cutover(memory_backend, monkeypatch):
+    memory_backend.load({
+        "progress/legacy-potions": {"user_id": TEST_UID, "level_id": "level3", "stars": 2, "potions": {"pocion_vida": 2}},
+        "progress/other_1": {"user_id": "other", "level_id": 1, "score": 10, "attempts": 4},
+    })
+    # modo dual: un intento en vivo antes de copiar se escribe en las dos colecciones
+    await ProgressService.record_progress(TEST_UID, 2, 70)
+
+    first = await migration.migrate(chunk_size=2)
+    again = await migration.migrate(chunk_size=2)
+
+    stored = memory_backend.dump()
+    assert first["written"] == 3 and again == {"read": 4, "written": 0, "deleted": 0}
+    assert sorted(path for path in stored if path.startswith(USER_PROGRESS)) == [f"{USER_PROGRESS}/{TEST_UID}_{level}" for level in (1, 2, 3)]
+    # el registro con id antiguo se fusiona en el canonico, tambien en la coleccion global
+    assert "progress/seed-progress-1" not in stored
+    assert stored[f"progress/{TEST_UID}_1"] == stored[f"{USER_PROGRESS}/{TEST_UID}_1"]
+    assert stored[f"{USER_PROGRESS}/{TEST_UID}_3"]["level_id"] == 3
+
+    monkeypatch.setattr(records_module, "PROGRESS_STORAGE", "user")
+    await ProgressService.record_progress(TEST_UID, 1, 95)
+    cleanup = await migration.migrate(delete_legacy=True)
+
+    stored = memory_backend.dump()
+    assert cleanup["deleted"] == 4
+    assert not [path for path in stored if path.startswith("progress/")]
+    # lo escrito tras el cambio de modo no se pisa con la copia antigua
+    assert stored[f"{USER_PROGRESS}/{TEST_UID}_1"]["score"] == 95
+    assert stored[f"{USER_PROGRESS}/{TEST_UID}_1"]["attempts"] == 2
+    assert stored["users/other/progress/other_1"]["attempts"] == 4
+
+@pytest.mark.asyncio
+async def test_user_mode_reads_subcollections_and_collection_group(memory_backend, monkeypatch):
+    monkeypatch.setattr(records_module, "PROGRESS_STORAGE", "user")
+    memory_backend.load({
+        "users/a/progress/a_1": {"user_id": "a", "level_id": 1, "stars": 3},
+        "users/b/progress/b_1": {"user_id": "b", "level_id": 1, "stars": 1},
+        "users/b/progress/b_2": {"user_id": "b", "level_id": 2, "stars": 2},
+    })
+    memory_backend.ops.reset()
+
+    progress = await ProgressService.get_user_progress("b")
+    page, cursor = await records_module.query_level_progress(1, limit=1)
+    rest, _ = await records_module.query_level_progress(1, limit=1, start_after=cursor)
+    streamed = [record async for record in GameService.stream_level_progress(1)]
+
+    assert [record["progress_id"] for record in progress] == ["b_1", "b_2"]
+    assert [doc.id for doc in page] == ["a_1"] and cursor == "a_1"
+    assert [doc.id for doc in rest] == ["b_1"]
+    # el registro sembrado en la coleccion global (progress/seed-progress-1) no cuenta
+    assert [record["progress_id"] for record in streamed] == ["a_1", "b_1"]
+
+def test_collection_group_index_for_level_queries_is_defined():
+    import json
+    from pathlib import Path
+    indexes = json.loads((Path(__file__).resolve().parents[1] / "firestore.indexes.json").read_text())
+    # las consultas por nivel en modo user son de collection group sobre progress
+    [override] = [item for item in indexes["fieldOverrides"] if item["collectionGroup"] == "progress" and item["fieldPath"] == "level_id"]
+    assert {"order": "ASCENDING", "queryScope": "COLLECTION_GROUP"} in override["indexes"]
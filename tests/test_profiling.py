@@ -0,0 +1,85 @@
+import re
+import sys
+import httpx
+import pytest
+from app.config import backend
+from app.main import app
+from app.profiling.profiler import TracingProfiler, profile_store
+from tests.conftest import TEST_UID
+
+@pytest.fixture(autouse=True)
+def empty_profile_store():
+    profile_store.clear()
+    yield
+    profile_store.clear()
+
+def _token(role):
+    auth = backend.memory_auth()
+    auth.set_custom_user_claims(TEST_UID, {"role": role})
+    return auth.mint_id_token(TEST_UID)
+
+@pytest.mark.asyncio
+async def test_admin_can_trace_a_request_and_download_collapsed_stacks():
+    headers = {"Authorization": f"Bearer {_token('admin')}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get("/api/levels/1", headers={**headers, "X-Profile": "trace"})
+        listing = await ac.get("/api/profiles/", headers=headers)
+        profile_id = response.headers["x-profile-id"]
+        download = await ac.get(f"/api/profiles/{profile_id}", headers=headers)
+
+    assert response.status_code == 200 and response.json()["level_id"] == 1
+    assert listing.status_code == 200
+    [summary] = listing.json()
+    assert summary["id"] == profile_id and summary["mode"] == "trace" and summary["unit"] == "microseconds"
+    assert summary["path"] == "/api/levels/1" and summary["status"] == 200
+    assert download.status_code == 200
+    assert "attachment" in download.headers["content-disposition"]
+    lines = download.text.splitlines()
+    assert lines and all(re.fullmatch(r"\S.* \d+", line) for line in lines)
+    assert any("routes.get_level:" in line for line in lines)
+
+@pytest.mark.asyncio
+async def test_sampling_profile_from_query_flag():
+    headers = {"Authorization": f"Bearer {_token('admin')}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get("/api/levels/", params={"profile": "sample"}, headers=headers)
+
+    assert "x-profile-id" in response.headers
+    [profile] = profile_store.list()
+    assert profile.mode == "sample" and profile.unit == "samples"
+
+@pytest.mark.asyncio
+async def test_flag_is_ignored_for_players_and_listing_requires_admin():
+    headers = {"Authorization": f"Bearer {_token('user')}"}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.get("/api/levels/1", headers={**headers, "X-Profile": "trace"})
+        listing = await ac.get("/api/profiles/", headers=headers)
+        missing = await ac.get("/api/profiles/desconocido", headers={"Authorization": f"Bearer {_token('admin')}"})
+
+    assert response.status_code == 200 and "x-profile-id" not in response.headers
+    assert profile_store.list() == []
+    assert listing.status_code == 403
+    assert missing.status_code == 404
+
+@pytest.mark.asyncio
+async def test_tracer_attributes_self_time_to_the_stack_below_the_root():
+    def leaf():
+        return sum(range(1000))
+
+    async def root():
+        tracer = TracingProfiler(sys._getframe())
+        tracer.start()
+        try:
+            leaf()
+        finally:
+            tracer.stop()
+        return tracer.stacks
+
+    stacks = await root()
+
+    assert sys.getprofile() is None
+    assert any(stack.endswith("leaf:" + str(leaf.__code__.co_firstlineno)) for stack in stacks)
+    assert any(stack.endswith("builtins.sum") for stack in stacks)
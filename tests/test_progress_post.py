@@ -33,3 +33,35 @@ async def test_record_progress_with_token():
     assert data["level_id"] == 1
     assert data["score"] == 80
     assert "progress_id" in data
+
+@pytest.mark.asyncio
+async def test_record_progress_keeps_best_score_in_one_document():
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_resp = await ac.post("/api/auth/login", json={"email": "testuser5@example.com", "password": "Test1234!"})
+        headers = {"Authorization": f"Bearer {login_resp.json()['auth']}"}
+
+        first = await ac.post("/api/progress/", json={"level_id": 2, "score": 90}, headers=headers)
+        second = await ac.post("/api/progress/", json={"level_id": "2", "score": 40}, headers=headers)
+
+    assert first.status_code == second.status_code == 201
+    data = second.json()
+    assert data["progress_id"] == first.json()["progress_id"] == "testuser5_2"
+    assert data["level_id"] == 2
+    assert data["score"] == 90
+
+@pytest.mark.asyncio
+async def test_record_progress_rejects_levels_outside_the_catalog(memory_backend):
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        login_resp = await ac.post("/api/auth/login", json={"email": "testuser5@example.com", "password": "Test1234!"})
+        headers = {"Authorization": f"Bearer {login_resp.json()['auth']}"}
+        user_before = memory_backend.dump()["users/testuser5"]
+
+        huge = await ac.post("/api/progress/", json={"level_id": 80000000, "score": 10}, headers=headers)
+        negative = await ac.post("/api/progress/", json={"level_id": -5, "score": 10}, headers=headers)
+
+    assert huge.status_code == negative.status_code == 404
+    # los bitsets del usuario no crecen y no se escribe progreso
+    assert memory_backend.dump()["users/testuser5"] == user_before
+    assert not any("80000000" in path or "_-5" in path for path in memory_backend.dump())
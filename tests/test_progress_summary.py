@@ -0,0 +1,27 @@
+from datetime import datetime
+from app.progress.summary import apply_progress, build_summary, completed_levels, empty_summary, summary_progress
+
+def test_build_summary_from_progress_records():
+    summary = build_summary("uid1", [
+        {"level_id": 1, "stars": 2},
+        {"level_id": 1, "stars": 3},
+        {"level_id": "level2", "stars": 1},
+        {"level_id": 3, "score": 80},
+    ])
+
+    assert completed_levels(summary) == [1, 2, 3]
+    assert summary["total_attempts"] == 4
+    progress = summary_progress(summary)
+    assert progress[0] == {"level_id": 1, "best_stars": 3, "attempts": 2}
+    assert progress[2]["best_score"] == 80
+
+def test_apply_progress_matches_incremental_update():
+    summary = empty_summary("uid1")
+    now = datetime.utcnow()
+    apply_progress(summary, 1, 1, now=now)
+    apply_progress(summary, 1, 3, now=now)
+    apply_progress(summary, 1, 2, now=now)
+
+    assert summary["levels"]["1"]["best_stars"] == 3
+    assert summary["levels"]["1"]["attempts"] == 3
+    assert completed_levels(summary) == [1]
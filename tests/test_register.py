@@ -20,3 +20,20 @@ async def test_register_success():
     assert "auth" in data
     assert "email" in data
     assert data["email"] == unique_email
+
+@pytest.mark.asyncio
+async def test_register_auth_calls_are_not_firestore_round_trips():
+    from app.metrics.registry import firestore_operations
+    round_trips = firestore_operations.value(("/api/auth/register", "users", "round_trip"))
+    writes = firestore_operations.value(("/api/auth/register", "users", "write"))
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://test") as ac:
+        response = await ac.post("/api/auth/register", json={
+            "email": f"test_{uuid.uuid4().hex[:8]}@example.com",
+            "password": "Test1234!",
+            "username": "TestUserPrueba"
+        })
+    assert response.status_code == 201
+    # solo el documento de users cuenta como llamada a Firestore; el Admin SDK de Auth no
+    assert firestore_operations.value(("/api/auth/register", "users", "round_trip")) == round_trips + 1
+    assert firestore_operations.value(("/api/auth/register", "users", "write")) == writes + 1
@@ -0,0 +1,126 @@
+import pytest
+from fastapi import HTTPException
+from app.config.datastore import DataStore
+from app.game import autosave as autosave_module
+from app.game.autosave import StateBuffer
+from app.game.json_patch import JsonPatchError, apply_patch
+from app.game.state_codec import state_codec
+
+class _Snapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data)
+
+class _DocRef:
+    def __init__(self, client, path):
+        self.client = client
+        self.path = path
+
+    def get(self):
+        self.client.reads += 1
+        return _Snapshot(self.client.docs.get(self.path))
+
+class _Collection:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def document(self, doc_id):
+        return _DocRef(self.client, f"{self.name}/{doc_id}")
+
+class _Batch:
+    def __init__(self, client):
+        self.client = client
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data))
+
+    def commit(self):
+        self.client.commits += 1
+        for path, data in self.writes:
+            self.client.docs[path] = data
+
+class _Client:
+    def __init__(self, docs=None):
+        self.docs = docs or {}
+        self.reads = 0
+        self.commits = 0
+
+    def collection(self, name):
+        return _Collection(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+def test_apply_patch_operations():
+    state = {"board": [1, 2, 3], "player": {"x": 0}}
+    patched = apply_patch(state, [
+        {"op": "replace", "path": "/player/x", "value": 4},
+        {"op": "add", "path": "/board/-", "value": 9},
+        {"op": "remove", "path": "/board/0"},
+        {"op": "copy", "from": "/player", "path": "/start"},
+        {"op": "test", "path": "/start/x", "value": 4},
+    ])
+    assert patched == {"board": [2, 3, 9], "player": {"x": 4}, "start": {"x": 4}}
+    assert state == {"board": [1, 2, 3], "player": {"x": 0}}
+
+    with pytest.raises(JsonPatchError):
+        apply_patch(state, [{"op": "remove", "path": "/missing"}])
+    with pytest.raises(JsonPatchError):
+        apply_patch(state, [{"op": "test", "path": "/player/x", "value": 1}])
+
+@pytest.mark.asyncio
+async def test_autosaves_are_coalesced_into_one_write(monkeypatch):
+    client = _Client()
+    store = DataStore(client_factory=lambda: client)
+    monkeypatch.setattr(autosave_module, "datastore", store)
+    buffer = StateBuffer()
+
+    for step in range(20):
+        version = await buffer.save("u1", 1, {"step": step})
+    assert version == 20
+    assert buffer.pending == 1
+    assert client.commits == 0
+
+    # la lectura se sirve desde el buffer
+    loaded = await buffer.load("u1", 1)
+    assert loaded["state"] == {"step": 19} and loaded["version"] == 20
+    assert client.reads == 1
+
+    assert await buffer.flush() == 1
+    assert await buffer.flush() == 0
+    store.shutdown()
+    assert client.commits == 1
+    assert state_codec.decode(client.docs["level_states/u1_1"]) == {"step": 19}
+    assert client.docs["level_states/u1_1"]["version"] == 20
+
+@pytest.mark.asyncio
+async def test_patch_against_version(monkeypatch):
+    client = _Client({"level_states/u1_2": {"state": {"x": 1}, "version": 7}})
+    store = DataStore(client_factory=lambda: client)
+    monkeypatch.setattr(autosave_module, "datastore", store)
+    buffer = StateBuffer()
+
+    version = await buffer.patch("u1", 2, [{"op": "replace", "path": "/x", "value": 2}], base_version=7)
+    assert version == 8
+    assert (await buffer.load("u1", 2))["state"] == {"x": 2}
+
+    with pytest.raises(HTTPException) as conflict:
+        await buffer.patch("u1", 2, [{"op": "replace", "path": "/x", "value": 3}], base_version=7)
+    assert conflict.value.status_code == 409
+
+    with pytest.raises(HTTPException) as invalid:
+        await buffer.patch("u1", 2, [{"op": "remove", "path": "/y"}], base_version=8)
+    assert invalid.value.status_code == 422
+
+    with pytest.raises(HTTPException) as missing:
+        await buffer.patch("u1", 3, [], base_version=0)
+    assert missing.value.status_code == 404
+
+    await buffer.stop()
+    store.shutdown()
+    assert client.docs["level_states/u1_2"]["version"] == 8
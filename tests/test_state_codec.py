@@ -0,0 +1,56 @@
+import pytest
+from app.game.state_codec import BLOB_FIELD, ENCODING_FIELD, StateCodec, StateCodecError, StateTooLargeError
+
+STATE = {"tablero": [["muro", "", "pocion"] * 10 for _ in range(20)], "jugador": {"x": 1, "y": 2}, "vidas": 3}
+
+@pytest.mark.parametrize("serializer", ["json", "msgpack"])
+def test_round_trip_with_compression(serializer):
+    codec = StateCodec(serializer, "zlib", threshold=0)
+    encoded = codec.encode(STATE)
+    assert encoded[ENCODING_FIELD] == f"{codec.serializer}+zlib"
+    assert codec.decode(encoded) == STATE
+
+def test_small_states_are_not_compressed():
+    codec = StateCodec("json", "zlib", threshold=1024)
+    encoded = codec.encode({"x": 1})
+    assert encoded[ENCODING_FIELD] == "json"
+    assert codec.decode(encoded) == {"x": 1}
+
+def test_reads_legacy_documents_and_other_encodings():
+    codec = StateCodec("json", "zlib")
+    assert codec.decode({"uid": "u1", "state": {"x": 1}}) == {"x": 1}
+    assert codec.decode({"uid": "u1"}) is None
+    # un documento escrito con otra configuracion se sigue leyendo
+    other = StateCodec("json", "none").encode(STATE)
+    assert codec.decode(other) == STATE
+
+def test_size_limit_and_unknown_encoding():
+    codec = StateCodec("json", "none", max_bytes=100)
+    with pytest.raises(StateTooLargeError) as error:
+        codec.encode(STATE)
+    assert error.value.limit == 100 and error.value.size > 100
+
+    with pytest.raises(StateCodecError):
+        codec.decode({BLOB_FIELD: b"x", ENCODING_FIELD: "cbor+lz4"})
+    with pytest.raises(StateCodecError):
+        codec.decode({BLOB_FIELD: b"not zlib", ENCODING_FIELD: "json+zlib"})
+
+@pytest.mark.asyncio
+async def test_async_encoding_compresses_large_states_off_the_loop(monkeypatch):
+    import threading
+    codec = StateCodec("json", "zlib", threshold=1024)
+    threads = []
+    compress = codec._compress
+
+    def tracked(data, encoding):
+        threads.append(threading.current_thread())
+        return compress(data, encoding)
+
+    monkeypatch.setattr(codec, "_compress", tracked)
+    assert await codec.encode_async(STATE) == codec.encode(STATE)
+    assert threads[0] is not threading.main_thread()
+
+    # los estados pequeños no se comprimen ni salen del loop
+    threads.clear()
+    assert (await codec.encode_async({"x": 1}))[ENCODING_FIELD] == "json"
+    assert threads == []
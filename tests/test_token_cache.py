@@ -0,0 +1,99 @@
+import time
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, jwt
+from app.auth.token_cache import CertificateCache, LocalTokenVerifier, TokenCache
+
+PROJECT_ID = "devquest-test"
+
+def _signing_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return crypt.RSASigner.from_string(private_pem, key_id="kid1"), public_pem.decode()
+
+def _token(signer, **overrides):
+    now = int(time.time())
+    payload = {
+        "iss": f"https://securetoken.google.com/{PROJECT_ID}",
+        "aud": PROJECT_ID,
+        "sub": "user123",
+        "iat": now,
+        "exp": now + 3600,
+        "email": "test@example.com",
+    }
+    payload.update(overrides)
+    return jwt.encode(signer, payload).decode()
+
+def _verifier(public_pem):
+    certificates = CertificateCache()
+    certificates.certs = {"kid1": public_pem}
+    certificates.expires_at = time.time() + 3600
+    verifier = LocalTokenVerifier(certificates)
+    verifier._project_id = PROJECT_ID
+    return verifier
+
+@pytest.mark.asyncio
+async def test_local_verification_and_cache():
+    signer, public_pem = _signing_key()
+    verifier = _verifier(public_pem)
+    token = _token(signer)
+
+    claims = await verifier.verify(token)
+    assert claims["uid"] == "user123"
+
+    cache = TokenCache(max_size=2)
+    assert cache.get(token) is None
+    cache.put(token, claims)
+    assert cache.get(token) is claims
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_local_verification_rejects_wrong_audience():
+    signer, public_pem = _signing_key()
+    verifier = _verifier(public_pem)
+
+    with pytest.raises(ValueError):
+        await verifier.verify(_token(signer, aud="otro-proyecto"))
+
+def test_token_cache_expiry_and_eviction():
+    cache = TokenCache(max_size=2)
+    cache.put("expired", {"uid": "a", "exp": time.time() - 1})
+    assert cache.get("expired") is None
+
+    for name in ("t1", "t2", "t3"):
+        cache.put(name, {"uid": name, "exp": time.time() + 60})
+    assert cache.get("t1") is None
+    assert cache.get("t3")["uid"] == "t3"
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refresh_is_shared_and_throttled():
+    import asyncio
+    signer, public_pem = _signing_key()
+    verifier = _verifier(public_pem)
+    verifier.certificates.certs = {"otra": public_pem}
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.05)
+        return {"otra": public_pem}, 3600
+
+    verifier.certificates._fetch = fetch
+    token = _token(signer)
+
+    # varias peticiones a la vez con un kid desconocido: una sola descarga
+    results = await asyncio.gather(*(verifier.verify(token) for _ in range(5)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert len(fetches) == 1
+
+    # dentro del intervalo minimo se rechaza sin volver a descargar
+    with pytest.raises(ValueError, match="clave de firma desconocida"):
+        await verifier.verify(token)
+    assert len(fetches) == 1
@@ -32,3 +32,20 @@ async def test_validate_commands_with_token():
     data = response.json()
     assert "stars" in data
     assert isinstance(data["stars"], int)
+
+@pytest.mark.asyncio
+async def test_locked_level_does_not_rebuild_summary(memory_backend):
+    from fastapi import HTTPException
+    from app.auth.dependencies import UserContext
+    from app.game.service import GameService
+    from tests.conftest import TEST_UID
+
+    # el usuario de prueba no tiene resumen; el nivel 3 no esta desbloqueado
+    memory_backend.ops.reset()
+    with pytest.raises(HTTPException) as exc:
+        await GameService.validate_commands(UserContext({"uid": TEST_UID}), 3, ["BUCLE"])
+
+    assert exc.value.status_code == 403
+    ops = memory_backend.ops.snapshot()
+    assert ops["progress_summaries"]["writes"] == 0
+    assert "progress" not in ops
@@ -0,0 +1,83 @@
+import pytest
+from app.auth.dependencies import UserContext
+from app.game import service as game_service_module
+from app.game.schemas import BatchSubmissionRequest
+from app.game.service import GameService
+from app.levels.catalog import LevelCatalog
+from app.progress.service import ProgressService
+from tests.conftest import TEST_UID
+
+def _setup(memory_backend, monkeypatch):
+    memory_backend.load({
+        "users/u1": {"unlocked_levels": [1]},
+        "progress_summaries/u1": {"built_at": 1, "levels": {}, "completed_levels": []},
+    })
+    catalog = LevelCatalog(ttl=3600)
+    catalog.upsert("Level1", {"level_id": 1, "listCommands": {"a": "ls", "b": "cd"}})
+    catalog.upsert("Level2", {"level_id": 2, "listCommands": {"a": "pwd"}})
+    catalog.upsert("Level5", {"level_id": 5, "potions_config": {"vida": 2}, "perfect_score": 3})
+    monkeypatch.setattr(game_service_module, "level_catalog", catalog)
+    memory_backend.ops.reset()
+
+@pytest.mark.asyncio
+async def test_batch_submission_scores_in_order_with_one_commit(memory_backend, monkeypatch):
+    _setup(memory_backend, monkeypatch)
+    request = BatchSubmissionRequest(items=[
+        {"level_id": 3, "list_commands": ["ls"]},
+        {"level_id": 1, "list_commands": ["ls", "cd"]},
+        {"level_id": 2, "list_commands": ["pwd"]},
+        {"level_id": 5, "potions": {"vida": 2}, "bloques_utilizados": ["A"]},
+        {"level_id": 9, "potions": {}, "bloques_utilizados": []},
+    ])
+
+    result = await GameService.submit_batch(UserContext({"uid": "u1"}), [item.dict() for item in request.items])
+
+    assert [(r["level_id"], r["type"], r["status"], r["stars"]) for r in result["results"]] == [
+        (3, "commands", 403, 0),
+        (1, "commands", 200, 3),
+        # desbloqueado por el envio anterior del mismo lote
+        (2, "commands", 200, 3),
+        (5, "potions", 200, 3),
+        (9, "potions", 404, 0),
+    ]
+    assert result["levels_completed"] == [1, 2, 5]
+    ops = memory_backend.ops.snapshot()
+    # el progreso previo de los cinco niveles se lee por clave, sin consultas
+    assert ops["progress"]["reads"] == 5
+    assert ops["progress_summaries"]["reads"] == 1 and ops["users"]["reads"] == 1
+    # todas las escrituras en un unico commit
+    assert memory_backend.ops.totals()["queries"] == 0
+    assert memory_backend.ops.totals()["commits"] == 1
+    stored = memory_backend.dump()
+    assert stored["progress/u1_5"]["level_id"] == 5 and stored["progress/u1_5"]["potions"] == {"vida": 2}
+    assert stored["progress/u1_1"]["attempts"] == 1
+    # modo dual: la misma escritura en la subcoleccion del usuario
+    records = {path: data for path, data in stored.items() if path.startswith("progress/u1_")}
+    mirrored = {path: data for path, data in stored.items() if path.startswith("users/u1/progress/")}
+    assert sorted(records) == ["progress/u1_1", "progress/u1_2", "progress/u1_5"]
+    assert mirrored == {f"users/u1/{path}": data for path, data in records.items()}
+
+@pytest.mark.asyncio
+async def test_correct_submission_is_one_keyed_transaction(memory_backend):
+    user = UserContext({"uid": TEST_UID})
+    commands = ["ESTANTE1", "ESTANTE2", "IF"]
+    # el resumen ya existe: validar no tiene que reconstruirlo
+    await ProgressService.get_summary(TEST_UID)
+    memory_backend.ops.reset()
+
+    result = await GameService.validate_commands(user, 1, commands)
+    first = memory_backend.ops.snapshot()
+    await GameService.validate_commands(UserContext({"uid": TEST_UID}), 1, ["ESTANTE1"])
+
+    assert result["correct"] is True and result["stars"] == 3
+    assert result["levels_completed"] == [1]
+    assert result["progress"][0]["level_id"] == 1 and result["progress"][0]["best_stars"] == 3
+    # registro, resumen, estadisticas y desbloqueo en un unico commit, sin consultas
+    # (en modo dual el registro se escribe en progress y en users/{uid}/progress)
+    assert first["progress"] == {"reads": 1, "writes": 2, "queries": 0, "commits": 1}
+    stored = memory_backend.dump()
+    assert stored["users/testuser5"]["unlocked_levels"] == [1, 2]
+    # el segundo intento, peor, cuenta como intento sin perder la marca
+    record = stored[f"progress/{TEST_UID}_1"]
+    assert record["level_id"] == 1 and record["stars"] == 3 and record["attempts"] == 2
+    assert len([path for path in stored if path.startswith("progress/") and stored[path].get("level_id") == 1]) == 2